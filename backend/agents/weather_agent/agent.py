@@ -2,9 +2,14 @@ from langchain.agents import create_agent
 from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from agents.weather_agent.tools import get_weather
+from api.core.agents.budget_middleware import budget_middleware
+from api.core.agents.concurrency_middleware import concurrency_middleware
 from api.core.agents.custom_providers import init_model
 from api.core.agents.models import Models
-from api.core.agents.schemas import AgentConfig
+from api.core.agents.prompt_cache_middleware import prompt_cache_middleware
+from api.core.agents.rate_limit_middleware import rate_limit_middleware
+from api.core.agents.schemas import AgentConfig, SemanticCachePolicy
+from api.core.agents.semantic_cache_middleware import semantic_cache_middleware
 
 config = AgentConfig(
     name="Agente de Clima",
@@ -31,9 +36,27 @@ FORMATO DE RESPOSTA:
 - Organize informações em seções
 - Seja educado e prestativo
 """,
-    model=init_model(Models.Chutes.DEEPSEEK_V3_2_TEE, max_tokens=5000),
+    # Same question -> same get_weather call, same weather data -> same answer: serve
+    # repeats from the response cache (fresh data is a different call, so never stale).
+    model=init_model(Models.Groq.GPT_OSS_20B, max_tokens=5000, response_cache=True),
     tools=[get_weather],
     save_to_db=True,
+    # "clima em SP?" / "como está o tempo em São Paulo agora": same answer for 10 minutes.
+    semantic_cache=SemanticCachePolicy(
+        ttl_s=600,
+        synonyms={
+            "sp": "sao paulo",
+            "rj": "rio de janeiro",
+            "bh": "belo horizonte",
+            "bsb": "brasilia",
+            "tempo": "clima",
+            "hoje": "",
+            "agora": "",
+            "atual": "",
+        },
+    ),
+    # Only the final state of each turn matters here — skip per-step checkpoint writes.
+    durability="exit",
 )
 
 
@@ -44,4 +67,11 @@ def create_root_agent(checkpointer: BaseCheckpointSaver | None = None):
         tools=config.tools,
         system_prompt=config.system_prompt,
         checkpointer=checkpointer,
+        middleware=[
+            semantic_cache_middleware,
+            budget_middleware,
+            prompt_cache_middleware,
+            rate_limit_middleware,
+            concurrency_middleware,
+        ],
     )
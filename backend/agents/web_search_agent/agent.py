@@ -2,13 +2,24 @@ from langchain.agents import create_agent
 from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from agents.web_search_agent.tools import web_search
+from api.core.agents.brownout_middleware import brownout_middleware
+from api.core.agents.budget_middleware import budget_middleware
+from api.core.agents.concurrency_middleware import concurrency_middleware
 from api.core.agents.custom_providers import init_model
+from api.core.agents.failover_middleware import FailoverMiddleware
+from api.core.agents.latency_profile_middleware import latency_profile_middleware
 from api.core.agents.models import Models
-from api.core.agents.schemas import AgentConfig
+from api.core.agents.prompt_cache_middleware import prompt_cache_middleware
+from api.core.agents.rate_limit_middleware import rate_limit_middleware
+from api.core.agents.schemas import AgentConfig, BrownoutPolicy, SemanticCachePolicy
+from api.core.agents.semantic_cache_middleware import semantic_cache_middleware
+
+# Same model on two providers: Groq serves the calls while Chutes' circuit is open.
+failover = FailoverMiddleware(Models.Chutes.GPT_OSS_120B_TEE, Models.Groq.GPT_OSS_120B, hedge=True)
 
 config = AgentConfig(
     name="Agente de Busca Web",
-    description="Agente com busca na web usando DuckDuckGo e MiniMax-M2 (Chutes)",
+    description="Agente com busca na web usando DuckDuckGo e GPT-OSS-120B (Chutes, fallback/hedge Groq)",
     system_prompt="""Você é um assistente inteligente especializado em busca na web.
 
 🚨 REGRA FUNDAMENTAL: FAÇA APENAS UMA BUSCA POR PERGUNTA! 🚨
@@ -35,7 +46,7 @@ FORMATO DE RESPOSTA:
 - Inclua emojis quando apropriado
 - Organize informações em seções
 - Cite fontes com links clicáveis""",
-    model=init_model(Models.Chutes.GPT_OSS_120B_TEE),
+    model=failover.model,
     tools=[web_search],
     suggestions=[
         "What are the latest trends in AI?",
@@ -44,6 +55,19 @@ FORMATO DE RESPOSTA:
         "What is the difference between SQL and NoSQL?",
     ],
     save_to_db=True,
+    # The suggestions above, and their paraphrases, open most conversations.
+    semantic_cache=SemanticCachePolicy(
+        threshold=0.85,
+        ttl_s=3600,
+        synonyms={"ml": "machine learning", "ai": "artificial intelligence"},
+    ),
+    # GPT-OSS reasons at "medium" effort by default on both providers.
+    latency_profiles={
+        "fast": {"reasoning_effort": "low", "max_tokens": 4096},
+        "deep": {"reasoning_effort": "high"},
+    },
+    # Under load: low effort first, then the 20B model on Groq.
+    brownout=BrownoutPolicy(profile="fast", fallback_model=init_model(Models.Groq.GPT_OSS_20B)),
 )
 
 
@@ -54,4 +78,14 @@ def create_root_agent(checkpointer: BaseCheckpointSaver | None = None):
         tools=config.tools,
         system_prompt=config.system_prompt,
         checkpointer=checkpointer,
+        middleware=[
+            semantic_cache_middleware,
+            budget_middleware,
+            brownout_middleware,
+            failover,
+            latency_profile_middleware,
+            prompt_cache_middleware,
+            rate_limit_middleware,
+            concurrency_middleware,
+        ],
     )
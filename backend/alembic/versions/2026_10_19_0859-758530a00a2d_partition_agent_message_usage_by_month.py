@@ -0,0 +1,156 @@
+"""partition agent_message_usage by month
+
+Revision ID: 758530a00a2d
+Revises: ce67598aaf6f
+Create Date: 2026-10-19 08:59:15.545355
+
+Converts agent_message_usage into a RANGE-partitioned table on created_at with one
+partition per UTC month (agent_message_usage_yYYYYmMM). Partitions are created from the
+month of the oldest row up to PREMAKE_MONTHS ahead; afterwards the maintenance task in
+api.services.agents.maintenance keeps creating/detaching them. A DEFAULT partition
+(agent_message_usage_default) catches rows of a month without one (not created yet, or
+already detached), so a usage write never fails for lack of a partition.
+
+Indexes go from PK + 6 single-column btrees to:
+    PK (id, created_at)                  -- partition key must be part of the PK
+    (thread_id)                          -- get_thread_total_cost_usd
+    (user_id, created_at)                -- per-user totals over a date range
+    BRIN (created_at)                    -- range scans inside a partition, ~free on insert
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "758530a00a2d"
+down_revision: str | Sequence[str] | None = "ce67598aaf6f"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+PREMAKE_MONTHS = 3
+
+LEGACY_INDEXES = (
+    "ix_agent_message_usage_agent_id",
+    "ix_agent_message_usage_client_id",
+    "ix_agent_message_usage_created_at",
+    "ix_agent_message_usage_message_id",
+    "ix_agent_message_usage_model_id",
+    "ix_agent_message_usage_thread_id",
+    "ix_agent_message_usage_user_id",
+)
+
+COLUMNS = """
+    thread_id VARCHAR(128) NOT NULL,
+    message_id VARCHAR(64) NOT NULL,
+    user_id VARCHAR(255),
+    client_id VARCHAR(255),
+    agent_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(64) NOT NULL,
+    model_id VARCHAR(255) NOT NULL,
+    input_tokens INTEGER DEFAULT '0' NOT NULL,
+    cached_input_tokens INTEGER DEFAULT '0' NOT NULL,
+    output_tokens INTEGER DEFAULT '0' NOT NULL,
+    reasoning_tokens INTEGER DEFAULT '0' NOT NULL,
+    total_tokens INTEGER DEFAULT '0' NOT NULL,
+    cost_usd NUMERIC(12, 6) DEFAULT '0' NOT NULL,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for index_name in LEGACY_INDEXES:
+        op.drop_index(index_name, table_name="agent_message_usage")
+    op.execute("ALTER TABLE agent_message_usage RENAME TO agent_message_usage_legacy")
+    op.execute(
+        "ALTER TABLE agent_message_usage_legacy "
+        "RENAME CONSTRAINT agent_message_usage_pkey TO agent_message_usage_legacy_pkey"
+    )
+    # Keep the id sequence (and its current value) for the new table.
+    op.execute("ALTER SEQUENCE agent_message_usage_id_seq OWNED BY NONE")
+
+    op.execute(
+        f"""
+        CREATE TABLE agent_message_usage (
+            id INTEGER DEFAULT nextval('agent_message_usage_id_seq') NOT NULL,
+            {COLUMNS},
+            CONSTRAINT agent_message_usage_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE agent_message_usage_id_seq OWNED BY agent_message_usage.id")
+
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month_start timestamptz := date_trunc(
+                'month',
+                COALESCE((SELECT min(created_at) FROM agent_message_usage_legacy), now()),
+                'UTC'
+            );
+            last_month timestamptz := date_trunc('month', now(), 'UTC')
+                + interval '{PREMAKE_MONTHS} months';
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF agent_message_usage FOR VALUES FROM (%L) TO (%L)',
+                    'agent_message_usage_' || to_char(month_start AT TIME ZONE 'UTC', '"y"YYYY"m"MM'),
+                    month_start,
+                    month_start + interval '1 month'
+                );
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END $$;
+        """
+    )
+    op.execute("CREATE TABLE agent_message_usage_default PARTITION OF agent_message_usage DEFAULT")
+
+    op.create_index(
+        op.f("ix_agent_message_usage_thread_id"), "agent_message_usage", ["thread_id"], unique=False
+    )
+    op.create_index(
+        "ix_agent_message_usage_user_id_created_at",
+        "agent_message_usage",
+        ["user_id", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_agent_message_usage_created_at_brin",
+        "agent_message_usage",
+        ["created_at"],
+        unique=False,
+        postgresql_using="brin",
+    )
+
+    op.execute("INSERT INTO agent_message_usage SELECT * FROM agent_message_usage_legacy")
+    op.drop_table("agent_message_usage_legacy")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE agent_message_usage RENAME TO agent_message_usage_partitioned")
+    op.execute(
+        "ALTER TABLE agent_message_usage_partitioned "
+        "RENAME CONSTRAINT agent_message_usage_pkey TO agent_message_usage_partitioned_pkey"
+    )
+    op.execute("ALTER SEQUENCE agent_message_usage_id_seq OWNED BY NONE")
+    op.execute(
+        f"""
+        CREATE TABLE agent_message_usage (
+            id INTEGER DEFAULT nextval('agent_message_usage_id_seq') NOT NULL,
+            {COLUMNS},
+            CONSTRAINT agent_message_usage_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE agent_message_usage_id_seq OWNED BY agent_message_usage.id")
+    op.execute("INSERT INTO agent_message_usage SELECT * FROM agent_message_usage_partitioned")
+    # Dropping the parent drops every attached partition; detached ones are left alone.
+    op.drop_table("agent_message_usage_partitioned")
+
+    for index_name in LEGACY_INDEXES:
+        column = index_name.removeprefix("ix_agent_message_usage_")
+        op.create_index(index_name, "agent_message_usage", [column], unique=False)
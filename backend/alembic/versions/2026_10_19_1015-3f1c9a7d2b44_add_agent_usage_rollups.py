@@ -0,0 +1,124 @@
+"""add agent usage rollups
+
+Revision ID: 3f1c9a7d2b44
+Revises: 758530a00a2d
+Create Date: 2026-10-19 10:15:02.118734
+
+Adds agent_usage_hourly, agent_usage_daily and agent_thread_usage (see
+api.repositories.agents.usage_rollups) and backfills them from agent_message_usage.
+From here on the rollups are maintained in the same transaction as the raw inserts.
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9a7d2b44"
+down_revision: str | Sequence[str] | None = "758530a00a2d"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+MEASURES = (
+    "calls",
+    "error_calls",
+    "input_tokens",
+    "cached_input_tokens",
+    "output_tokens",
+    "reasoning_tokens",
+    "total_tokens",
+    "cost_usd",
+)
+
+MEASURES_FROM_RAW = """
+    count(*),
+    count(*) FILTER (WHERE error IS NOT NULL),
+    sum(input_tokens),
+    sum(cached_input_tokens),
+    sum(output_tokens),
+    sum(reasoning_tokens),
+    sum(total_tokens),
+    sum(cost_usd)
+"""
+
+
+def _measure_columns() -> list[sa.Column]:
+    return [
+        sa.Column("calls", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("error_calls", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("input_tokens", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("cached_input_tokens", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("output_tokens", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("reasoning_tokens", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("total_tokens", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column(
+            "cost_usd", sa.Numeric(precision=18, scale=6), server_default="0", nullable=False
+        ),
+    ]
+
+
+def _dimension_columns() -> list[sa.Column]:
+    return [
+        sa.Column("user_id", sa.String(length=255), server_default="", nullable=False),
+        sa.Column("client_id", sa.String(length=255), server_default="", nullable=False),
+        sa.Column("agent_id", sa.String(length=255), nullable=False),
+        sa.Column("provider", sa.String(length=64), nullable=False),
+        sa.Column("model_id", sa.String(length=255), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, bucket_type, bucket_expr in (
+        ("agent_usage_hourly", sa.DateTime(timezone=True), "date_trunc('hour', created_at, 'UTC')"),
+        ("agent_usage_daily", sa.Date(), "(created_at AT TIME ZONE 'UTC')::date"),
+    ):
+        op.create_table(
+            table,
+            sa.Column("bucket", bucket_type, nullable=False),
+            *_dimension_columns(),
+            *_measure_columns(),
+            sa.PrimaryKeyConstraint(
+                "bucket", "user_id", "client_id", "agent_id", "provider", "model_id"
+            ),
+        )
+        op.create_index(f"ix_{table}_user_id_bucket", table, ["user_id", "bucket"], unique=False)
+        op.execute(
+            f"""
+            INSERT INTO {table} (
+                bucket, user_id, client_id, agent_id, provider, model_id, {", ".join(MEASURES)}
+            )
+            SELECT
+                {bucket_expr}, COALESCE(user_id, ''), COALESCE(client_id, ''),
+                agent_id, provider, model_id, {MEASURES_FROM_RAW}
+            FROM agent_message_usage
+            GROUP BY 1, 2, 3, 4, 5, 6
+            """
+        )
+
+    op.create_table(
+        "agent_thread_usage",
+        sa.Column("thread_id", sa.String(length=128), nullable=False),
+        *_measure_columns(),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("thread_id"),
+    )
+    op.execute(
+        f"""
+        INSERT INTO agent_thread_usage (thread_id, {", ".join(MEASURES)}, last_used_at)
+        SELECT thread_id, {MEASURES_FROM_RAW}, max(created_at)
+        FROM agent_message_usage
+        GROUP BY thread_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("agent_thread_usage")
+    op.drop_index("ix_agent_usage_daily_user_id_bucket", table_name="agent_usage_daily")
+    op.drop_table("agent_usage_daily")
+    op.drop_index("ix_agent_usage_hourly_user_id_bucket", table_name="agent_usage_hourly")
+    op.drop_table("agent_usage_hourly")
@@ -0,0 +1,54 @@
+"""add model_catalog
+
+Revision ID: a8e41d6c0f53
+Revises: 3f1c9a7d2b44
+Create Date: 2026-10-19 11:20:41.502117
+
+Runtime overrides of the built-in Models registry, read by
+api.services.agents.model_catalog when MODEL_CATALOG_FROM_DB=1.
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a8e41d6c0f53"
+down_revision: str | Sequence[str] | None = "3f1c9a7d2b44"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "model_catalog",
+        sa.Column("provider", sa.String(length=64), nullable=False),
+        sa.Column("model_id", sa.String(length=255), nullable=False),
+        sa.Column(
+            "config",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default=sa.text("'{}'::jsonb"),
+            nullable=False,
+        ),
+        sa.Column("enabled", sa.Boolean(), server_default=sa.text("true"), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("provider", "model_id"),
+    )
+    op.execute(
+        "CREATE TRIGGER update_model_catalog_updated_at BEFORE UPDATE ON model_catalog FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column();"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS update_model_catalog_updated_at ON model_catalog")
+    op.drop_table("model_catalog")
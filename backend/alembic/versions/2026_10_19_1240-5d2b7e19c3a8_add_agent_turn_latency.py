@@ -0,0 +1,95 @@
+"""add agent_turn_latency
+
+Revision ID: 5d2b7e19c3a8
+Revises: a8e41d6c0f53
+Create Date: 2026-10-19 12:40:17.630952
+
+One latency breakdown row per chat turn (see api.core.agents.latency), written by the
+usage writer next to agent_message_usage and joinable with it on (thread_id, message_id).
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d2b7e19c3a8"
+down_revision: str | Sequence[str] | None = "a8e41d6c0f53"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+DURATIONS = (
+    "queue_wait_ms",
+    "checkpoint_load_ms",
+    "generation_ms",
+    "llm_ms",
+    "tool_ms",
+    "persistence_ms",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "agent_turn_latency",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("thread_id", sa.String(length=128), nullable=False),
+        sa.Column("message_id", sa.String(length=64), nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=True),
+        sa.Column("client_id", sa.String(length=255), nullable=True),
+        sa.Column("agent_id", sa.String(length=255), nullable=False),
+        sa.Column("provider", sa.String(length=64), nullable=True),
+        sa.Column("model_id", sa.String(length=255), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        *[sa.Column(name, sa.Float(), server_default="0", nullable=False) for name in DURATIONS],
+        sa.Column("ttft_ms", sa.Float(), nullable=True),
+        sa.Column("model_ttft_ms", sa.Float(), nullable=True),
+        sa.Column("llm_calls", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "tools",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default=sa.text("'[]'::jsonb"),
+            nullable=False,
+        ),
+        sa.Column("total_ms", sa.Float(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_agent_turn_latency_thread_id_message_id",
+        "agent_turn_latency",
+        ["thread_id", "message_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_agent_turn_latency_agent_id_created_at",
+        "agent_turn_latency",
+        ["agent_id", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_agent_turn_latency_model_created_at",
+        "agent_turn_latency",
+        ["provider", "model_id", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_agent_turn_latency_created_at_brin",
+        "agent_turn_latency",
+        ["created_at"],
+        unique=False,
+        postgresql_using="brin",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("agent_turn_latency")
@@ -0,0 +1,56 @@
+"""add provider_rate_limit_demand
+
+Revision ID: c7a3e58d91f2
+Revises: 5d2b7e19c3a8
+Create Date: 2026-10-19 14:10:52.184306
+
+Per-worker demand for every rate-limited model, used by api.services.agents.rate_limits to
+split RPM/TPM limits between Granian workers. UNLOGGED: the rows are rewritten every few
+seconds and losing them only resets the shares for one sync interval.
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7a3e58d91f2"
+down_revision: str | Sequence[str] | None = "5d2b7e19c3a8"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "provider_rate_limit_demand",
+        sa.Column("worker_id", sa.String(length=128), nullable=False),
+        sa.Column("provider", sa.String(length=64), nullable=False),
+        sa.Column("model_id", sa.String(length=255), nullable=False),
+        sa.Column("requests_per_min", sa.Float(), server_default="0", nullable=False),
+        sa.Column("tokens_per_min", sa.Float(), server_default="0", nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("worker_id", "provider", "model_id"),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index(
+        "ix_provider_rate_limit_demand_updated_at",
+        "provider_rate_limit_demand",
+        ["updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_provider_rate_limit_demand_updated_at", table_name="provider_rate_limit_demand"
+    )
+    op.drop_table("provider_rate_limit_demand")
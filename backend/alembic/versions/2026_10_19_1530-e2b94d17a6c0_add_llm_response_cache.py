@@ -0,0 +1,60 @@
+"""add llm_response_cache
+
+Revision ID: e2b94d17a6c0
+Revises: c7a3e58d91f2
+Create Date: 2026-10-19 15:30:27.640913
+
+Shared tier of the exact-match LLM response cache (api.core.agents.response_cache), and
+agent_message_usage.response_cache ("hit" / "miss") so cache hits show up in usage. The
+cache table is UNLOGGED: losing it in a crash only turns the next calls into misses.
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b94d17a6c0"
+down_revision: str | Sequence[str] | None = "c7a3e58d91f2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "llm_response_cache",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("provider", sa.String(length=64), nullable=False),
+        sa.Column("model_id", sa.String(length=255), nullable=False),
+        sa.Column("response", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index(
+        "ix_llm_response_cache_expires_at",
+        "llm_response_cache",
+        ["expires_at"],
+        unique=False,
+    )
+    # Added on the partitioned parent, so every partition gets it.
+    op.add_column(
+        "agent_message_usage",
+        sa.Column("response_cache", sa.String(length=8), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("agent_message_usage", "response_cache")
+    op.drop_index("ix_llm_response_cache_expires_at", table_name="llm_response_cache")
+    op.drop_table("llm_response_cache")
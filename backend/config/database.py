@@ -1,8 +1,11 @@
+import os
+import time
 from collections.abc import AsyncGenerator
 
 import asyncpg
 import orjson
 from dotenv import load_dotenv
+from fastapi import Request
 
 from config.tools import getenv_or_raise_exception
 
@@ -30,6 +33,17 @@ class DatabaseConfig:
     )
     POSTGRES_POOL_TIMEOUT: float = float(getenv_or_raise_exception("POSTGRES_POOL_TIMEOUT"))
 
+    # Optional read replica (same database/user/password). Unset = every read hits the primary.
+    POSTGRES_REPLICA_HOST: str | None = os.getenv("POSTGRES_REPLICA_HOST") or None
+    POSTGRES_REPLICA_PORT: str = os.getenv("POSTGRES_REPLICA_PORT") or POSTGRES_PORT
+    POSTGRES_REPLICA_DATABASE_URI: str | None = (
+        f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_REPLICA_HOST}:{POSTGRES_REPLICA_PORT}/{POSTGRES_DB}"
+        if POSTGRES_REPLICA_HOST
+        else None
+    )
+    # Read-your-writes: reads about a thread/user stay on the primary this long after a write.
+    POSTGRES_READ_STICKY_SECONDS: float = float(os.getenv("POSTGRES_READ_STICKY_SECONDS", "5"))
+
 
 database_config = DatabaseConfig()
 
@@ -38,6 +52,11 @@ database_config = DatabaseConfig()
 # ----------------------------------------------------------------------------
 
 asyncpg_pool: asyncpg.Pool | None = None
+asyncpg_read_pool: asyncpg.Pool | None = None
+
+# Monotonic time of the last primary write per key (thread_id / user_id) in this worker.
+_last_primary_write: dict[str, float] = {}
+_STICKY_PRUNE_THRESHOLD = 1024
 
 
 async def init_connection(conn: asyncpg.Connection) -> None:
@@ -66,21 +85,35 @@ async def init_asyncpg_pool() -> None:
     """
     global asyncpg_pool
     if asyncpg_pool is None:
-        asyncpg_pool = await asyncpg.create_pool(
-            dsn=database_config.POSTGRES_DATABASE_URI,
-            min_size=database_config.POSTGRES_POOL_MIN_SIZE,
-            max_size=database_config.POSTGRES_POOL_MAX_SIZE,
-            max_queries=database_config.POSTGRES_POOL_MAX_QUERIES,
-            max_inactive_connection_lifetime=database_config.POSTGRES_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
-            timeout=database_config.POSTGRES_POOL_TIMEOUT,
-            command_timeout=database_config.POSTGRES_POOL_COMMAND_TIMEOUT,
-            init=init_connection,
-        )
+        asyncpg_pool = await _create_pool(database_config.POSTGRES_DATABASE_URI)
+
+
+async def init_asyncpg_read_pool() -> None:
+    """Initializes the read-replica pool (same settings as the primary) when configured."""
+    global asyncpg_read_pool
+    if asyncpg_read_pool is None and database_config.POSTGRES_REPLICA_DATABASE_URI:
+        asyncpg_read_pool = await _create_pool(database_config.POSTGRES_REPLICA_DATABASE_URI)
+
+
+async def _create_pool(dsn: str) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn=dsn,
+        min_size=database_config.POSTGRES_POOL_MIN_SIZE,
+        max_size=database_config.POSTGRES_POOL_MAX_SIZE,
+        max_queries=database_config.POSTGRES_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=database_config.POSTGRES_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+        timeout=database_config.POSTGRES_POOL_TIMEOUT,
+        command_timeout=database_config.POSTGRES_POOL_COMMAND_TIMEOUT,
+        init=init_connection,
+    )
 
 
 async def close_asyncpg_pool() -> None:
-    """Closes the asyncpg connection pool gracefully during shutdown."""
-    global asyncpg_pool
+    """Closes the asyncpg connection pools (primary and replica) gracefully during shutdown."""
+    global asyncpg_pool, asyncpg_read_pool
+    if asyncpg_read_pool:
+        await asyncpg_read_pool.close()
+        asyncpg_read_pool = None
     if asyncpg_pool:
         await asyncpg_pool.close()
         asyncpg_pool = None
@@ -106,3 +139,45 @@ async def get_conn() -> AsyncGenerator[asyncpg.Connection]:
 
     async with asyncpg_pool.acquire() as connection:
         yield connection
+
+
+def mark_primary_write(*keys: str | None) -> None:
+    """Record a write about these thread/user ids so follow-up reads stay on the primary.
+
+    Stickiness is per worker: a read served by another Granian worker within the window
+    can still hit the replica. POSTGRES_READ_STICKY_SECONDS should cover replica lag.
+    """
+    now = time.monotonic()
+    for key in keys:
+        if key:
+            _last_primary_write[key] = now
+
+    horizon = now - database_config.POSTGRES_READ_STICKY_SECONDS
+    if len(_last_primary_write) > _STICKY_PRUNE_THRESHOLD:
+        for key in [k for k, at in _last_primary_write.items() if at < horizon]:
+            del _last_primary_write[key]
+
+
+def _recently_written(*keys: str | None) -> bool:
+    horizon = time.monotonic() - database_config.POSTGRES_READ_STICKY_SECONDS
+    return any(key and _last_primary_write.get(key, 0.0) >= horizon for key in keys)
+
+
+async def get_read_conn(request: Request) -> AsyncGenerator[asyncpg.Connection]:
+    """
+    Dependency that yields a connection for read-only queries.
+    Served by the replica pool when configured, except for a thread/user (taken from the
+    `thread_id` path param or the `user_id` query param) written in the last
+    POSTGRES_READ_STICKY_SECONDS, which is read from the primary (read-your-writes).
+    """
+    if asyncpg_pool is None:
+        await init_asyncpg_pool()
+
+    pool = asyncpg_read_pool or asyncpg_pool
+    if pool is not asyncpg_pool and _recently_written(
+        request.path_params.get("thread_id"), request.query_params.get("user_id")
+    ):
+        pool = asyncpg_pool
+
+    async with pool.acquire() as connection:
+        yield connection
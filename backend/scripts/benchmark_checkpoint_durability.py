@@ -0,0 +1,183 @@
+"""Benchmark: checkpoint round trips per turn under each LangGraph durability mode.
+
+Run from backend dir:
+    uv run python scripts/benchmark_checkpoint_durability.py
+    uv run python scripts/benchmark_checkpoint_durability.py --latency-ms 4 --turns 20
+    uv run python scripts/benchmark_checkpoint_durability.py --postgres
+
+Each turn is a tool loop like weather_agent's: model -> tool -> model. The model is a
+scripted fake (no provider calls), so the only I/O is the checkpointer.
+
+Without --postgres the checkpointer is an InMemorySaver with an artificial delay per call
+(--latency-ms) to emulate a network round trip. With --postgres the real
+AsyncPostgresSaver from config.database is used and every test thread is deleted afterwards.
+
+Counted per turn:
+    aget_tuple  -> checkpoint load at the start of the run
+    aput        -> one checkpoint write (blobs + checkpoint row in one transaction)
+    aput_writes -> pending writes of a task (one executemany)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter
+from typing import Any
+
+from langchain.agents import create_agent
+from langchain.tools import tool
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import InMemorySaver
+
+MODES: tuple[str, ...] = ("sync", "async", "exit")
+
+
+class ScriptedToolModel(BaseChatModel):
+    """Calls `get_weather` once per turn, then answers with the tool result."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-tool-model"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> ScriptedToolModel:  # noqa: ARG002
+        return self
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,  # noqa: ARG002
+        run_manager: Any = None,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ARG002
+    ) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=f"Resumo: {last.content}")
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "get_weather", "args": {"city": "São Paulo"}, "id": uuid.uuid4().hex}
+                ],
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def get_weather(city: str) -> str:
+    """Fake weather lookup."""
+    return f"{city}: 25°C, céu limpo"
+
+
+class RoundTripCounter:
+    """Mixin that counts (and optionally delays) every checkpointer call."""
+
+    calls: Counter[str]
+    latency_s: float = 0.0
+
+    async def _hit(self, name: str) -> None:
+        self.calls[name] += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    async def aget_tuple(self, config):
+        await self._hit("aget_tuple")
+        return await super().aget_tuple(config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        await self._hit("aput")
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await self._hit("aput_writes")
+        return await super().aput_writes(config, writes, task_id, task_path)
+
+
+class CountingMemorySaver(RoundTripCounter, InMemorySaver):
+    def __init__(self, latency_s: float) -> None:
+        super().__init__()
+        self.calls = Counter()
+        self.latency_s = latency_s
+
+
+async def _run_mode(saver: Any, mode: str, turns: int) -> dict[str, float]:
+    agent = create_agent(
+        model=ScriptedToolModel(), tools=[get_weather], system_prompt="", checkpointer=saver
+    )
+    thread_id = f"bench-durability-{mode}-{uuid.uuid4().hex[:8]}"
+    config = {"configurable": {"thread_id": thread_id}}
+    saver.calls.clear()
+
+    started = time.perf_counter()
+    for turn in range(turns):
+        await agent.ainvoke(
+            {"messages": [{"role": "user", "content": f"clima #{turn}?"}]},
+            config=config,
+            durability=mode,
+        )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    # "async" writes may still be in flight when ainvoke returns — LangGraph awaits them
+    # before the run ends, so the counters are final here.
+    row = {name: saver.calls[name] / turns for name in ("aget_tuple", "aput", "aput_writes")}
+    row["round_trips"] = sum(row.values())
+    row["ms_per_turn"] = elapsed_ms / turns
+
+    if hasattr(saver, "adelete_thread"):
+        await saver.adelete_thread(thread_id)
+    return row
+
+
+def _print_table(results: dict[str, dict[str, float]]) -> None:
+    header = f"{'mode':<6} {'aget_tuple':>10} {'aput':>6} {'aput_writes':>11} {'round_trips':>11} {'ms/turn':>9}"
+    print(header)
+    print("-" * len(header))
+    for mode, row in results.items():
+        print(
+            f"{mode:<6} {row['aget_tuple']:>10.1f} {row['aput']:>6.1f} {row['aput_writes']:>11.1f} "
+            f"{row['round_trips']:>11.1f} {row['ms_per_turn']:>9.1f}"
+        )
+
+
+async def _run_postgres(turns: int) -> dict[str, dict[str, float]]:
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+    from config.database import database_config
+
+    class CountingPostgresSaver(RoundTripCounter, AsyncPostgresSaver):
+        pass
+
+    results: dict[str, dict[str, float]] = {}
+    async with CountingPostgresSaver.from_conn_string(
+        database_config.POSTGRES_DATABASE_URI
+    ) as saver:
+        saver.calls = Counter()
+        for mode in MODES:
+            results[mode] = await _run_mode(saver, mode, turns)
+    return results
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="in-memory only")
+    parser.add_argument("--postgres", action="store_true", help="use the real database")
+    args = parser.parse_args()
+
+    if args.postgres:
+        results = await _run_postgres(args.turns)
+    else:
+        results = {
+            mode: await _run_mode(CountingMemorySaver(args.latency_ms / 1000), mode, args.turns)
+            for mode in MODES
+        }
+    print(f"turns={args.turns} backend={'postgres' if args.postgres else 'memory'}")
+    _print_table(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,547 @@
+"""Benchmark: prompt-cache hit rate, TTFT and cost per turn, per model and trim strategy.
+
+Run from backend dir:
+    uv run python scripts/benchmark_prompt_cache.py
+    uv run python scripts/benchmark_prompt_cache.py --out results.json --baseline baseline.json
+    uv run python scripts/benchmark_prompt_cache.py --provider live \
+        --models groq:openai/gpt-oss-120b openai:gpt-5.4-nano --pause 5 --record rec.json
+    uv run python scripts/benchmark_prompt_cache.py --provider replay --recording rec.json
+
+Every (model, scenario, strategy) runs a multi-turn conversation through create_agent
+with the history_window strategy as middleware (HISTORY_WINDOW_STRATEGIES) and an
+InMemorySaver, exactly like a chat thread. Per turn it records input / cache_read / output
+tokens, cache_read ratio, TTFT, total time and cost (compute_cost_usd with the catalog
+prices, so the rounding is the one billed in agent_message_usage).
+
+Providers:
+    simulated  (default, offline) a fake chat model with provider-style prefix caching:
+               the prompt is cached in 128-token blocks once it reaches 1024 tokens (the
+               OpenAI rules) and only for ModelConfigs with supports_prompt_cache.
+               Deterministic token counts, so it can gate regressions in CI.
+    live       init_model(ModelConfig) — real provider calls, needs the API keys.
+               --record saves every response so the run can be replayed offline.
+    replay     serves the responses of a --record file (same models/scenarios/strategies).
+
+Each run starts with a unique line at the top of the system prompt, so strategies never
+warm the provider cache for each other (--shared-cache turns that off).
+
+Scenarios: built-in (see SCENARIOS) or a TOML file passed with --scenarios:
+
+    [[scenario]]
+    name = "support"
+    system_prompt_file = "prompts/support.md"   # or system_prompt = "..."
+    pause_s = 0                                 # wait between turns (--pause overrides)
+    turns = ["Oi!", "E o preço?", "Obrigado"]
+
+--baseline compares the summary with a previous --out file and exits with status 1 when
+a (model, scenario, strategy) lost more than --tolerance of cache_read ratio or got more
+than --tolerance (relative) more expensive. TTFT is reported but never gated.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import statistics
+import sys
+import time
+import tomllib
+import uuid
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import orjson
+from langchain.agents import create_agent
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.checkpoint.memory import InMemorySaver
+from pydantic import Field
+
+from api.core.agents.custom_providers import init_model
+from api.core.agents.history_window import HISTORY_WINDOW_STRATEGIES, TOKEN_HEURISTIC_DIVISOR
+from api.core.agents.models import ModelConfig, compute_cost_usd, model_catalog
+
+CACHE_MIN_TOKENS: int = 1024
+CACHE_BLOCK_TOKENS: int = 128
+DEFAULT_SIMULATED_MODELS: tuple[str, ...] = (
+    "openai:gpt-5.4-nano",
+    "google:gemini-3-flash-preview",
+    "groq:openai/gpt-oss-120b",
+)
+
+
+@dataclass
+class Scenario:
+    name: str
+    system_prompt: str
+    turns: list[str]
+    pause_s: float = 0.0
+
+
+def _catalog_prompt(entries: int) -> str:
+    lines = [
+        "Você é o assistente de vendas de uma concessionária. Responda em português, de forma",
+        "objetiva, usando apenas os dados do catálogo abaixo. Nunca invente preços ou prazos.",
+        "",
+        "CATÁLOGO:",
+    ]
+    for i in range(entries):
+        lines.append(
+            f"- Modelo {i:03d}: motor {1.0 + (i % 8) * 0.2:.1f}, preço a partir de "
+            f"R$ {89_900 + i * 3_150:,}, consumo {9 + i % 6} km/l, garantia de {3 + i % 3} anos, "
+            f"cores disponíveis: {', '.join(('branco', 'prata', 'preto', 'vermelho')[: 1 + i % 4])}."
+        )
+    return "\n".join(lines)
+
+
+_FOLLOW_UPS = [
+    "Oi, bom dia! Estou querendo saber mais sobre o Modelo 012.",
+    "E em relação a financiamento, qual taxa vocês trabalham hoje?",
+    "Tem alguma opção mais econômica com a mesma garantia?",
+    "Compare o consumo do Modelo 012 com o Modelo 027.",
+    "Quais cores estão disponíveis para o mais barato dos dois?",
+    "Dá para agendar um test drive no sábado?",
+    "E se eu der meu carro usado como entrada?",
+    "Resuma tudo o que conversamos em três tópicos.",
+]
+
+SCENARIOS: dict[str, Scenario] = {
+    # Long, stable system prompt: the prefix every turn should reuse.
+    "catalog": Scenario("catalog", _catalog_prompt(120), _FOLLOW_UPS[:4]),
+    # Long session: the sliding strategies start trimming (the cache prefix moves).
+    "long_session": Scenario("long_session", _catalog_prompt(120), _FOLLOW_UPS * 2),
+    # Prompt below the provider's minimum cacheable size: ratio should stay ~0 early on.
+    "short_prompt": Scenario(
+        "short_prompt", "Você é um assistente prestativo. Responda em português.", _FOLLOW_UPS[:4]
+    ),
+}
+
+
+def load_scenarios(path: Path) -> dict[str, Scenario]:
+    data = tomllib.loads(path.read_text(encoding="utf-8"))
+    scenarios: dict[str, Scenario] = {}
+    for raw in data.get("scenario", []):
+        prompt = raw.get("system_prompt")
+        if prompt is None:
+            prompt = (path.parent / raw["system_prompt_file"]).read_text(encoding="utf-8")
+        scenarios[raw["name"]] = Scenario(
+            raw["name"], prompt, list(raw["turns"]), float(raw.get("pause_s", 0))
+        )
+    return scenarios
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // TOKEN_HEURISTIC_DIVISOR
+
+
+def _serialize_prompt(messages: list[BaseMessage]) -> str:
+    return "\n".join(f"{message.type}: {message.text}" for message in messages)
+
+
+class _BenchmarkModel(BaseChatModel):
+    """Streams a response built by `_respond` with the usage/response metadata a provider sends."""
+
+    config: ModelConfig
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> _BenchmarkModel:  # noqa: ARG002
+        return self
+
+    async def _respond(self, messages: list[BaseMessage]) -> tuple[str, dict[str, Any], float]:
+        """(text, usage_metadata, seconds until the first token)."""
+        raise NotImplementedError
+
+    def _metadata(self) -> dict[str, Any]:
+        return {"model_provider": self.config.provider, "model_name": self.config.model_id}
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError("benchmark models are async-only")
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        *args: Any,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ARG002
+    ) -> ChatResult:
+        text, usage, _ = await self._respond(messages)
+        message = AIMessage(content=text, usage_metadata=usage, response_metadata=self._metadata())
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        *args: Any,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ARG002
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text, usage, ttft_s = await self._respond(messages)
+        await asyncio.sleep(ttft_s)
+        for word in text.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"{word} "))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", usage_metadata=usage, response_metadata=self._metadata()
+            )
+        )
+
+
+class SimulatedCacheModel(_BenchmarkModel):
+    """Offline provider: deterministic token counts + block-wise prefix cache."""
+
+    ttft_s: float = 0.02
+    prefix_cache: set[str] = Field(default_factory=set)
+
+    async def _respond(self, messages: list[BaseMessage]) -> tuple[str, dict[str, Any], float]:
+        prompt = _serialize_prompt(messages)
+        input_tokens = _estimate_tokens(prompt)
+        cached = 0
+        if self.config.supports_prompt_cache and input_tokens >= CACHE_MIN_TOKENS:
+            digest = hashlib.sha256()
+            block_chars = CACHE_BLOCK_TOKENS * TOKEN_HEURISTIC_DIVISOR
+            hit = True
+            for end in range(block_chars, len(prompt) + 1, block_chars):
+                digest.update(prompt[end - block_chars : end].encode())
+                key = digest.hexdigest()
+                if (
+                    hit
+                    and key in self.prefix_cache
+                    and end // TOKEN_HEURISTIC_DIVISOR >= CACHE_MIN_TOKENS
+                ):
+                    cached = end // TOKEN_HEURISTIC_DIVISOR
+                elif key not in self.prefix_cache:
+                    hit = False
+                self.prefix_cache.add(key)
+        turn = sum(1 for message in messages if message.type == "human")
+        text = (
+            f"Resposta simulada ao turno {turn}: com base no catálogo, "
+            + "segue a informação solicitada " * 6
+        ).strip()
+        output_tokens = _estimate_tokens(text)
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": cached},
+        }
+        # Cached prefixes are cheaper to prefill: shave the uncached share off TTFT.
+        uncached_share = 1 - cached / input_tokens if input_tokens else 1
+        return text, usage, self.ttft_s * (0.5 + 0.5 * uncached_share)
+
+
+class ReplayModel(_BenchmarkModel):
+    """Serves recorded responses in order for one (model, scenario, strategy) run."""
+
+    responses: list[dict[str, Any]]
+    position: int = 0
+
+    async def _respond(self, messages: list[BaseMessage]) -> tuple[str, dict[str, Any], float]:  # noqa: ARG002
+        if self.position >= len(self.responses):
+            raise RuntimeError("recording has fewer calls than this run makes")
+        recorded = self.responses[self.position]
+        self.position += 1
+        return recorded["text"], recorded["usage"], recorded["ttft_ms"] / 1000
+
+
+@dataclass
+class TurnResult:
+    model: str
+    scenario: str
+    strategy: str
+    turn: int
+    llm_calls: int = 0
+    prompt_messages: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    cache_ratio: float = 0.0
+    cost_usd: float = 0.0
+    ttft_ms: float | None = None
+    total_ms: float = 0.0
+    error: str | None = None
+    responses: list[dict[str, Any]] = field(default_factory=list, repr=False)
+
+
+def _model_label(cfg: ModelConfig) -> str:
+    return f"{cfg.provider}:{cfg.model_id}"
+
+
+def _run_key(model: str, scenario: str, strategy: str) -> str:
+    return f"{model}|{scenario}|{strategy}"
+
+
+def _resolve_models(keys: list[str]) -> list[ModelConfig]:
+    configs = []
+    for key in keys:
+        provider, _, model_id = key.partition(":")
+        cfg = model_catalog.get(provider, model_id)
+        if cfg is None:
+            raise SystemExit(f"unknown model '{key}' (expected provider:model_id from the catalog)")
+        configs.append(cfg)
+    return configs
+
+
+async def _run_turn(agent: Any, config: dict, result: TurnResult, query: str) -> None:
+    started = time.perf_counter()
+    # run_id -> [call start, first chunk] of every LLM call of the turn
+    calls: dict[str, list[float | None]] = {}
+    async for event in agent.astream_events(
+        {"messages": [{"role": "user", "content": query}]}, config=config, version="v2"
+    ):
+        kind = event["event"]
+        if kind == "on_chat_model_start":
+            calls[event["run_id"]] = [time.perf_counter(), None]
+            messages = (event["data"].get("input") or {}).get("messages") or [[]]
+            result.prompt_messages = len(messages[0])
+        elif kind == "on_chat_model_stream" and event["data"]["chunk"].text:
+            call = calls.get(event["run_id"])
+            if call is not None and call[1] is None:
+                call[1] = time.perf_counter()
+            if result.ttft_ms is None:
+                result.ttft_ms = (time.perf_counter() - started) * 1000
+        elif kind == "on_chat_model_end":
+            call_started, first_chunk = calls.pop(event["run_id"], [started, None])
+            output = event["data"]["output"]
+            usage = getattr(output, "usage_metadata", None) or {}
+            result.llm_calls += 1
+            result.input_tokens += int(usage.get("input_tokens") or 0)
+            result.cached_tokens += int(
+                (usage.get("input_token_details") or {}).get("cache_read") or 0
+            )
+            result.output_tokens += int(usage.get("output_tokens") or 0)
+            result.responses.append(
+                {
+                    "text": output.text,
+                    "usage": usage,
+                    "ttft_ms": ((first_chunk or time.perf_counter()) - call_started) * 1000,
+                }
+            )
+    result.total_ms = (time.perf_counter() - started) * 1000
+
+
+async def run_benchmark(
+    configs: list[ModelConfig],
+    scenarios: list[Scenario],
+    strategies: list[str],
+    *,
+    provider: str,
+    recording: dict[str, list[dict[str, Any]]] | None,
+    pause_s: float | None,
+    shared_cache: bool,
+    fake_ttft_ms: float,
+) -> list[TurnResult]:
+    results: list[TurnResult] = []
+    for cfg in configs:
+        label = _model_label(cfg)
+        for scenario in scenarios:
+            for strategy in strategies:
+                key = _run_key(label, scenario.name, strategy)
+                if provider == "simulated":
+                    model = SimulatedCacheModel(config=cfg, ttft_s=fake_ttft_ms / 1000)
+                elif provider == "replay":
+                    if key not in recording:
+                        print(f"  {key}: not in the recording, skipped")
+                        continue
+                    model = ReplayModel(config=cfg, responses=recording[key])
+                else:
+                    model = init_model(cfg)
+
+                middleware = HISTORY_WINDOW_STRATEGIES[strategy]
+                system_prompt = scenario.system_prompt
+                if not shared_cache and provider != "replay":
+                    system_prompt = f"[benchmark run {uuid.uuid4().hex}]\n{system_prompt}"
+                agent = create_agent(
+                    model=model,
+                    tools=[],
+                    system_prompt=system_prompt,
+                    middleware=[middleware] if middleware is not None else [],
+                    checkpointer=InMemorySaver(),
+                )
+                config = {"configurable": {"thread_id": f"bench-cache-{uuid.uuid4().hex[:8]}"}}
+
+                for turn, query in enumerate(scenario.turns, 1):
+                    result = TurnResult(label, scenario.name, strategy, turn)
+                    try:
+                        await _run_turn(agent, config, result, query)
+                    except Exception as e:
+                        result.error = f"{type(e).__name__}: {e}"
+                        print(f"  {key} turn {turn} ERROR {result.error}")
+                    usage = {
+                        "input_tokens": result.input_tokens,
+                        "output_tokens": result.output_tokens,
+                        "input_token_details": {"cache_read": result.cached_tokens},
+                    }
+                    result.cost_usd = compute_cost_usd(usage, cfg)
+                    if result.input_tokens:
+                        result.cache_ratio = result.cached_tokens / result.input_tokens
+                    results.append(result)
+                    if result.error:
+                        break
+                    wait = scenario.pause_s if pause_s is None else pause_s
+                    if wait and turn < len(scenario.turns):
+                        await asyncio.sleep(wait)
+    return results
+
+
+def summarize(results: list[TurnResult]) -> list[dict[str, Any]]:
+    runs: dict[tuple[str, str, str], list[TurnResult]] = {}
+    for result in results:
+        runs.setdefault((result.model, result.scenario, result.strategy), []).append(result)
+    summary = []
+    for (model, scenario, strategy), turns in runs.items():
+        input_tokens = sum(t.input_tokens for t in turns)
+        cached = sum(t.cached_tokens for t in turns)
+        ttfts = [t.ttft_ms for t in turns if t.ttft_ms is not None]
+        summary.append(
+            {
+                "model": model,
+                "scenario": scenario,
+                "strategy": strategy,
+                "turns": len(turns),
+                "errors": sum(1 for t in turns if t.error),
+                "input_tokens": input_tokens,
+                "cached_tokens": cached,
+                "output_tokens": sum(t.output_tokens for t in turns),
+                # Token-weighted over the whole conversation.
+                "cache_ratio": round(cached / input_tokens, 4) if input_tokens else 0.0,
+                "cost_usd": round(sum(t.cost_usd for t in turns), 6),
+                "cost_per_turn_usd": round(sum(t.cost_usd for t in turns) / len(turns), 6),
+                "ttft_p50_ms": round(statistics.median(ttfts), 1) if ttfts else None,
+                "ttft_max_ms": round(max(ttfts), 1) if ttfts else None,
+            }
+        )
+    return summary
+
+
+def compare_with_baseline(
+    summary: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float
+) -> list[str]:
+    """Regressions of cache_ratio (absolute) and cost (relative) against a previous run."""
+    previous = {(row["model"], row["scenario"], row["strategy"]): row for row in baseline}
+    regressions = []
+    for row in summary:
+        old = previous.get((row["model"], row["scenario"], row["strategy"]))
+        if old is None:
+            continue
+        label = f"{row['model']} / {row['scenario']} / {row['strategy']}"
+        if row["cache_ratio"] < old["cache_ratio"] - tolerance:
+            regressions.append(
+                f"{label}: cache_ratio {old['cache_ratio']:.4f} -> {row['cache_ratio']:.4f}"
+            )
+        if row["cost_usd"] > old["cost_usd"] * (1 + tolerance) + 1e-6:
+            regressions.append(
+                f"{label}: cost US$ {old['cost_usd']:.6f} -> US$ {row['cost_usd']:.6f}"
+            )
+    return regressions
+
+
+def _print_summary(summary: list[dict[str, Any]]) -> None:
+    header = (
+        f"{'model':<32} {'scenario':<13} {'strategy':<8} {'turns':>5} {'cache%':>7} "
+        f"{'input':>8} {'US$/turn':>10} {'ttft p50':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in summary:
+        ttft = f"{row['ttft_p50_ms']:.0f}ms" if row["ttft_p50_ms"] is not None else "-"
+        print(
+            f"{row['model'][:32]:<32} {row['scenario'][:13]:<13} {row['strategy']:<8} "
+            f"{row['turns']:>5} {row['cache_ratio'] * 100:>6.1f}% {row['input_tokens']:>8} "
+            f"{row['cost_per_turn_usd']:>10.6f} {ttft:>9}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--provider", choices=("simulated", "live", "replay"), default="simulated")
+    parser.add_argument("--models", nargs="+", default=None, help="provider:model_id keys")
+    parser.add_argument("--scenarios", type=Path, default=None, help="TOML scenario file")
+    parser.add_argument("--only", nargs="+", default=None, help="scenario names to run")
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=tuple(HISTORY_WINDOW_STRATEGIES),
+        default=list(HISTORY_WINDOW_STRATEGIES),
+    )
+    parser.add_argument("--pause", type=float, default=None, help="seconds between turns")
+    parser.add_argument("--shared-cache", action="store_true", help="no per-run prompt nonce")
+    parser.add_argument("--fake-ttft-ms", type=float, default=20.0, help="simulated only")
+    parser.add_argument("--record", type=Path, default=None, help="save responses for replay")
+    parser.add_argument("--recording", type=Path, default=None, help="replay input")
+    parser.add_argument("--out", type=Path, default=None, help="write results as JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="previous --out file")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios) if args.scenarios else SCENARIOS
+    if args.only:
+        scenarios = {name: scenarios[name] for name in args.only}
+
+    recording = None
+    if args.provider == "replay":
+        if args.recording is None:
+            raise SystemExit("--provider replay needs --recording")
+        recording = orjson.loads(args.recording.read_bytes())
+        model_keys = args.models or sorted({key.split("|")[0] for key in recording})
+    elif args.provider == "live":
+        if not args.models:
+            raise SystemExit("--provider live needs --models (real calls cost money)")
+        model_keys = args.models
+    else:
+        model_keys = args.models or list(DEFAULT_SIMULATED_MODELS)
+
+    configs = _resolve_models(model_keys)
+    results = await run_benchmark(
+        configs,
+        list(scenarios.values()),
+        args.strategies,
+        provider=args.provider,
+        recording=recording,
+        pause_s=args.pause,
+        shared_cache=args.shared_cache,
+        fake_ttft_ms=args.fake_ttft_ms,
+    )
+    summary = summarize(results)
+    print(f"provider={args.provider} models={len(configs)} scenarios={len(scenarios)}")
+    _print_summary(summary)
+
+    if args.record is not None and args.provider != "replay":
+        recorded: dict[str, list[dict[str, Any]]] = {}
+        for result in results:
+            key = _run_key(result.model, result.scenario, result.strategy)
+            recorded.setdefault(key, []).extend(result.responses)
+        args.record.write_bytes(orjson.dumps(recorded, option=orjson.OPT_INDENT_2))
+        print(f"recording written to {args.record}")
+
+    if args.out is not None:
+        turns = []
+        for result in results:
+            row = asdict(result)
+            del row["responses"]
+            turns.append(row)
+        payload = {
+            "meta": {"provider": args.provider, "strategies": args.strategies},
+            "turns": turns,
+            "summary": summary,
+        }
+        args.out.write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+        print(f"results written to {args.out}")
+
+    if args.baseline is not None:
+        baseline = orjson.loads(args.baseline.read_bytes())["summary"]
+        regressions = compare_with_baseline(summary, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS vs baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nno regression vs {args.baseline} (tolerance {args.tolerance})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""Export agent_message_usage to monthly Parquet partitions, incrementally.
+
+Reads from the read replica when POSTGRES_REPLICA_HOST is set (else the primary) through a
+server-side cursor, so neither side holds more than one chunk in memory. Each run appends
+new part files and remembers the last exported id in <out>/_export_state.json.
+
+Run from backend dir:
+    uv run python scripts/export_usage.py --out exports/usage
+    uv run python scripts/export_usage.py --out exports/usage-full --full
+
+Read back, e.g. with DuckDB:  SELECT * FROM 'exports/usage/**/*.parquet'
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+
+import asyncpg
+
+from api.services.agents.usage_export import export_usage_to_directory
+from config.database import database_config
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, required=True, help="output directory")
+    parser.add_argument("--full", action="store_true", help="ignore the saved state")
+    args = parser.parse_args()
+
+    dsn = database_config.POSTGRES_REPLICA_DATABASE_URI or database_config.POSTGRES_DATABASE_URI
+    conn = await asyncpg.connect(dsn)
+    try:
+        summary = await export_usage_to_directory(conn, args.out, full=args.full)
+    finally:
+        await conn.close()
+
+    print(f"ids {summary['after_id'] + 1}..{summary['last_id']}")
+    for month, rows in sorted(summary["rows_by_month"].items()):
+        print(f"  {month}: {rows} rows")
+    for path in summary["files"]:
+        print(f"  wrote {path}")
+    if not summary["files"]:
+        print("  nothing new to export")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""Manage the monthly partitions of agent_message_usage by hand (or from cron).
+
+The API already runs the same maintenance in the background (api.services.agents.maintenance);
+this script is for one-off runs, e.g. before a big backfill or to archive old months.
+
+Run from backend dir:
+    uv run python scripts/manage_usage_partitions.py --list
+    uv run python scripts/manage_usage_partitions.py --premake 6
+    uv run python scripts/manage_usage_partitions.py --retention-months 12 [--drop]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+import asyncpg
+
+from api.repositories.agents.usage_partitions import (
+    detach_expired_usage_partitions,
+    ensure_usage_partitions,
+    list_usage_partitions,
+)
+from config.database import database_config
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--list", action="store_true", help="list attached partitions")
+    parser.add_argument("--premake", type=int, default=3, help="months to create ahead")
+    parser.add_argument("--retention-months", type=int, default=None)
+    parser.add_argument("--drop", action="store_true", help="drop instead of only detaching")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(database_config.POSTGRES_DATABASE_URI)
+    try:
+        if args.list:
+            for name in await list_usage_partitions(conn):
+                print(name)
+            return
+
+        created = await ensure_usage_partitions(conn, args.premake)
+        print(f"created: {created or '-'}")
+        if args.retention_months is not None:
+            expired = await detach_expired_usage_partitions(
+                conn, args.retention_months, drop=args.drop
+            )
+            print(f"{'dropped' if args.drop else 'detached'}: {expired or '-'}")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
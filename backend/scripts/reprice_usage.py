@@ -0,0 +1,102 @@
+"""Recompute agent_message_usage.cost_usd (and the usage rollups) with current prices.
+
+Prices come from the model catalog: the built-in Models registry plus the overrides of
+MODEL_CATALOG_PATH / MODEL_CATALOG_FROM_DB, so the usual flow after a price change is
+"fix the catalog, dry-run, apply". Works one day (--batch-hours) at a time, each window in
+its own short transaction, so concurrent usage inserts are never blocked for long.
+
+Run from backend dir:
+    uv run python scripts/reprice_usage.py --since 2026-10-01 --until 2026-11-01 --dry-run
+    uv run python scripts/reprice_usage.py --since 2026-10-01 --provider groq \
+        --model-id meta-llama/llama-4-scout-17b-16e-instruct
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+from collections import defaultdict
+
+import asyncpg
+
+from api.core.agents.models import canonical_provider, model_catalog
+from api.repositories.agents.usage_repricing import reprice_usage_window
+from api.services.agents.model_catalog import (
+    MODEL_CATALOG_FROM_DB,
+    MODEL_CATALOG_PATH,
+    reload_model_catalog,
+)
+from config import database as database_module
+from config.database import database_config
+
+
+def _utc(value: str) -> dt.datetime:
+    parsed = dt.datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt.UTC)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--since", type=_utc, required=True, help="ISO date/datetime (UTC)")
+    parser.add_argument("--until", type=_utc, default=None, help="exclusive; default now")
+    parser.add_argument("--provider", default=None)
+    parser.add_argument("--model-id", default=None)
+    parser.add_argument("--batch-hours", type=float, default=24)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds between batches")
+    parser.add_argument("--dry-run", action="store_true", help="report the delta only")
+    args = parser.parse_args()
+
+    until = args.until or dt.datetime.now(dt.UTC)
+    if MODEL_CATALOG_PATH is not None or MODEL_CATALOG_FROM_DB:
+        await database_module.init_asyncpg_pool()
+        try:
+            await reload_model_catalog()
+        finally:
+            await database_module.close_asyncpg_pool()
+
+    prices = [
+        cfg
+        for cfg in model_catalog.all()
+        if (args.provider is None or cfg.provider == canonical_provider(args.provider))
+        and (args.model_id is None or cfg.model_id == args.model_id)
+    ]
+    if not prices:
+        raise SystemExit("no catalog model matches --provider/--model-id")
+
+    totals: dict[tuple[str, str], list[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    step = dt.timedelta(hours=args.batch_hours)
+    conn = await asyncpg.connect(database_config.POSTGRES_DATABASE_URI)
+    try:
+        window_start = args.since
+        while window_start < until:
+            window_end = min(window_start + step, until)
+            for row in await reprice_usage_window(
+                conn, prices, window_start, window_end, dry_run=args.dry_run
+            ):
+                entry = totals[(row["provider"], row["model_id"])]
+                entry[0] += row["rows"]
+                entry[1] += row["old_cost_usd"]
+                entry[2] += row["new_cost_usd"]
+            print(f"{window_start.isoformat()} .. {window_end.isoformat()} done")
+            window_start = window_end
+            if args.pause:
+                await asyncio.sleep(args.pause)
+    finally:
+        await conn.close()
+
+    print(f"\n{'DRY RUN — nothing written' if args.dry_run else 'Applied'}")
+    print(
+        f"{'provider':<10} {'model_id':<45} {'rows':>8} {'old US$':>12} {'new US$':>12} {'delta':>12}"
+    )
+    for (provider, model_id), (rows, old, new) in sorted(totals.items()):
+        print(
+            f"{provider:<10} {model_id:<45} {int(rows):>8} {old:>12.6f} {new:>12.6f} "
+            f"{new - old:>+12.6f}"
+        )
+    if not totals:
+        print("(no stored cost differs from the catalog prices)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
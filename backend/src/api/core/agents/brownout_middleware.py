@@ -0,0 +1,75 @@
+"""Serve model calls with the agent's brownout fallback model while the worker is overloaded.
+
+At brownout level "fallback" (api.services.agents.brownout) every model call of an agent
+with AgentConfig.brownout.fallback_model goes to that model, and its answers carry
+response_metadata["brownout"] = "fallback" (the semantic cache doesn't keep them). The
+"reduced" level is applied by LatencyProfileMiddleware, which serves the policy's latency
+profile.
+
+Same place as budget_middleware, before failover / router (which then stay out of the
+way, as for a budget downgrade):
+
+    create_agent(..., middleware=[budget_middleware, brownout_middleware, failover,
+                                  latency_profile_middleware, ...])
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.messages import AIMessage
+from langgraph.config import get_config
+
+from api.services.agents.brownout import FALLBACK, LEVELS, brownout
+
+
+def _apply_brownout(request: ModelRequest[Any]) -> ModelRequest[Any] | None:
+    """The request on the fallback model, or None when the call isn't stepped down."""
+    if brownout.level < FALLBACK:
+        return None
+    try:
+        agent_id = (get_config().get("metadata") or {}).get("agent_id")
+    except RuntimeError:
+        return None
+    fallback = brownout.fallback_for(str(agent_id)) if agent_id else None
+    return None if fallback is None else request.override(model=fallback)
+
+
+def _tag(response: ModelResponse[Any]) -> ModelResponse[Any]:
+    for message in response.result:
+        if isinstance(message, AIMessage):
+            message.response_metadata["brownout"] = LEVELS[FALLBACK]
+    return response
+
+
+class BrownoutMiddleware(AgentMiddleware):
+    """Swap the model for the brownout fallback model at level "fallback"."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        stepped_down = _apply_brownout(request)
+        if stepped_down is None:
+            return await handler(request)
+        return _tag(await handler(stepped_down))
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        stepped_down = _apply_brownout(request)
+        if stepped_down is None:
+            return handler(request)
+        return _tag(handler(stepped_down))
+
+
+brownout_middleware = BrownoutMiddleware()
@@ -0,0 +1,82 @@
+"""Budget check before every LLM call of the tool loop.
+
+The chat route already checks budgets once before a run starts; this middleware repeats
+the (in-memory) check before each model call, so a long tool loop stops — or moves to
+the agent's fallback model — as soon as the budget runs out mid-run.
+
+The agent/user/client come from the run's `metadata` (set by stream_agent and execute_agent,
+the same values UsageRecorderCallback uses). Calls without metadata are only checked
+against the agent-wide budget. Answers of the fallback model carry
+response_metadata["budget"] = "downgrade" (the semantic cache doesn't store them).
+
+    create_agent(..., middleware=[budget_middleware])
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.messages import AIMessage
+from langgraph.config import get_config
+
+from api.services.agents.budgets import BudgetExceededError, budget_ledger
+
+
+def _decide(request: ModelRequest[Any]) -> ModelRequest[Any]:
+    try:
+        metadata = get_config().get("metadata") or {}
+    except RuntimeError:
+        metadata = {}
+    agent_id = metadata.get("agent_id")
+    if not agent_id:
+        return request
+    decision = budget_ledger.check(
+        str(agent_id),
+        str(metadata["user_id"]) if metadata.get("user_id") else None,
+        str(metadata["client_id"]) if metadata.get("client_id") else None,
+    )
+    if decision.action == "reject":
+        raise BudgetExceededError(decision.reason)
+    if decision.action == "downgrade":
+        return request.override(model=decision.fallback_model)
+    return request
+
+
+def _tag(response: ModelResponse[Any]) -> ModelResponse[Any]:
+    for message in response.result:
+        if isinstance(message, AIMessage):
+            message.response_metadata["budget"] = "downgrade"
+    return response
+
+
+class BudgetMiddleware(AgentMiddleware):
+    """Reject or downgrade model calls once a budget in `budget_ledger` is exhausted."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        decided = _decide(request)
+        if decided is request:
+            return await handler(request)
+        return _tag(await handler(decided))
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        decided = _decide(request)
+        if decided is request:
+            return handler(request)
+        return _tag(handler(decided))
+
+
+budget_middleware = BudgetMiddleware()
@@ -7,37 +7,60 @@ em qualquer agente — é o ponto único de contabilização.
 Fluxo:
     on_chat_model_start  -> guarda metadata por run_id
     on_llm_end           -> extrai usage_metadata da AIMessage final, calcula custo
-                            via tabela de preços e insere uma linha
+                            via tabela de preços e enfileira a linha no usage_writer
+                            (gravação em lote, fora do caminho do stream) e soma
+                            nos contadores de budget (budget_ledger)
     on_llm_error         -> só limpa o cache de metadata pra não vazar memória
 
+Runs que nunca chegam em on_llm_end/on_llm_error (stream cancelado pelo cliente, task
+morta) deixariam metadata pra sempre em `_meta_by_run`; entradas mais velhas que
+META_TTL_S são varridas no máximo a cada META_SWEEP_INTERVAL_S.
+
 Metadata esperado em RunnableConfig.metadata:
     - thread_id   (obrigatório; sem ele a linha não é gravada)
     - agent_id    (obrigatório)
     - user_id     (opcional)
     - client_id   (opcional)
+    - message_id  (opcional; id do turno, o mesmo de agent_turn_latency — sem ele cada
+                   chamada usa o id da própria AIMessage)
 """
 
 from __future__ import annotations
 
-from traceback import format_exc
+import time
 from typing import Any
 from uuid import UUID
 
 from langchain_core.callbacks import AsyncCallbackHandler
 from langchain_core.outputs import LLMResult
 
-from api.repositories.agents.usage import (
-    build_usage_from_ai_message,
-    insert_agent_message_usage,
-)
-from config import database as database_module
+from api.core.agents import metrics
+from api.repositories.agents.usage import build_usage_from_ai_message
+from api.services.agents.budgets import budget_ledger
+from api.services.agents.usage_writer import usage_writer
+
+META_TTL_S: float = 15 * 60
+META_SWEEP_INTERVAL_S: float = 60
 
 
 class UsageRecorderCallback(AsyncCallbackHandler):
     """Persiste agent_message_usage automaticamente em todo `on_llm_end`."""
 
     def __init__(self) -> None:
-        self._meta_by_run: dict[UUID, dict[str, Any]] = {}
+        # run_id -> (monotonic de quando o run começou, metadata)
+        self._meta_by_run: dict[UUID, tuple[float, dict[str, Any]]] = {}
+        self._last_sweep = time.monotonic()
+
+    def _evict_stale(self, now: float) -> None:
+        if now - self._last_sweep < META_SWEEP_INTERVAL_S:
+            return
+        self._last_sweep = now
+        stale = [run_id for run_id, (ts, _) in self._meta_by_run.items() if now - ts > META_TTL_S]
+        for run_id in stale:
+            del self._meta_by_run[run_id]
+        if stale:
+            metrics.increment("usage_recorder_meta_evicted", len(stale))
+        metrics.set_gauge("usage_recorder_meta_entries", len(self._meta_by_run))
 
     async def on_chat_model_start(
         self,
@@ -50,8 +73,10 @@ class UsageRecorderCallback(AsyncCallbackHandler):
         metadata: dict[str, Any] | None = None,
         **kwargs: Any,  # noqa: ARG002
     ) -> None:
+        now = time.monotonic()
+        self._evict_stale(now)
         if metadata:
-            self._meta_by_run[run_id] = dict(metadata)
+            self._meta_by_run[run_id] = (now, dict(metadata))
 
     async def on_llm_error(
         self,
@@ -71,7 +96,7 @@ class UsageRecorderCallback(AsyncCallbackHandler):
         parent_run_id: UUID | None = None,  # noqa: ARG002
         **kwargs: Any,  # noqa: ARG002
     ) -> None:
-        meta = self._meta_by_run.pop(run_id, {})
+        _, meta = self._meta_by_run.pop(run_id, (0.0, {}))
         thread_id = meta.get("thread_id")
         agent_id = meta.get("agent_id")
         if not thread_id or not agent_id:
@@ -84,22 +109,21 @@ class UsageRecorderCallback(AsyncCallbackHandler):
         usage_row = build_usage_from_ai_message(
             ai_msg,
             thread_id=str(thread_id),
-            message_id=str(getattr(ai_msg, "id", "") or run_id),
+            message_id=str(meta.get("message_id") or getattr(ai_msg, "id", "") or run_id),
             agent_id=str(agent_id),
             user_id=str(meta["user_id"]) if meta.get("user_id") is not None else None,
             client_id=str(meta["client_id"]) if meta.get("client_id") is not None else None,
+            # Tagged by init_model on the model that ran (after any failover / downgrade).
+            served_by=(
+                (str(meta["model_provider"]), str(meta["model_id"]))
+                if meta.get("model_provider") and meta.get("model_id")
+                else None
+            ),
         )
         if usage_row is None:
             return
-
-        pool = getattr(database_module, "asyncpg_pool", None)
-        if pool is None:
-            return
-        try:
-            async with pool.acquire() as conn:
-                await insert_agent_message_usage(conn, usage_row)
-        except Exception:
-            print(f"[UsageRecorderCallback] insert failed\n{format_exc()}")
+        usage_writer.enqueue(usage_row)
+        budget_ledger.record(usage_row)
 
 
 usage_recorder = UsageRecorderCallback()
@@ -1,7 +1,45 @@
+import time
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 
+from api.core.agents.latency import current_turn
 from config.database import database_config
 
+
+class TimedPostgresSaver(AsyncPostgresSaver):
+    """AsyncPostgresSaver that adds its load/write time to the current turn's TurnTimer."""
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        started = time.perf_counter()
+        try:
+            return await super().aget_tuple(config)
+        finally:
+            turn = current_turn.get()
+            if turn is not None:
+                turn.checkpoint_load_s += time.perf_counter() - started
+
+    async def aput(self, *args: Any, **kwargs: Any) -> RunnableConfig:
+        started = time.perf_counter()
+        try:
+            return await super().aput(*args, **kwargs)
+        finally:
+            turn = current_turn.get()
+            if turn is not None:
+                turn.checkpoint_write_s += time.perf_counter() - started
+
+    async def aput_writes(self, *args: Any, **kwargs: Any) -> None:
+        started = time.perf_counter()
+        try:
+            await super().aput_writes(*args, **kwargs)
+        finally:
+            turn = current_turn.get()
+            if turn is not None:
+                turn.checkpoint_write_s += time.perf_counter() - started
+
+
 checkpointer: AsyncPostgresSaver | None = None
 _conn_cm: AsyncPostgresSaver | None = None
 
@@ -9,7 +47,7 @@ _conn_cm: AsyncPostgresSaver | None = None
 async def init_checkpointer() -> AsyncPostgresSaver:
     """Initialize the async Postgres checkpointer."""
     global checkpointer, _conn_cm
-    _conn_cm = AsyncPostgresSaver.from_conn_string(database_config.POSTGRES_DATABASE_URI)
+    _conn_cm = TimedPostgresSaver.from_conn_string(database_config.POSTGRES_DATABASE_URI)
     checkpointer = await _conn_cm.__aenter__()
 
     return checkpointer
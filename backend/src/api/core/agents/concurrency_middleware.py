@@ -0,0 +1,76 @@
+"""Adaptive per-provider concurrency limit around every LLM call of the tool loop.
+
+Takes a slot of the provider's AdaptiveLimit (api.services.agents.concurrency) before the
+call and feeds the outcome back: TTFT on success (measured with a callback on the first
+streamed token, or the whole call when the model didn't stream), or the kind of overload
+(429, 5xx, timeout, connection error) on failure. Other errors don't move the limit.
+The slot wait and TTFT of successful calls also feed the brownout controller
+(api.services.agents.brownout). Answers served by the response cache feed neither: their
+TTFT says nothing about the provider. Models not built by init_model pass straight through.
+
+Put it last, so rate-limit and budget waits don't count as provider latency:
+
+    create_agent(..., middleware=[budget_middleware, rate_limit_middleware,
+                                  concurrency_middleware])
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+
+from api.core.agents.custom_providers import classify_provider_error, model_config_of
+from api.core.agents.latency import FirstTokenWatcher, watch_first_token
+from api.core.agents.response_cache import served_from_cache
+from api.services.agents.brownout import brownout
+from api.services.agents.concurrency import CONCURRENCY_MAX_WAIT_S, concurrency_controller
+
+
+class ConcurrencyMiddleware(AgentMiddleware):
+    """Bound in-flight calls per provider with an AIMD limit (see concurrency_controller)."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        config = model_config_of(request.model)
+        if config is None:
+            return await handler(request)
+        limit = concurrency_controller.limit_for(config.provider)
+        waited = await limit.acquire(CONCURRENCY_MAX_WAIT_S)
+        watcher = FirstTokenWatcher()
+        started = time.monotonic()
+        try:
+            with watch_first_token(watcher):
+                response = await handler(request)
+            if not served_from_cache(response):
+                ttft_s = (watcher.first_token_at or time.monotonic()) - started
+                limit.on_success(config.model_id, ttft_s)
+                brownout.observe_call(config.model_id, waited, ttft_s)
+        except Exception as e:
+            kind = classify_provider_error(e)
+            if kind is not None:
+                limit.on_overload(kind)
+            raise
+        finally:
+            limit.release()
+        return response
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        # The limits live on the event loop; sync invocations are not limited.
+        return handler(request)
+
+
+concurrency_middleware = ConcurrencyMiddleware()
@@ -1,7 +1,10 @@
+import asyncio
 import os
-from typing import Any
+from http import HTTPStatus
+from typing import Any, Literal
 
 import dotenv
+import httpx
 from langchain_cerebras import ChatCerebras
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.outputs import ChatGenerationChunk
@@ -10,11 +13,23 @@ from langchain_groq import ChatGroq
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from langchain_openai import ChatOpenAI
 
-from api.core.agents.models import ModelConfig
+from api.core.agents.http_clients import (
+    SHARED_HTTP_CLIENTS,
+    get_async_http_client,
+    get_shared_transport,
+)
+from api.core.agents.models import ModelConfig, find_model_config
+from api.core.agents.response_cache import enable_response_cache, params_fingerprint
 
 dotenv.load_dotenv(override=True)
 
 
+def _use_shared_http_client(kwargs: dict[str, Any], base_url: str) -> None:
+    """Give an OpenAI-style client the pooled connection of its origin (see http_clients)."""
+    if SHARED_HTTP_CLIENTS:
+        kwargs.setdefault("http_async_client", get_async_http_client(base_url))
+
+
 class ChatChutes(ChatOpenAI):
     """Custom class to extract reasoning_content from Chutes AI."""
 
@@ -81,9 +96,11 @@ def init_chutes_model(
         kwargs["extra_body"] = kwargs.get("extra_body", {})
         kwargs["extra_body"]["include_reasoning"] = True
 
+    base_url = os.getenv("CHUTES_API_BASE", "https://llm.chutes.ai/v1")
+    _use_shared_http_client(kwargs, base_url)
     return ChatChutes(
         model=model,
-        openai_api_base=os.getenv("CHUTES_API_BASE", "https://llm.chutes.ai/v1"),
+        openai_api_base=base_url,
         openai_api_key=os.getenv("CHUTES_API_KEY"),
         streaming=streaming,
         **kwargs,
@@ -94,6 +111,10 @@ def init_cerebras_model(model: str, streaming: bool = True, **kwargs: Any) -> Ch
     """Initialize a Cerebras model with reasoning support."""
     if "disable_reasoning" not in kwargs:
         kwargs["disable_reasoning"] = False
+    _use_shared_http_client(
+        kwargs,
+        kwargs.get("base_url") or os.getenv("CEREBRAS_API_BASE", "https://api.cerebras.ai/v1"),
+    )
 
     return ChatCerebrasCustom(
         model=model,
@@ -121,10 +142,17 @@ def init_google_model(
         params["include_thoughts"] = include_thoughts
     if include_thoughts is True and params.get("thinking_level") is None:
         params["thinking_level"] = "high"
+    if SHARED_HTTP_CLIENTS and params.get("client_args") is None:
+        # A custom transport also makes google-genai use httpx instead of aiohttp.
+        base_url = params.get("base_url") or "https://generativelanguage.googleapis.com"
+        params["client_args"] = {"transport": get_shared_transport(base_url)}
     return ChatGoogleGenerativeAI(**params)
 
 
 def init_groq_model(model: str, streaming: bool = True, **kwargs: Any) -> ChatGroq:
+    _use_shared_http_client(
+        kwargs, kwargs.get("base_url") or os.getenv("GROQ_API_BASE") or "https://api.groq.com"
+    )
     return ChatGroq(
         model=model,
         groq_api_key=os.getenv("GROQ_API_KEY"),
@@ -142,6 +170,9 @@ def init_nvidia_model(
     (see integrate.api.nvidia.com). LangChain's ChatNVIDIA merges ``model_kwargs``
     into that payload — do not use ``extra_body`` (it is not a ChatNVIDIA field
     and triggers a LangChain warning).
+
+    ChatNVIDIA has no client injection point, so it keeps its own HTTP sessions instead
+    of the shared pools of http_clients.
     """
     model_kwargs: dict[str, Any] = dict(kwargs.pop("model_kwargs", None) or {})
     model_kwargs["stream"] = True
@@ -167,6 +198,13 @@ def init_openai_model(
 ) -> ChatOpenAI:
     """OpenAI GPT-5 family reasoning uses the Responses API (LangChain routes via ``reasoning``)."""
     effort = reasoning_effort if reasoning_effort is not None else ("xhigh" if reasoning else None)
+    _use_shared_http_client(
+        kwargs,
+        kwargs.get("base_url")
+        or kwargs.get("openai_api_base")
+        or os.getenv("OPENAI_BASE_URL")
+        or "https://api.openai.com/v1",
+    )
     params: dict[str, Any] = {
         "model": model,
         "openai_api_key": os.getenv("OPENAI_API_KEY"),
@@ -183,37 +221,47 @@ def init_model(config: ModelConfig, **overrides: Any) -> BaseChatModel:
     """Instantiate a LangChain model from a ModelConfig with optional parameter overrides.
 
     Config defaults (reasoning, thinking) are used unless explicitly overridden.
+    `response_cache=True` (optional `response_cache_ttl_s`) serves repeated identical calls
+    from the exact-match response cache (api.core.agents.response_cache).
 
     Examples:
         init_model(Models.Groq.KIMI_K2_INSTRUCT)
         init_model(Models.Chutes.GPT_OSS_120B_TEE, max_tokens=16384)
         init_model(Models.NVIDIA.DEEPSEEK_V3_2, thinking=False)
+        init_model(Models.Groq.GPT_OSS_20B, response_cache=True)
     """
+    requested = dict(overrides)
+    cached = overrides.pop("response_cache", False)
+    cache_ttl_s = overrides.pop("response_cache_ttl_s", None)
+    cache_params = params_fingerprint(config, overrides) if cached else None
+
     match config.provider:
         case "chutes":
             reasoning = overrides.pop("reasoning", config.reasoning)
-            return init_chutes_model(config.model_id, reasoning=reasoning, **overrides)
+            model: BaseChatModel = init_chutes_model(
+                config.model_id, reasoning=reasoning, **overrides
+            )
         case "cerebras":
-            return init_cerebras_model(config.model_id, **overrides)
+            model = init_cerebras_model(config.model_id, **overrides)
         case "google":
             thinking = overrides.pop("thinking", config.thinking)
             include_thoughts = overrides.pop("include_thoughts", True if thinking else None)
             if "max_tokens" in overrides:
                 overrides["max_output_tokens"] = overrides.pop("max_tokens")
-            return init_google_model(
+            model = init_google_model(
                 config.model_id,
                 include_thoughts=include_thoughts,
                 **overrides,
             )
         case "groq":
-            return init_groq_model(config.model_id, **overrides)
+            model = init_groq_model(config.model_id, **overrides)
         case "nvidia":
             thinking = overrides.pop("thinking", config.thinking)
-            return init_nvidia_model(config.model_id, thinking=thinking, **overrides)
+            model = init_nvidia_model(config.model_id, thinking=thinking, **overrides)
         case "openai":
             reasoning = overrides.pop("reasoning", config.reasoning)
             reasoning_effort = overrides.pop("reasoning_effort", config.reasoning_effort)
-            return init_openai_model(
+            model = init_openai_model(
                 config.model_id,
                 reasoning=reasoning,
                 reasoning_effort=reasoning_effort,
@@ -221,3 +269,53 @@ def init_model(config: ModelConfig, **overrides: Any) -> BaseChatModel:
             )
         case _:
             raise ValueError(f"Unknown provider: {config.provider!r}")
+
+    # Lets middleware (rate limits, ...) find the ModelConfig of request.model, and
+    # build variants of it with other overrides (model_variant).
+    model.metadata = {
+        **(model.metadata or {}),
+        "model_provider": config.provider,
+        "model_id": config.model_id,
+        "model_overrides": requested,
+    }
+    if cache_params is not None:
+        enable_response_cache(model, cache_params, cache_ttl_s)
+    return model
+
+
+def model_config_of(model: Any) -> ModelConfig | None:
+    """ModelConfig (catalog overrides included) of a model built by init_model, else None."""
+    metadata = getattr(model, "metadata", None) or {}
+    if not metadata.get("model_provider") or not metadata.get("model_id"):
+        return None
+    return find_model_config(metadata["model_provider"], metadata["model_id"])
+
+
+def model_overrides_of(model: Any) -> dict[str, Any]:
+    """The init_model overrides a model was built with ({} for other models)."""
+    metadata = getattr(model, "metadata", None) or {}
+    return dict(metadata.get("model_overrides") or {})
+
+
+ProviderErrorKind = Literal["rate_limited", "server_error", "timeout", "connection_error"]
+
+
+def classify_provider_error(error: BaseException) -> ProviderErrorKind | None:
+    """Overload-type failures of a provider call; None for anything else (bad request,
+    auth, content filter, ...), which says nothing about the provider's capacity."""
+    # openai / groq / cerebras SDKs expose status_code, google-genai uses code.
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == HTTPStatus.TOO_MANY_REQUESTS:
+        return "rate_limited"
+    if isinstance(status, int) and status >= HTTPStatus.INTERNAL_SERVER_ERROR:
+        return "server_error"
+    # SDK transport errors carry no status code (openai.APITimeoutError subclasses
+    # APIConnectionError, so check it first).
+    error_type = type(error).__name__
+    if error_type == "APITimeoutError" or isinstance(
+        error, (TimeoutError, asyncio.TimeoutError, httpx.TimeoutException)
+    ):
+        return "timeout"
+    if error_type == "APIConnectionError" or isinstance(error, httpx.TransportError):
+        return "connection_error"
+    return None
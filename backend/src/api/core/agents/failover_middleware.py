@@ -0,0 +1,400 @@
+"""Ordered fallback chain of models, guarded by per-provider circuit breakers.
+
+An agent declares equivalent models in order of preference; each LLM call is served by
+the first one whose provider's circuit (api.services.agents.circuit_breakers) lets it
+through. When a call fails the next model gets it, so a provider outage costs one failed
+attempt per call until the circuit opens, and nothing at all afterwards. A call is not
+retried once it has streamed tokens (the client already saw them); it fails instead.
+Every model of the chain is open -> CircuitOpenError.
+
+    failover = FailoverMiddleware(Models.Chutes.GPT_OSS_120B_TEE, Models.Groq.GPT_OSS_120B)
+    config = AgentConfig(..., model=failover.model)
+    create_agent(..., middleware=[budget_middleware, failover, rate_limit_middleware,
+                                  concurrency_middleware])
+
+Put it after budget_middleware (a budget downgrade replaces the model, and the chain then
+stays out of the way) and before the rate-limit / concurrency middleware, so every attempt
+goes through the limits of the model it actually uses. Usage rows record the model that
+served the call (see UsageRecorderCallback).
+
+With `hedge=True` the chain also hedges slow calls: when the model has not streamed a
+token after its hedge delay (about its p95 TTFT), the next available model of the chain
+gets the same request and the first to stream a token serves it; the other call is
+cancelled and billed apart. See api.services.agents.hedging.
+
+    failover = FailoverMiddleware(Models.Chutes.GPT_OSS_120B_TEE, Models.Groq.GPT_OSS_120B,
+                                  hedge=True)
+
+Metrics: model_fallbacks{primary,served} counts calls served by a model other than the
+first of the chain.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+from uuid import UUID
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.config import get_config
+
+from api.core.agents import metrics
+from api.core.agents.custom_providers import classify_provider_error, init_model
+from api.core.agents.latency import (
+    FirstTokenWatcher,
+    current_turn,
+    watch_first_token,
+)
+from api.core.agents.models import ModelConfig
+from api.core.agents.response_cache import served_from_cache
+from api.services.agents.budgets import BudgetExceededError
+from api.services.agents.circuit_breakers import (
+    CircuitBreaker,
+    CircuitOpenError,
+    circuit_breakers,
+)
+from api.services.agents.concurrency import ConcurrencyTimeoutError
+from api.services.agents.hedging import hedge_stats, record_hedge_cost
+from api.services.agents.rate_limits import RateLimitTimeoutError
+
+# Raised by our own limits before the provider is called: no news about its health.
+_NO_SIGNAL_ERRORS = (
+    RateLimitTimeoutError,
+    ConcurrencyTimeoutError,
+    BudgetExceededError,
+    CircuitOpenError,
+)
+
+
+def _label(config: ModelConfig) -> str:
+    return f"{config.provider}/{config.model_id}"
+
+
+def _record_error(breaker: CircuitBreaker, error: BaseException) -> None:
+    """Feed a failed call to its provider's breaker (errors of our own limits don't count)."""
+    if isinstance(error, _NO_SIGNAL_ERRORS):
+        breaker.release()
+    else:
+        breaker.record_failure(overload=classify_provider_error(error) is not None)
+
+
+def _record_response(breaker: CircuitBreaker, response: ModelResponse[Any]) -> None:
+    if served_from_cache(response):
+        breaker.release()  # the provider was never called
+    else:
+        breaker.record_success()
+
+
+class _Race:
+    """The first attempt of a hedged call to stream a token wins it."""
+
+    def __init__(self) -> None:
+        self.winner: _Attempt | None = None
+        self.decided = asyncio.Event()
+
+
+class _AttemptWatcher(FirstTokenWatcher):
+    def __init__(self, attempt: _Attempt) -> None:
+        super().__init__()
+        self.attempt = attempt
+
+    async def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],  # noqa: ARG002
+        messages: list[list[Any]],  # noqa: ARG002
+        *,
+        run_id: UUID,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> None:
+        if self.watching():
+            self.attempt.run_ids.add(str(run_id))
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:  # noqa: ARG002
+        if self.watching():
+            self.attempt.on_token()
+
+
+class _Attempt:
+    """One model of the chain working on a hedged call, in its own task."""
+
+    def __init__(self, race: _Race, index: int, config: ModelConfig, model: BaseChatModel) -> None:
+        self.race = race
+        self.index = index
+        self.config = config
+        self.model = model
+        self.breaker: CircuitBreaker = circuit_breakers.breaker_for(config.provider)
+        self.run_ids: set[str] = set()
+        self.started = time.monotonic()
+        self.first_token_at: float | None = None
+        self.task: asyncio.Task[ModelResponse[Any]] | None = None
+
+    def start(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> None:
+        self.task = asyncio.create_task(self._run(request.override(model=self.model), handler))
+
+    async def _run(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        with watch_first_token(_AttemptWatcher(self)):
+            return await handler(request)
+
+    def on_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        if self.race.winner is None:
+            self.race.winner = self
+            self.race.decided.set()
+        elif self.race.winner is not self:
+            # Lost by a hair: keep its tokens out of the stream until it is cancelled.
+            self.discard()
+
+    def discard(self) -> None:
+        turn = current_turn.get()
+        if turn is not None:
+            for run_id in self.run_ids:
+                turn.discard_run(run_id)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+class _HedgedCall:
+    """One model call of a FailoverMiddleware with hedging (see module docstring)."""
+
+    def __init__(
+        self,
+        middleware: FailoverMiddleware,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+        order: list[int],
+    ) -> None:
+        self.middleware = middleware
+        self.request = request
+        self.handler = handler
+        self.order = order
+        self.race = _Race()
+        self.attempts: list[_Attempt] = []
+        self.running: list[_Attempt] = []
+        self._candidates = iter(order)
+
+    def _launch(self) -> _Attempt | None:
+        """Start the next model of the chain whose circuit lets it through."""
+        for index in self._candidates:
+            config = self.middleware.configs[index]
+            attempt = _Attempt(self.race, index, config, self.middleware.models[index])
+            if not attempt.breaker.allow():
+                continue
+            attempt.start(self.request, self.handler)
+            self.attempts.append(attempt)
+            self.running.append(attempt)
+            return attempt
+        return None
+
+    async def run(self) -> ModelResponse[Any]:
+        last_error: Exception | None = None
+        hedged = False
+        self._launch()
+        decided = asyncio.ensure_future(self.race.decided.wait())
+        try:
+            while self.running:
+                timeout = None
+                if not hedged and len(self.running) == 1:
+                    attempt = self.running[0]
+                    delay = hedge_stats.hedge_after_s(attempt.config)
+                    timeout = max(0.0, delay - attempt.elapsed())
+                tasks = {attempt.task for attempt in self.running if attempt.task is not None}
+                done, _ = await asyncio.wait(
+                    {decided, *tasks}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if self.race.winner is not None:
+                    return await self._finish(self.race.winner)
+                if not done:
+                    hedged = True
+                    attempt = self._launch()
+                    if attempt is not None:
+                        metrics.increment("hedges_started", model=_label(attempt.config))
+                    continue
+                for attempt in [a for a in self.running if a.task is not None and a.task.done()]:
+                    error = attempt.task.exception() if attempt.task is not None else None
+                    if error is None:
+                        # Finished without streaming a single token (non-streaming model).
+                        return await self._finish(attempt)
+                    self.running.remove(attempt)
+                    _record_error(attempt.breaker, error)
+                    last_error = error
+                if not self.running and self._launch() is not None:
+                    hedged = False  # plain failover; the new call may be hedged in turn
+        finally:
+            decided.cancel()
+            for attempt in self.running:
+                if attempt.task is not None and not attempt.task.done():
+                    attempt.task.cancel()
+                    attempt.breaker.release()
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(
+            "Every model is unavailable (open circuit): "
+            + ", ".join(_label(config) for config in self.middleware.configs)
+        )
+
+    async def _finish(self, winner: _Attempt) -> ModelResponse[Any]:
+        for attempt in list(self.running):
+            if attempt is not winner:
+                self._cancel(attempt)
+        assert winner.task is not None
+        try:
+            response = await winner.task
+        except Exception as e:
+            _record_error(winner.breaker, e)
+            raise
+        except BaseException:
+            # Cancelled (client gone): free a half-open probe slot, as the plain path does.
+            winner.breaker.release()
+            raise
+        finally:
+            self.running.remove(winner)
+        _record_response(winner.breaker, response)
+        if not served_from_cache(response):
+            hedge_stats.observe_ttft(
+                winner.config, (winner.first_token_at or time.monotonic()) - winner.started
+            )
+        if len(self.attempts) > 1 and winner.first_token_at is not None:
+            metrics.increment(
+                "hedges",
+                primary=_label(self.attempts[0].config),
+                hedge=_label(self.attempts[-1].config),
+                winner="primary" if winner is self.attempts[0] else "hedge",
+            )
+        if winner.index != self.order[0]:
+            metrics.increment(
+                "model_fallbacks",
+                primary=_label(self.middleware.configs[self.order[0]]),
+                served=_label(winner.config),
+            )
+        return response
+
+    def _cancel(self, loser: _Attempt) -> None:
+        """Cancel the losing attempt; bill its prompt apart if the request went out."""
+        self.running.remove(loser)
+        loser.discard()
+        if loser.task is not None:
+            loser.task.cancel()
+        loser.breaker.release()
+        if not loser.run_ids:
+            return  # still queued in the rate / concurrency limits: nothing was sent
+        hedge_stats.observe_ttft(loser.config, loser.elapsed())
+        messages = list(self.request.messages)
+        if self.request.system_message is not None:
+            messages.insert(0, self.request.system_message)
+        try:
+            metadata = get_config().get("metadata") or {}
+        except RuntimeError:
+            metadata = {}
+        record_hedge_cost(
+            loser.config,
+            count_tokens_approximately(messages, tools=self.request.tools),
+            metadata,
+        )
+
+
+class FailoverMiddleware(AgentMiddleware):
+    """Serve model calls from the first available model of an ordered chain."""
+
+    def __init__(self, *configs: ModelConfig, hedge: bool = False, **overrides: Any) -> None:
+        """`overrides` go to init_model for every model of the chain (e.g. max_tokens).
+
+        `hedge` races the next model of the chain against calls slower than their hedge
+        delay (see api.services.agents.hedging).
+        """
+        if not configs:
+            raise ValueError("FailoverMiddleware needs at least one ModelConfig")
+        super().__init__()
+        self.configs = configs
+        self.hedge = hedge
+        self.models: list[BaseChatModel] = [init_model(cfg, **overrides) for cfg in configs]
+
+    @property
+    def model(self) -> BaseChatModel:
+        """The first model of the chain, to use as the agent's model."""
+        return self.models[0]
+
+    def chain(self, request: ModelRequest[Any]) -> list[int]:  # noqa: ARG002
+        """Indexes of `configs` in the order they serve `request` (the declared order)."""
+        return list(range(len(self.configs)))
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        if request.model is not self.models[0]:
+            # Another middleware (budget downgrade) already picked the model.
+            return await handler(request)
+        order = self.chain(request)
+        if self.hedge and len(order) > 1:
+            return await _HedgedCall(self, request, handler, order).run()
+
+        last_error: Exception | None = None
+        for index in order:
+            config, model = self.configs[index], self.models[index]
+            breaker = circuit_breakers.breaker_for(config.provider)
+            if not breaker.allow():
+                continue
+            watcher = FirstTokenWatcher()
+            try:
+                with watch_first_token(watcher):
+                    response = await handler(request.override(model=model))
+            except Exception as e:
+                _record_error(breaker, e)
+                if watcher.first_token_at is not None:
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            _record_response(breaker, response)
+            if index != order[0]:
+                metrics.increment(
+                    "model_fallbacks",
+                    primary=_label(self.configs[order[0]]),
+                    served=_label(config),
+                )
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(
+            "Every model is unavailable (open circuit): "
+            + ", ".join(_label(config) for config in self.configs)
+        )
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        if request.model is not self.models[0]:
+            return handler(request)
+        # Sync invocations: plain ordered fallback, no circuit breakers.
+        *first, last = (self.models[index] for index in self.chain(request))
+        for model in first:
+            try:
+                return handler(request.override(model=model))
+            except Exception:
+                continue
+        return handler(request.override(model=last))
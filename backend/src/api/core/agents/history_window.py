@@ -14,7 +14,21 @@ Strategy:
   but replacing the heavy `output` of older `ToolMessage` records with a short
   placeholder so the model sees what was asked but not the 5KB JSON payload.
 - Stop once the rough token estimate (`len(content) / 4`) exceeds
-  `MAX_TOKENS_HEURISTIC` or once `MAX_MESSAGES_TO_LLM` is reached.
+  `MAX_TOKENS_HEURISTIC` or once `MAX_MESSAGES_TO_LLM` is reached (both can be set per
+  middleware instance).
+
+Trimming saves input tokens, but every time the window slides the start of the history
+changes, and with it the whole prompt after the system + tools prefix: the provider's
+prompt cache misses. With `turn_step` > 1 the window starts on a whole turn whose number
+is a multiple of `turn_step` (the first one that fits the budget): the start stays put
+for about `turn_step` turns, during which every call extends the previous prompt and hits
+the cache, then jumps `turn_step` turns ahead at once. An aligned window is between
+`turn_step` turns and the full budget long; when it would be shorter (the budget fits
+fewer than `turn_step` turns, or the aligned start is too recent), the plain window is
+sent instead. SlidingWindowMiddleware defaults to TRIM_TURN_STEP.
+
+`HISTORY_WINDOW_STRATEGIES` names the presets (scripts/benchmark_prompt_cache.py compares
+their prompt-cache hit rate and cost).
 """
 
 from __future__ import annotations
@@ -40,6 +54,7 @@ from langchain_core.messages import (
 MAX_MESSAGES_TO_LLM: int = 24
 MAX_TOKENS_HEURISTIC: int = 30_000
 TOKEN_HEURISTIC_DIVISOR: int = 4
+TRIM_TURN_STEP: int = 4
 TOOL_RESULT_PLACEHOLDER: str = (
     "[resultado de turno anterior omitido para economizar contexto — "
     "se precisar dele de novo, peça ao usuário ou chame a tool novamente]"
@@ -79,8 +94,40 @@ def _find_current_turn_start(messages: list[AnyMessage]) -> int:
     return 0
 
 
-def trim_messages_for_llm(messages: list[AnyMessage]) -> list[AnyMessage]:
-    """Apply the sliding-window strategy. Pure function, no side effects on input list."""
+def _align_to_turns(
+    messages: list[AnyMessage], window_start: int, current_turn_start: int, turn_step: int
+) -> list[AnyMessage] | None:
+    """Previous-turn messages from the first turn >= window_start numbered k * turn_step.
+
+    None when that leaves fewer than `turn_step` previous turns.
+    """
+    turn_starts = [
+        index for index in range(current_turn_start) if isinstance(messages[index], HumanMessage)
+    ]
+    first_turn = next(
+        (turn for turn, index in enumerate(turn_starts) if index >= window_start),
+        len(turn_starts),
+    )
+    aligned_turn = -(-first_turn // turn_step) * turn_step
+    if len(turn_starts) - aligned_turn < turn_step:
+        return None
+    return [
+        _replace_tool_message(message) if isinstance(message, ToolMessage) else message
+        for message in messages[turn_starts[aligned_turn] : current_turn_start]
+    ]
+
+
+def trim_messages_for_llm(
+    messages: list[AnyMessage],
+    *,
+    max_messages: int = MAX_MESSAGES_TO_LLM,
+    max_tokens: int = MAX_TOKENS_HEURISTIC,
+    turn_step: int = 1,
+) -> list[AnyMessage]:
+    """Apply the sliding-window strategy. Pure function, no side effects on input list.
+
+    `turn_step` > 1 aligns the start of the window on turns (see module docstring).
+    """
     if not messages:
         return messages
 
@@ -90,7 +137,7 @@ def trim_messages_for_llm(messages: list[AnyMessage]) -> list[AnyMessage]:
 
     # Token budget already consumed by the current turn (we never trim it).
     consumed_tokens = sum(_content_length(msg) for msg in current_turn) // TOKEN_HEURISTIC_DIVISOR
-    remaining_budget = max(0, MAX_TOKENS_HEURISTIC - consumed_tokens)
+    remaining_budget = max(0, max_tokens - consumed_tokens)
 
     kept_previous: list[AnyMessage] = []
     for message in reversed(previous_turns):
@@ -98,13 +145,20 @@ def trim_messages_for_llm(messages: list[AnyMessage]) -> list[AnyMessage]:
         cost = _content_length(adjusted) // TOKEN_HEURISTIC_DIVISOR
         if cost > remaining_budget and kept_previous:
             break
-        if len(kept_previous) >= MAX_MESSAGES_TO_LLM - len(current_turn):
+        if len(kept_previous) >= max_messages - len(current_turn):
             break
         kept_previous.append(adjusted)
         remaining_budget -= cost
 
     kept_previous.reverse()
 
+    if turn_step > 1 and len(kept_previous) < len(previous_turns):
+        aligned = _align_to_turns(
+            messages, current_turn_start - len(kept_previous), current_turn_start, turn_step
+        )
+        if aligned is not None:
+            kept_previous = aligned
+
     # Guarantee the trimmed prefix doesn't start with an orphan ToolMessage —
     # Gemini rejects ToolMessages that lack a preceding AIMessage with tool_calls.
     while kept_previous and isinstance(kept_previous[0], ToolMessage):
@@ -116,12 +170,31 @@ def trim_messages_for_llm(messages: list[AnyMessage]) -> list[AnyMessage]:
 class SlidingWindowMiddleware(AgentMiddleware):
     """Reuse across agents: drop in via ``create_agent(middleware=[SlidingWindowMiddleware()])``."""
 
+    def __init__(
+        self,
+        max_messages: int = MAX_MESSAGES_TO_LLM,
+        max_tokens: int = MAX_TOKENS_HEURISTIC,
+        turn_step: int = TRIM_TURN_STEP,
+    ) -> None:
+        super().__init__()
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.turn_step = turn_step
+
+    def _trim(self, messages: list[AnyMessage]) -> list[AnyMessage]:
+        return trim_messages_for_llm(
+            messages,
+            max_messages=self.max_messages,
+            max_tokens=self.max_tokens,
+            turn_step=self.turn_step,
+        )
+
     async def awrap_model_call(
         self,
         request: ModelRequest[Any],
         handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
     ) -> ModelResponse[Any]:
-        trimmed = trim_messages_for_llm(request.messages)
+        trimmed = self._trim(request.messages)
         if trimmed is request.messages or len(trimmed) == len(request.messages):
             return await handler(request)
         return await handler(request.override(messages=trimmed))
@@ -131,10 +204,18 @@ class SlidingWindowMiddleware(AgentMiddleware):
         request: ModelRequest[Any],
         handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
     ) -> ModelResponse[Any]:
-        trimmed = trim_messages_for_llm(request.messages)
+        trimmed = self._trim(request.messages)
         if trimmed is request.messages or len(trimmed) == len(request.messages):
             return handler(request)
         return handler(request.override(messages=trimmed))
 
 
 sliding_window_middleware = SlidingWindowMiddleware()
+
+# Named trim strategies; None means the full history is sent on every call.
+HISTORY_WINDOW_STRATEGIES: dict[str, SlidingWindowMiddleware | None] = {
+    "full": None,
+    "sliding": SlidingWindowMiddleware(turn_step=1),
+    "compact": SlidingWindowMiddleware(max_messages=8, max_tokens=4_000, turn_step=1),
+    "aligned": sliding_window_middleware,
+}
@@ -0,0 +1,270 @@
+"""Shared, pooled HTTP clients for the LLM providers: one per provider origin.
+
+Without this every init_*_model call built its own SDK client with its own connection
+pool, so agents on the same provider never reused each other's connections and the first
+call of every model instance paid DNS + TCP + TLS inside its TTFT. init_model now hands
+every model the shared client of its provider's origin (scheme://host[:port]):
+
+    openai / chutes / cerebras / groq   http_async_client=<shared httpx.AsyncClient>
+    google                              client_args={"transport": <shared transport>}
+                                        (also makes google-genai use httpx, not aiohttp)
+    nvidia                              not injectable: ChatNVIDIA keeps its own
+                                        requests / aiohttp sessions
+
+Each origin has one transport: HTTP/2 when `h2` is installed (concurrent streams are
+multiplexed over one connection), the keep-alive limits below, and a small DNS cache in
+front of getaddrinfo (only new connections resolve; the cache saves the lookup when a
+connection is re-opened after idling out). SDK clients can't close it: close()/aclose() on
+the shared objects are no-ops and close_http_clients() (lifespan shutdown) closes them.
+
+Metrics (GET /agents/metrics), labelled origin="https://api.groq.com":
+    http_pool_requests, http_pool_errors   requests sent / failed before a response
+    http_pool_connects                     new TCP connections opened
+    http_pool_dns{result=hit|miss}         DNS cache lookups
+    http_pool_connections, http_pool_idle_connections,
+    http_pool_http2_connections            gauges, read from the pool on every snapshot
+
+Env knobs (all optional):
+    HTTP_SHARED_CLIENTS            "0" to let every model build its own client again
+    HTTP_CLIENT_HTTP2              "0" to force HTTP/1.1 (default 1)
+    HTTP_POOL_MAX_CONNECTIONS      connections per origin (default 100)
+    HTTP_POOL_MAX_KEEPALIVE        idle connections kept per origin (default 20)
+    HTTP_POOL_KEEPALIVE_EXPIRY_S   idle connection lifetime (default 120)
+    HTTP_DNS_CACHE_TTL_S           DNS cache lifetime, 0 disables it (default 300)
+    HTTPS_PROXY                    when set, requests go through the proxy (no DNS cache)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import os
+import socket
+import time
+from importlib.util import find_spec
+from typing import Any
+
+import httpcore
+import httpx
+
+from api.core.agents import metrics
+
+SHARED_HTTP_CLIENTS: bool = os.getenv("HTTP_SHARED_CLIENTS", "1").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+HTTP2_ENABLED: bool = (
+    os.getenv("HTTP_CLIENT_HTTP2", "1").strip().lower() in ("1", "true", "yes")
+    and find_spec("h2") is not None
+)
+HTTP_POOL_MAX_CONNECTIONS: int = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE: int = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_POOL_KEEPALIVE_EXPIRY_S: float = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY_S", "120"))
+HTTP_DNS_CACHE_TTL_S: float = float(os.getenv("HTTP_DNS_CACHE_TTL_S", "300"))
+
+# Provider SDKs set their own per-request timeouts; this only covers calls that don't.
+_DEFAULT_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+
+class _CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """AnyIO network backend that caches getaddrinfo results per (host, port).
+
+    The TCP connection goes to the resolved IP; TLS still uses the original hostname
+    (httpcore passes it separately as server_hostname), so SNI and certificate checks
+    are unchanged.
+    """
+
+    def __init__(self, origin: str, ttl_s: float) -> None:
+        self._origin = origin
+        self._ttl_s = ttl_s
+        self._backend = httpcore.AnyIOBackend()
+        self._cache: dict[tuple[str, int], tuple[float, list[str]]] = {}
+
+    async def _resolve(self, host: str, port: int, timeout: float | None) -> list[str]:
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            pass
+        else:
+            return [host]
+
+        now = time.monotonic()
+        cached = self._cache.get((host, port))
+        if cached is not None and cached[0] > now:
+            metrics.increment("http_pool_dns", origin=self._origin, result="hit")
+            return cached[1]
+
+        metrics.increment("http_pool_dns", origin=self._origin, result="miss")
+        try:
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM),
+                timeout,
+            )
+        except (OSError, TimeoutError) as exc:
+            raise httpcore.ConnectError(f"DNS lookup for {host} failed: {exc}") from exc
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in infos))
+        self._cache[(host, port)] = (now + self._ttl_s, addresses)
+        return addresses
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Any = None,
+    ) -> httpcore.AsyncNetworkStream:
+        addresses = await self._resolve(host, port, timeout)
+        last_error: Exception | None = None
+        for address in addresses:
+            try:
+                stream = await self._backend.connect_tcp(
+                    address, port, timeout, local_address, socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as exc:
+                last_error = exc
+                continue
+            metrics.increment("http_pool_connects", origin=self._origin)
+            return stream
+        # Every cached address failed: resolve again next time.
+        self._cache.pop((host, port), None)
+        raise last_error or httpcore.ConnectError(f"No address found for {host}")
+
+    async def connect_unix_socket(
+        self, path: str, timeout: float | None = None, socket_options: Any = None
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class SharedTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """Pooled transport of one provider origin, shared by every model of that provider.
+
+    Async requests go through the tuned pool; the sync side (only used by clients that
+    need one, e.g. google-genai) is created lazily with the same limits.
+    """
+
+    def __init__(self, origin: str) -> None:
+        self.origin = origin
+        self._limits = httpx.Limits(
+            max_connections=HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY_S,
+        )
+        self._proxy = os.getenv("HTTPS_PROXY") or os.getenv("https_proxy") or None
+        self._async = httpx.AsyncHTTPTransport(
+            http2=HTTP2_ENABLED, limits=self._limits, proxy=self._proxy
+        )
+        if self._proxy is None and HTTP_DNS_CACHE_TTL_S > 0 and hasattr(self._async, "_pool"):
+            # httpx has no public hook for the network backend: swap in an equivalent
+            # pool that resolves through the DNS cache.
+            self._async._pool = httpcore.AsyncConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY_S,
+                http1=True,
+                http2=HTTP2_ENABLED,
+                network_backend=_CachingDNSBackend(origin, HTTP_DNS_CACHE_TTL_S),
+            )
+        self._sync: httpx.HTTPTransport | None = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        metrics.increment("http_pool_requests", origin=self.origin)
+        try:
+            return await self._async.handle_async_request(request)
+        except Exception:
+            metrics.increment("http_pool_errors", origin=self.origin)
+            raise
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self._sync is None:
+            self._sync = httpx.HTTPTransport(
+                http2=HTTP2_ENABLED, limits=self._limits, proxy=self._proxy
+            )
+        metrics.increment("http_pool_requests", origin=self.origin)
+        try:
+            return self._sync.handle_request(request)
+        except Exception:
+            metrics.increment("http_pool_errors", origin=self.origin)
+            raise
+
+    async def aclose(self) -> None:
+        """No-op: the transport outlives the clients using it (see close_http_clients)."""
+
+    def close(self) -> None:
+        """No-op: the transport outlives the clients using it (see close_http_clients)."""
+
+    async def shutdown(self) -> None:
+        await self._async.aclose()
+        if self._sync is not None:
+            self._sync.close()
+
+    def collect_metrics(self) -> None:
+        connections = list(getattr(getattr(self._async, "_pool", None), "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        http2 = sum(1 for connection in connections if "HTTP/2" in connection.info())
+        metrics.set_gauge("http_pool_connections", len(connections), origin=self.origin)
+        metrics.set_gauge("http_pool_idle_connections", idle, origin=self.origin)
+        metrics.set_gauge("http_pool_http2_connections", http2, origin=self.origin)
+
+
+class _SharedAsyncClient(httpx.AsyncClient):
+    """AsyncClient whose aclose() is a no-op, so one SDK client can't close it for all."""
+
+    async def aclose(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await super().aclose()
+
+
+_transports: dict[str, SharedTransport] = {}
+_clients: dict[str, _SharedAsyncClient] = {}
+
+
+def _origin(base_url: str) -> str:
+    url = httpx.URL(base_url)
+    return f"{url.scheme}://{url.host}" + (f":{url.port}" if url.port else "")
+
+
+def _collect_metrics() -> None:
+    for transport in _transports.values():
+        transport.collect_metrics()
+
+
+def get_shared_transport(base_url: str) -> SharedTransport:
+    """Shared transport of the origin of `base_url`, created on first use."""
+    origin = _origin(base_url)
+    transport = _transports.get(origin)
+    if transport is None:
+        transport = _transports[origin] = SharedTransport(origin)
+        metrics.register_collector(_collect_metrics)
+    return transport
+
+
+def get_async_http_client(base_url: str) -> httpx.AsyncClient:
+    """Shared httpx.AsyncClient of the origin of `base_url`, created on first use."""
+    origin = _origin(base_url)
+    client = _clients.get(origin)
+    if client is None:
+        client = _clients[origin] = _SharedAsyncClient(
+            transport=get_shared_transport(base_url),
+            timeout=_DEFAULT_TIMEOUT,
+            follow_redirects=True,
+        )
+    return client
+
+
+async def close_http_clients() -> None:
+    """Close every shared client and pool (called at shutdown)."""
+    clients, transports = list(_clients.values()), list(_transports.values())
+    _clients.clear()
+    _transports.clear()
+    for client in clients:
+        await client.shutdown()
+    for transport in transports:
+        await transport.shutdown()
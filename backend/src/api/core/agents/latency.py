@@ -0,0 +1,199 @@
+"""Per-turn latency breakdown (one agent_turn_latency row per stream_agent run).
+
+stream_agent creates a TurnTimer, feeds it the astream_events it already iterates and
+hands the finished row to usage_writer (same batched COPY path as agent_message_usage).
+All times are milliseconds, measured with time.perf_counter():
+
+    queue_wait_ms       request received -> thread lease acquired (run_coordinator)
+    checkpoint_load_ms  time inside checkpointer.aget_tuple (TimedPostgresSaver)
+    ttft_ms             request received -> first streamed token (text or reasoning);
+                        what the user waits for, queue wait included
+    model_ttft_ms       first LLM call start -> its first chunk (provider latency)
+    generation_ms       sum over LLM calls of first chunk -> call end
+    llm_ms              sum over LLM calls of call start -> call end
+    tool_ms / tools     sum and per-call durations of tool runs (parallel tools overlap,
+                        so tool_ms can exceed the wall time they took)
+    persistence_ms      chat_history / metadata save at the end of the turn, plus
+                        checkpoint writes (aput/aput_writes) made during the turn
+    total_ms            request received -> turn finished
+
+The checkpointer runs inside LangGraph tasks, so it reports through the `current_turn`
+ContextVar: stream_agent sets it before starting the graph and the tasks inherit it.
+
+Middleware that needs the TTFT of a single model call (concurrency limits, failover) uses
+watch_first_token() instead. A hedged call (failover_middleware) marks the LLM run it
+cancelled with discard_run(); stream_agent skips that run's events.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackManager
+from langgraph.config import get_config
+
+from api.models.agents.latency import AgentTurnLatency, ToolTiming
+
+current_turn: ContextVar[TurnTimer | None] = ContextVar("current_turn", default=None)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class TurnTimer:
+    """Collects the timings of one chat turn; `row()` builds the AgentTurnLatency."""
+
+    def __init__(self, received_at: float | None = None) -> None:
+        self.started_at = time.perf_counter()
+        self.received_at = received_at if received_at is not None else self.started_at
+        self.checkpoint_load_s = 0.0
+        self.checkpoint_write_s = 0.0
+        self.persistence_s = 0.0
+        self.first_token_at: float | None = None
+        self.model_ttft_s: float | None = None
+        self.generation_s = 0.0
+        self.llm_s = 0.0
+        self.llm_calls = 0
+        self.tools: list[ToolTiming] = []
+        # run_id -> (start, first chunk) of LLM calls / start of tool runs in flight
+        self._llm_runs: dict[str, list[float | None]] = {}
+        self._tool_runs: dict[str, float] = {}
+        # LLM runs cancelled by a hedged call (services/agents/hedging): not part of the turn
+        self.discarded_runs: set[str] = set()
+        self.finished = False
+
+    def on_event(self, event: dict[str, Any]) -> None:
+        """Feed one astream_events (v1) event."""
+        event_type = event.get("event") or ""
+        run_id = str(event.get("run_id") or "")
+        now = time.perf_counter()
+        if event_type == "on_chat_model_start":
+            self._llm_runs[run_id] = [now, None]
+        elif event_type == "on_chat_model_stream":
+            run = self._llm_runs.get(run_id)
+            if run is not None and run[1] is None:
+                run[1] = now
+                if self.model_ttft_s is None:
+                    self.model_ttft_s = now - run[0]
+        elif event_type == "on_chat_model_end":
+            run = self._llm_runs.pop(run_id, None)
+            if run is not None:
+                start, first_chunk = run
+                self.llm_calls += 1
+                self.llm_s += now - start
+                # Non-streaming calls produce everything at the end.
+                self.generation_s += now - (first_chunk or now)
+        elif event_type == "on_tool_start":
+            self._tool_runs[run_id] = now
+        elif event_type in ("on_tool_end", "on_tool_error"):
+            start = self._tool_runs.pop(run_id, None)
+            if start is not None:
+                self.tools.append(
+                    ToolTiming(
+                        name=str(event.get("name") or ""),
+                        ms=_ms(now - start),
+                        error=event_type == "on_tool_error",
+                    )
+                )
+
+    def discard_run(self, run_id: str) -> None:
+        """Drop an LLM run whose output must not reach the client (a hedge that lost)."""
+        self.discarded_runs.add(run_id)
+        self._llm_runs.pop(run_id, None)
+
+    def is_discarded(self, event: dict[str, Any]) -> bool:
+        return bool(self.discarded_runs) and str(event.get("run_id") or "") in self.discarded_runs
+
+    def mark_first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def row(
+        self,
+        *,
+        thread_id: str,
+        message_id: str,
+        agent_id: str,
+        user_id: str | None,
+        client_id: str | None,
+        provider: str | None,
+        model_id: str | None,
+        status: str,
+    ) -> AgentTurnLatency:
+        """Close the timer (idempotent guard via `finished`) and build the row."""
+        self.finished = True
+        now = time.perf_counter()
+        return AgentTurnLatency(
+            thread_id=thread_id,
+            message_id=message_id,
+            user_id=user_id,
+            client_id=client_id,
+            agent_id=agent_id,
+            provider=provider,
+            model_id=model_id,
+            status=status,
+            queue_wait_ms=_ms(self.started_at - self.received_at),
+            checkpoint_load_ms=_ms(self.checkpoint_load_s),
+            ttft_ms=_ms(self.first_token_at - self.received_at)
+            if self.first_token_at is not None
+            else None,
+            model_ttft_ms=_ms(self.model_ttft_s) if self.model_ttft_s is not None else None,
+            generation_ms=_ms(self.generation_s),
+            llm_ms=_ms(self.llm_s),
+            llm_calls=self.llm_calls,
+            tool_ms=round(sum(tool.ms for tool in self.tools), 3),
+            tools=self.tools,
+            persistence_ms=_ms(self.persistence_s + self.checkpoint_write_s),
+            total_ms=_ms(now - self.received_at),
+        )
+
+
+# Watchers of the model calls the current task is inside of (see watch_first_token).
+_watching: ContextVar[tuple[FirstTokenWatcher, ...]] = ContextVar("watching", default=())
+
+
+class FirstTokenWatcher(AsyncCallbackHandler):
+    """Records when the first token of a model call was streamed (time.monotonic()).
+
+    Only sees the call it watches: concurrent calls of one graph node (hedged calls)
+    share the node's callback manager, but their callbacks run in their own task's context.
+    """
+
+    def __init__(self) -> None:
+        self.first_token_at: float | None = None
+
+    def watching(self) -> bool:
+        """Whether the callback being handled belongs to the watched call."""
+        return self in _watching.get()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:  # noqa: ARG002
+        if self.first_token_at is None and self.watching():
+            self.first_token_at = time.monotonic()
+
+
+@contextlib.contextmanager
+def watch_first_token(watcher: FirstTokenWatcher) -> Iterator[None]:
+    """Attach `watcher` to the callbacks a model call inherits from the current graph node.
+
+    For AgentMiddleware.awrap_model_call; outside a graph (or without a callback manager)
+    it does nothing and `first_token_at` stays None.
+    """
+    try:
+        callbacks = get_config().get("callbacks")
+    except RuntimeError:
+        callbacks = None
+    if not isinstance(callbacks, BaseCallbackManager):
+        yield
+        return
+    scope = _watching.set((*_watching.get(), watcher))
+    callbacks.add_handler(watcher, inherit=True)
+    try:
+        yield
+    finally:
+        callbacks.remove_handler(watcher)
+        _watching.reset(scope)
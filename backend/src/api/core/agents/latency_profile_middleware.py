@@ -0,0 +1,89 @@
+"""Serve model calls with the variant of the request's latency profile.
+
+stream_agent puts ChatRequest.latency_profile in the run's metadata; when the agent maps
+that profile to init_model overrides (AgentConfig.latency_profiles), every model call is
+sent to the variant of the model it was about to use, built with those overrides and
+cached by api.services.agents.latency_profiles. Otherwise the call goes through as is.
+At brownout level "reduced" (api.services.agents.brownout) the agent's
+BrownoutPolicy.profile is served instead of the requested profile. Answers of a variant
+carry response_metadata["latency_profile"] (the semantic cache doesn't keep them).
+
+Put it after every middleware that picks the model (budget downgrade, failover / router:
+each model of the chain gets its own variant) and before the prompt-cache, rate-limit and
+concurrency middleware, which then see the variant:
+
+    create_agent(..., middleware=[budget_middleware, failover, latency_profile_middleware,
+                                  prompt_cache_middleware, rate_limit_middleware,
+                                  concurrency_middleware])
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.messages import AIMessage
+from langgraph.config import get_config
+
+from api.core.agents import metrics
+from api.services.agents.brownout import brownout
+from api.services.agents.latency_profiles import latency_profiles
+
+
+def _apply_profile(request: ModelRequest[Any]) -> tuple[ModelRequest[Any], str | None]:
+    """The request on its profile's variant, and that profile (None = served as built)."""
+    try:
+        metadata = get_config().get("metadata") or {}
+    except RuntimeError:
+        return request, None
+    agent_id = metadata.get("agent_id")
+    if not agent_id:
+        return request, None
+    # Under brownout the agent's BrownoutPolicy.profile replaces the requested one.
+    profile = brownout.profile_for(str(agent_id), metadata.get("latency_profile"))
+    if not profile:
+        return request, None
+    overrides = latency_profiles.overrides(str(agent_id), profile)
+    if overrides is None:
+        return request, None
+    metrics.increment("latency_profile_calls", agent=str(agent_id), profile=str(profile))
+    model = latency_profiles.variant(request.model, overrides)
+    if model is request.model:
+        return request, None
+    return request.override(model=model), str(profile)
+
+
+def _tag(response: ModelResponse[Any], profile: str | None) -> ModelResponse[Any]:
+    if profile is not None:
+        for message in response.result:
+            if isinstance(message, AIMessage):
+                message.response_metadata["latency_profile"] = profile
+    return response
+
+
+class LatencyProfileMiddleware(AgentMiddleware):
+    """Swap each call's model for its variant of the run's latency profile."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        request, profile = _apply_profile(request)
+        return _tag(await handler(request), profile)
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        request, profile = _apply_profile(request)
+        return _tag(handler(request), profile)
+
+
+latency_profile_middleware = LatencyProfileMiddleware()
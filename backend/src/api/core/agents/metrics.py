@@ -0,0 +1,63 @@
+"""In-process counters and gauges for the agents layer, served by GET /agents/metrics.
+
+Deliberately tiny: no Prometheus client, no background export. Every Granian worker keeps
+its own numbers (the endpoint reports the worker pid), so sum across workers when needed.
+
+Series are keyed Prometheus-style: `name{label="value",...}`.
+
+    increment("usage_sink_dropped", 3)
+    set_gauge("provider_inflight_limit", 12, provider="groq")
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Callable
+from typing import Any
+
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_collectors: list[Callable[[], None]] = []
+_started_at = time.time()
+
+
+def _series(name: str, labels: dict[str, Any]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def increment(name: str, value: float = 1.0, **labels: Any) -> None:
+    """Add `value` to a monotonically increasing counter."""
+    series = _series(name, labels)
+    _counters[series] = _counters.get(series, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """Set a point-in-time value (queue depth, current limit, ...)."""
+    _gauges[_series(name, labels)] = float(value)
+
+
+def get_counter(name: str, **labels: Any) -> float:
+    return _counters.get(_series(name, labels), 0.0)
+
+
+def register_collector(collect: Callable[[], None]) -> None:
+    """Run `collect` before every snapshot, for gauges cheaper to read than to keep current
+    (e.g. connection pool sizes). It should only call set_gauge."""
+    if collect not in _collectors:
+        _collectors.append(collect)
+
+
+def snapshot() -> dict[str, Any]:
+    """JSON-serializable view of every series of this worker."""
+    for collect in _collectors:
+        collect()
+    return {
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - _started_at, 3),
+        "counters": dict(sorted(_counters.items())),
+        "gauges": dict(sorted(_gauges.items())),
+    }
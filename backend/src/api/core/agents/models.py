@@ -1,5 +1,6 @@
 import math
-from dataclasses import dataclass
+from collections.abc import Iterable
+from dataclasses import dataclass, fields
 from typing import Any
 
 COST_DECIMAL_PLACES = 6
@@ -18,6 +19,40 @@ class ModelConfig:
     input_price_per_1m: float = 0.0
     cached_input_price_per_1m: float = 0.0
     output_price_per_1m: float = 0.0
+    # Capabilities / provider limits. None = unknown (consumers must not assume a limit).
+    context_window: int | None = None  # max input + output tokens
+    max_output_tokens: int | None = None
+    supports_prompt_cache: bool = False  # provider reports/bills cache_read tokens
+    rpm_limit: int | None = None  # requests per minute for our account
+    tpm_limit: int | None = None  # tokens per minute for our account
+    hedge_after_s: float | None = None  # TTFT before a hedged call races (None = live p95)
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return (self.provider, self.model_id)
+
+
+MODEL_CONFIG_FIELDS: frozenset[str] = frozenset(f.name for f in fields(ModelConfig))
+
+_warned_unpriced: set[tuple[str, str]] = set()
+
+
+def warn_if_unpriced(cfg: ModelConfig) -> None:
+    """Log once per model when it has no price at all: its calls would silently cost 0 in
+    usage rows, budgets and cost routing."""
+    if (
+        cfg.input_price_per_1m
+        or cfg.cached_input_price_per_1m
+        or cfg.output_price_per_1m
+        or cfg.key in _warned_unpriced
+    ):
+        return
+    _warned_unpriced.add(cfg.key)
+    print(
+        f"[Models] WARNING: {cfg.provider}/{cfg.model_id} has no prices; its calls count as "
+        "US$ 0 in usage, budgets and cost routing. Set them in the Models registry or the "
+        "model catalog (MODEL_CATALOG_PATH / model_catalog table)."
+    )
 
 
 def compute_cost_usd(usage: dict[str, Any] | None, cfg: ModelConfig) -> float:
@@ -29,6 +64,7 @@ def compute_cost_usd(usage: dict[str, Any] | None, cfg: ModelConfig) -> float:
     """
     if not usage:
         return 0.0
+    warn_if_unpriced(cfg)
     in_det = usage.get("input_token_details") or {}
     cached = int(in_det.get("cache_read") or 0)
     fresh_input = max(int(usage.get("input_tokens") or 0) - cached, 0)
@@ -59,26 +95,6 @@ def canonical_provider(provider: str) -> str:
     return PROVIDER_ALIASES.get(provider, provider)
 
 
-def find_model_config(provider: str, model_id: str) -> ModelConfig | None:
-    """Lookup a registered ModelConfig by (provider, model_id). Returns None if not found.
-
-    Provider aliases (e.g. `google_genai` -> `google`) are normalized so LangChain's
-    response_metadata names match what's declared in the Models registry.
-    """
-    canonical = canonical_provider(provider)
-    for namespace in vars(Models).values():
-        if not isinstance(namespace, type):
-            continue
-        for value in vars(namespace).values():
-            if (
-                isinstance(value, ModelConfig)
-                and value.provider == canonical
-                and value.model_id == model_id
-            ):
-                return value
-    return None
-
-
 class Models:
     """Model registry. Use init_model(Models.Provider.NAME) in each agent to instantiate."""
 
@@ -99,6 +115,15 @@ class Models:
             cached_input_price_per_1m=0.50,
             output_price_per_1m=2.00,
         )
+        # Same weights as Groq.GPT_OSS_120B (its usual fallback). Prices are not in the
+        # registry yet: set them through the model catalog (until then its calls cost 0
+        # and warn_if_unpriced logs it).
+        GPT_OSS_120B_TEE = ModelConfig(
+            "openai/gpt-oss-120b-TEE",
+            "chutes",
+            reasoning=True,
+            context_window=131_072,
+        )
         GEMMA_4_31B_TEE = ModelConfig(
             "google/gemma-4-31B-turbo-TEE",
             "chutes",
@@ -116,6 +141,7 @@ class Models:
             input_price_per_1m=0.50,
             cached_input_price_per_1m=0.05,
             output_price_per_1m=3.00,
+            supports_prompt_cache=True,
         )
 
     class OpenAI:
@@ -127,6 +153,7 @@ class Models:
             input_price_per_1m=0.20,
             cached_input_price_per_1m=0.02,
             output_price_per_1m=1.25,
+            supports_prompt_cache=True,
         )
 
     class Groq:
@@ -136,6 +163,8 @@ class Models:
             input_price_per_1m=0.15,
             cached_input_price_per_1m=0.075,
             output_price_per_1m=0.60,
+            context_window=131_072,
+            supports_prompt_cache=True,
         )
         GPT_OSS_20B = ModelConfig(
             "openai/gpt-oss-20b",
@@ -143,6 +172,8 @@ class Models:
             input_price_per_1m=0.075,
             cached_input_price_per_1m=0.0375,
             output_price_per_1m=0.30,
+            context_window=131_072,
+            supports_prompt_cache=True,
         )
         LLAMA_4_SCOUT = ModelConfig("meta-llama/llama-4-scout-17b-16e-instruct", "groq")
 
@@ -163,3 +194,50 @@ class Models:
             cached_input_price_per_1m=0,
             output_price_per_1m=0,
         )
+
+
+def builtin_model_configs() -> list[ModelConfig]:
+    """Every ModelConfig declared in the Models registry above."""
+    return [
+        value
+        for namespace in vars(Models).values()
+        if isinstance(namespace, type)
+        for value in vars(namespace).values()
+        if isinstance(value, ModelConfig)
+    ]
+
+
+class ModelCatalog:
+    """O(1) index of ModelConfig by (canonical provider, model_id).
+
+    Seeded with the built-in Models registry; api.services.agents.model_catalog overlays
+    entries loaded from a TOML/JSON file or the model_catalog table and swaps the whole
+    index at once on reload, so readers never see a half-built catalog.
+    """
+
+    def __init__(self, configs: Iterable[ModelConfig] = ()) -> None:
+        self._index: dict[tuple[str, str], ModelConfig] = {cfg.key: cfg for cfg in configs}
+
+    def get(self, provider: str, model_id: str) -> ModelConfig | None:
+        return self._index.get((canonical_provider(provider), model_id))
+
+    def all(self) -> list[ModelConfig]:
+        return list(self._index.values())
+
+    def replace(self, configs: Iterable[ModelConfig]) -> None:
+        self._index = {cfg.key: cfg for cfg in configs}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+model_catalog = ModelCatalog(builtin_model_configs())
+
+
+def find_model_config(provider: str, model_id: str) -> ModelConfig | None:
+    """Lookup a ModelConfig by (provider, model_id) in the catalog. Returns None if not found.
+
+    Provider aliases (e.g. `google_genai` -> `google`) are normalized so LangChain's
+    response_metadata names match what's declared in the Models registry.
+    """
+    return model_catalog.get(provider, model_id)
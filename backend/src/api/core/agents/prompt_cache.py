@@ -1,16 +1,307 @@
-from collections.abc import Mapping
+"""Provider prompt-prefix caching: stable prefixes, cache hints, expected vs reported hits.
+
+Providers bill cached input tokens at a discount (ModelConfig.cached_input_price_per_1m)
+only when a request starts with a byte-identical prefix of a recent one: system prompt,
+then tool schemas, then the history. PromptCacheMiddleware (prompt_cache_middleware.py)
+keeps that prefix stable and tells the provider about it; this module holds the state:
+
+    prefix_fingerprint()   hash of the system prompt + tool schemas (tools in name order,
+                           keys sorted) — the part of the prompt shared by every call of
+                           an agent. An agent whose fingerprint keeps changing (a date or
+                           an id in the system prompt) never hits the cache:
+                           prompt_prefix_changes{agent} counts the changes.
+    prompt_cache_key()     OpenAI `prompt_cache_key`: routes calls with the same prefix to
+                           the same cache shard (one key per agent + prefix).
+    PromptCache.gemini_cached_content()
+                           Gemini explicit cache (`cached_content` handle) holding the
+                           system instruction and the tools, created on first use for
+                           prefixes of at least PROMPT_CACHE_GEMINI_MIN_TOKENS, renewed
+                           before it expires (PROMPT_CACHE_GEMINI_TTL_S). Each worker keeps
+                           its own handles; creation failures back off for a TTL.
+    PromptCache.expect()   cache_read the provider should report for a call: the prefix
+                           shared with the previous call of the thread (or, for the first
+                           call of a thread, the agent's system + tools prefix) when that
+                           call is less than PROMPT_CACHE_TTL_S old, rounded down to
+                           PROMPT_CACHE_BLOCK_TOKENS, 0 under PROMPT_CACHE_MIN_TOKENS or for
+                           models without supports_prompt_cache. Approximate token counts
+                           (count_tokens_approximately), so compare trends, not exact values.
+
+Expected vs reported cache_read per agent (this worker): PromptCache.stats(), served by
+GET /usage/prompt-cache, and the counters prompt_cache_calls, prompt_cache_input_tokens,
+prompt_cache_expected_tokens, prompt_cache_read_tokens (labelled agent). A reported value
+well under the expected one means the prefix changes where it shouldn't (history trimming,
+volatile system prompt, tools reordered) or the provider evicted it.
+
+Env knobs (all optional):
+    PROMPT_CACHE_TTL_S               how long a provider keeps a prefix (default 300)
+    PROMPT_CACHE_MIN_TOKENS          shortest cacheable prompt (default 1024)
+    PROMPT_CACHE_BLOCK_TOKENS        cache granularity (default 128)
+    PROMPT_CACHE_MAX_THREADS         threads whose last prompt is remembered (default 10000)
+    PROMPT_CACHE_GEMINI_EXPLICIT     1 = create Gemini cached contents (default 1)
+    PROMPT_CACHE_GEMINI_MIN_TOKENS   smallest system + tools prefix cached (default 4096)
+    PROMPT_CACHE_GEMINI_TTL_S        lifetime of a Gemini cached content (default 3600)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from traceback import format_exc
+from typing import Any
+
+import orjson
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from api.core.agents import metrics
+from api.core.agents.models import ModelConfig
+
+PROMPT_CACHE_TTL_S: float = float(os.getenv("PROMPT_CACHE_TTL_S", "300"))
+PROMPT_CACHE_MIN_TOKENS: int = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+PROMPT_CACHE_BLOCK_TOKENS: int = int(os.getenv("PROMPT_CACHE_BLOCK_TOKENS", "128"))
+PROMPT_CACHE_MAX_THREADS: int = int(os.getenv("PROMPT_CACHE_MAX_THREADS", "10000"))
+PROMPT_CACHE_GEMINI_EXPLICIT: bool = os.getenv(
+    "PROMPT_CACHE_GEMINI_EXPLICIT", "1"
+).strip().lower() in ("1", "true", "yes")
+PROMPT_CACHE_GEMINI_MIN_TOKENS: int = int(os.getenv("PROMPT_CACHE_GEMINI_MIN_TOKENS", "4096"))
+PROMPT_CACHE_GEMINI_TTL_S: float = float(os.getenv("PROMPT_CACHE_GEMINI_TTL_S", "3600"))
+
+# A Gemini handle is replaced this long before it expires (calls in flight keep working).
+_GEMINI_RENEW_MARGIN_S = 120.0
+
+
+def _tool_schema(tool: BaseTool | dict[str, Any] | Any) -> dict[str, Any]:
+    if isinstance(tool, dict):
+        return tool
+    return convert_to_openai_tool(tool)
+
+
+def _tool_name(tool: BaseTool | dict[str, Any] | Any) -> str:
+    if isinstance(tool, BaseTool):
+        return tool.name
+    schema = _tool_schema(tool)
+    return str(schema.get("function", {}).get("name") or schema.get("name") or "")
+
+
+def stable_tools(tools: Sequence[Any]) -> list[Any]:
+    """`tools` in name order, so the tool block of the prompt never changes order."""
+    return sorted(tools, key=_tool_name)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(orjson.dumps(value, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+
+def prefix_fingerprint(system_message: SystemMessage | None, tools: Sequence[Any]) -> str:
+    """Hash of the system prompt + tool schemas, the prefix shared by an agent's calls."""
+    system = system_message.content if system_message is not None else None
+    return _digest([system, [_tool_schema(tool) for tool in stable_tools(tools)]])
+
+
+def message_fingerprint(message: AnyMessage) -> str:
+    return _digest(
+        [
+            message.type,
+            message.content,
+            getattr(message, "tool_calls", None),
+            getattr(message, "tool_call_id", None),
+        ]
+    )
+
+
+def prompt_cache_key(agent_id: str, fingerprint: str) -> str:
+    """OpenAI prompt_cache_key of an agent's prefix."""
+    return f"{agent_id}:{fingerprint[:16]}"
+
+
+@dataclass
+class _CallPrefix:
+    fingerprint: str
+    prefix_tokens: int
+    message_hashes: list[str]
+    # message_tokens[i] = approximate tokens of messages[:i + 1]
+    message_tokens: list[int]
+    at: float
+
+
+@dataclass
+class AgentCacheStats:
+    calls: int = 0
+    input_tokens: int = 0
+    expected_cache_read: int = 0
+    reported_cache_read: int = 0
+    prefix_changes: int = 0
+
+
+@dataclass
+class _GeminiHandle:
+    name: str | None
+    expires_at: float
 
 
 class PromptCache:
-    _cache: Mapping[str, str] = {}
+    """Prefix state of the recent calls of this worker (see module docstring)."""
+
+    def __init__(self) -> None:
+        # agent_id -> (fingerprint, prefix tokens, monotonic of the last call)
+        self._agent_prefixes: dict[str, tuple[str, int, float]] = {}
+        self._threads: OrderedDict[tuple[str, str], _CallPrefix] = OrderedDict()
+        self._stats: dict[str, AgentCacheStats] = {}
+        self._gemini: dict[tuple[str, str, str], _GeminiHandle] = {}
+        self._gemini_locks: dict[tuple[str, str, str], asyncio.Lock] = {}
+
+    def _stats_for(self, agent_id: str) -> AgentCacheStats:
+        stats = self._stats.get(agent_id)
+        if stats is None:
+            stats = self._stats[agent_id] = AgentCacheStats()
+        return stats
+
+    def expect(
+        self,
+        *,
+        agent_id: str,
+        thread_id: str | None,
+        config: ModelConfig | None,
+        fingerprint: str,
+        prefix_tokens: int,
+        messages: Sequence[AnyMessage],
+    ) -> int:
+        """Expected cache_read tokens of this call; remembers it for the next one."""
+        now = time.monotonic()
+        hashes = [message_fingerprint(message) for message in messages]
+        cumulative: list[int] = []
+        total = 0
+        for message in messages:
+            total += count_tokens_approximately([message])
+            cumulative.append(total)
+
+        shared = 0
+        previous_agent = self._agent_prefixes.get(agent_id)
+        if previous_agent is not None:
+            if previous_agent[0] != fingerprint:
+                self._stats_for(agent_id).prefix_changes += 1
+                metrics.increment("prompt_prefix_changes", agent=agent_id)
+            elif now - previous_agent[2] < PROMPT_CACHE_TTL_S:
+                shared = prefix_tokens
+        self._agent_prefixes[agent_id] = (fingerprint, prefix_tokens, now)
+
+        if thread_id:
+            key = (agent_id, thread_id)
+            previous = self._threads.pop(key, None)
+            if (
+                previous is not None
+                and previous.fingerprint == fingerprint
+                and now - previous.at < PROMPT_CACHE_TTL_S
+            ):
+                common = 0
+                for old, new in zip(previous.message_hashes, hashes, strict=False):
+                    if old != new:
+                        break
+                    common += 1
+                shared = prefix_tokens + (cumulative[common - 1] if common else 0)
+            self._threads[key] = _CallPrefix(fingerprint, prefix_tokens, hashes, cumulative, now)
+            while len(self._threads) > PROMPT_CACHE_MAX_THREADS:
+                self._threads.popitem(last=False)
+
+        if config is None or not config.supports_prompt_cache or shared < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        return shared // PROMPT_CACHE_BLOCK_TOKENS * PROMPT_CACHE_BLOCK_TOKENS
+
+    def record(self, agent_id: str, *, input_tokens: int, expected: int, reported: int) -> None:
+        """Usage of a finished call: expected vs reported cache_read."""
+        stats = self._stats_for(agent_id)
+        stats.calls += 1
+        stats.input_tokens += input_tokens
+        stats.expected_cache_read += expected
+        stats.reported_cache_read += reported
+        metrics.increment("prompt_cache_calls", agent=agent_id)
+        metrics.increment("prompt_cache_input_tokens", input_tokens, agent=agent_id)
+        metrics.increment("prompt_cache_expected_tokens", expected, agent=agent_id)
+        metrics.increment("prompt_cache_read_tokens", reported, agent=agent_id)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Expected vs reported cache_read per agent since this worker started."""
+        return {
+            agent_id: {
+                "calls": stats.calls,
+                "input_tokens": stats.input_tokens,
+                "expected_cache_read": stats.expected_cache_read,
+                "reported_cache_read": stats.reported_cache_read,
+                "expected_ratio": (
+                    stats.expected_cache_read / stats.input_tokens if stats.input_tokens else 0.0
+                ),
+                "reported_ratio": (
+                    stats.reported_cache_read / stats.input_tokens if stats.input_tokens else 0.0
+                ),
+                "prefix_changes": stats.prefix_changes,
+            }
+            for agent_id, stats in self._stats.items()
+        }
+
+    async def gemini_cached_content(
+        self,
+        model: Any,
+        config: ModelConfig,
+        system_message: SystemMessage,
+        tools: Sequence[Any],
+        fingerprint: str,
+    ) -> str | None:
+        """Name of a Gemini cached content holding `system_message` + `tools`, or None.
+
+        `model` is the ChatGoogleGenerativeAI of the call: its own request conversion
+        builds the cached parts, so they are exactly what it would have sent.
+        """
+        key = (config.provider, config.model_id, fingerprint)
+        handle = self._gemini.get(key)
+        if handle is not None and time.monotonic() < handle.expires_at - _GEMINI_RENEW_MARGIN_S:
+            return handle.name
+        lock = self._gemini_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            handle = self._gemini.get(key)
+            if handle is not None and time.monotonic() < handle.expires_at - _GEMINI_RENEW_MARGIN_S:
+                return handle.name
+            label = f"{config.provider}/{config.model_id}"
+            try:
+                from google.genai import types
 
-    @classmethod
-    def get(cls, key: str):
-        return cls._cache.get(key)
+                request = model._prepare_request(
+                    [system_message, HumanMessage(content=".")], tools=list(tools)
+                )
+                prepared = request["config"]
+                cached = await model.client.aio.caches.create(
+                    model=model.model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=prepared.system_instruction,
+                        tools=prepared.tools,
+                        ttl=f"{int(PROMPT_CACHE_GEMINI_TTL_S)}s",
+                    ),
+                )
+            except Exception:
+                print(f"[prompt_cache] Gemini cached content failed for {label}\n{format_exc()}")
+                metrics.increment("gemini_cache_creates", model=label, result="error")
+                # Back off: plain requests (implicit caching) until the TTL has passed.
+                self._gemini[key] = _GeminiHandle(
+                    None, time.monotonic() + PROMPT_CACHE_GEMINI_TTL_S
+                )
+                return None
+            metrics.increment("gemini_cache_creates", model=label, result="ok")
+            self._gemini[key] = _GeminiHandle(
+                cached.name, time.monotonic() + PROMPT_CACHE_GEMINI_TTL_S
+            )
+            return cached.name
 
-    @classmethod
-    def set(cls, key: str, value: str):
-        cls._cache[key] = value
+    def invalidate_gemini(self, config: ModelConfig, fingerprint: str) -> None:
+        """Drop a handle the provider rejected, backing off like a failed creation."""
+        self._gemini[(config.provider, config.model_id, fingerprint)] = _GeminiHandle(
+            None, time.monotonic() + PROMPT_CACHE_GEMINI_TTL_S
+        )
 
 
 prompt_cache = PromptCache()
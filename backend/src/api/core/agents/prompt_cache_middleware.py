@@ -0,0 +1,159 @@
+"""Prompt-cache friendly LLM calls (state and rules in api.core.agents.prompt_cache).
+
+For every model call of the tool loop:
+    - the tools go in name order, so the tool block of the prompt prefix never moves;
+    - OpenAI models get `prompt_cache_key` (agent + prefix fingerprint);
+    - Gemini models get the `cached_content` handle of their system + tools prefix and
+      stop sending both, once that prefix reaches PROMPT_CACHE_GEMINI_MIN_TOKENS (a call
+      rejected with the handle before any token is retried once without it);
+    - the expected cache_read (PromptCache.expect) is compared with the one the provider
+      reports (PromptCache.record).
+
+Put it after every middleware that changes the prompt or picks the model (history window,
+budget downgrade, failover / router) and before the rate-limit / concurrency middleware:
+
+    create_agent(..., middleware=[budget_middleware, failover, prompt_cache_middleware,
+                                  rate_limit_middleware, concurrency_middleware])
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.messages import AIMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.config import get_config
+
+from api.core.agents.custom_providers import classify_provider_error, model_config_of
+from api.core.agents.latency import FirstTokenWatcher, watch_first_token
+from api.core.agents.prompt_cache import (
+    PROMPT_CACHE_GEMINI_EXPLICIT,
+    PROMPT_CACHE_GEMINI_MIN_TOKENS,
+    prefix_fingerprint,
+    prompt_cache,
+    prompt_cache_key,
+    stable_tools,
+)
+
+
+def _metadata() -> dict[str, Any]:
+    try:
+        return get_config().get("metadata") or {}
+    except RuntimeError:
+        return {}
+
+
+def _usage(response: ModelResponse[Any]) -> tuple[int, int]:
+    """(input tokens, cache_read tokens) reported for the call."""
+    for message in reversed(response.result):
+        if isinstance(message, AIMessage) and message.usage_metadata:
+            details = message.usage_metadata.get("input_token_details") or {}
+            return (
+                int(message.usage_metadata.get("input_tokens") or 0),
+                int(details.get("cache_read") or 0),
+            )
+    return 0, 0
+
+
+class PromptCacheMiddleware(AgentMiddleware):
+    """Stable prompt prefix + provider cache hints (see api.core.agents.prompt_cache)."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        config = model_config_of(request.model)
+        metadata = _metadata()
+        agent_id = str(metadata.get("agent_id") or "")
+
+        tools = stable_tools(request.tools)
+        if any(a is not b for a, b in zip(tools, request.tools, strict=True)):
+            request = request.override(tools=tools)
+        system = [request.system_message] if request.system_message is not None else []
+        fingerprint = prefix_fingerprint(request.system_message, tools)
+        prefix_tokens = count_tokens_approximately(system, tools=tools)
+        expected = 0
+        if agent_id:
+            thread_id = metadata.get("thread_id")
+            expected = prompt_cache.expect(
+                agent_id=agent_id,
+                thread_id=str(thread_id) if thread_id else None,
+                config=config,
+                fingerprint=fingerprint,
+                prefix_tokens=prefix_tokens,
+                messages=request.messages,
+            )
+
+        cached_content = None
+        if config is not None and config.provider == "openai" and agent_id:
+            request = request.override(
+                model_settings={
+                    **request.model_settings,
+                    "prompt_cache_key": prompt_cache_key(agent_id, fingerprint),
+                }
+            )
+        elif (
+            config is not None
+            and PROMPT_CACHE_GEMINI_EXPLICIT
+            and isinstance(request.model, ChatGoogleGenerativeAI)
+            and request.system_message is not None
+            and request.tool_choice is None
+            and request.response_format is None
+            and prefix_tokens >= PROMPT_CACHE_GEMINI_MIN_TOKENS
+        ):
+            cached_content = await prompt_cache.gemini_cached_content(
+                request.model, config, request.system_message, tools, fingerprint
+            )
+
+        if cached_content is None:
+            response = await handler(request)
+        else:
+            watcher = FirstTokenWatcher()
+            try:
+                with watch_first_token(watcher):
+                    response = await handler(
+                        request.override(
+                            system_message=None,
+                            tools=[],
+                            model_settings={
+                                **request.model_settings,
+                                "cached_content": cached_content,
+                            },
+                        )
+                    )
+            except Exception as e:
+                if watcher.first_token_at is not None or classify_provider_error(e) is not None:
+                    raise
+                # Most likely the handle expired or was deleted: send the full prompt.
+                if config is not None:
+                    prompt_cache.invalidate_gemini(config, fingerprint)
+                response = await handler(request)
+
+        if agent_id:
+            input_tokens, cache_read = _usage(response)
+            prompt_cache.record(
+                agent_id, input_tokens=input_tokens, expected=expected, reported=cache_read
+            )
+        return response
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        # Sync invocations only get the stable tool order.
+        tools = stable_tools(request.tools)
+        if any(a is not b for a, b in zip(tools, request.tools, strict=True)):
+            request = request.override(tools=tools)
+        return handler(request)
+
+
+prompt_cache_middleware = PromptCacheMiddleware()
@@ -0,0 +1,103 @@
+"""Provider RPM/TPM limits before every LLM call of the tool loop.
+
+Waits in api.services.agents.rate_limits' queue until the model's request and token
+buckets allow the call (prompt tokens estimated from the request, settled with the real
+usage afterwards, refunded when the response cache answered). Models not built by init_model, or without rpm_limit / tpm_limit in
+the catalog, pass straight through. The queue is fair per user (then client, then thread)
+taken from the run's `metadata`.
+
+Put it after budget_middleware so the limit applies to the model that actually runs:
+
+    create_agent(..., middleware=[budget_middleware, rate_limit_middleware])
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.messages import AIMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.config import get_config
+
+from api.core.agents.custom_providers import classify_provider_error, model_config_of
+from api.core.agents.response_cache import served_from_cache
+from api.services.agents.rate_limits import (
+    RATE_LIMIT_MAX_WAIT_S,
+    RATE_LIMIT_OUTPUT_TOKENS,
+    ModelRateLimiter,
+    rate_limiter,
+)
+
+
+def _limiter(request: ModelRequest[Any]) -> ModelRateLimiter | None:
+    config = model_config_of(request.model)
+    return rate_limiter.limiter_for(config) if config is not None else None
+
+
+def _estimate_tokens(request: ModelRequest[Any]) -> int:
+    messages = list(request.messages)
+    if request.system_message is not None:
+        messages.insert(0, request.system_message)
+    return count_tokens_approximately(messages, tools=request.tools) + RATE_LIMIT_OUTPUT_TOKENS
+
+
+def _tenant() -> str:
+    try:
+        metadata = get_config().get("metadata") or {}
+    except RuntimeError:
+        metadata = {}
+    for key in ("user_id", "client_id", "thread_id"):
+        if metadata.get(key):
+            return f"{key}:{metadata[key]}"
+    return "-"
+
+
+def _total_tokens(response: ModelResponse[Any] | AIMessage) -> int:
+    messages = [response] if isinstance(response, AIMessage) else response.result
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and message.usage_metadata:
+            return int(message.usage_metadata.get("total_tokens") or 0)
+    return 0
+
+
+class RateLimitMiddleware(AgentMiddleware):
+    """Queue model calls until the provider's RPM/TPM budget (see rate_limiter) allows them."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        limiter = _limiter(request)
+        if limiter is None:
+            return await handler(request)
+        estimated = _estimate_tokens(request)
+        await limiter.acquire(estimated, _tenant(), RATE_LIMIT_MAX_WAIT_S)
+        try:
+            response = await handler(request)
+        except Exception as e:
+            if classify_provider_error(e) == "rate_limited":
+                limiter.penalize()
+            raise
+        if served_from_cache(response):
+            limiter.refund(estimated)  # the provider was never called
+        else:
+            limiter.settle(estimated, _total_tokens(response))
+        return response
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        # The buckets live on the event loop; sync invocations are not limited.
+        return handler(request)
+
+
+rate_limit_middleware = RateLimitMiddleware()
@@ -0,0 +1,401 @@
+"""Exact-match LLM response cache, applied by init_model on request.
+
+The same call often comes back: the same first question to an agent, the same tool result
+to summarize, a retry after the client dropped the stream. A model built with
+
+    init_model(Models.Groq.GPT_OSS_120B, response_cache=True)
+    init_model(Models.Groq.GPT_OSS_120B, response_cache=True, response_cache_ttl_s=600)
+
+answers a call it has already answered within the TTL from the cache instead of the
+provider. Key: sha256 of the canonical JSON (sorted keys) of
+
+    ModelConfig (provider, model_id, reasoning, thinking, reasoning_effort) and the
+    init_model overrides     fingerprinted once by init_model (metadata
+                             "response_cache_params"); clients and other objects count
+                             by type only
+    call parameters          stop and everything bound to the call: tools, tool_choice,
+                             model_settings (prompt_cache_key, cached_content, ...)
+    messages                 type, content, name, tool calls / tool_call_id and
+                             additional_kwargs of each one, ids left out
+
+so any change of model, parameter, tool schema or history is a different entry. Two
+tiers: an in-memory LRU per worker (RESPONSE_CACHE_MAX_ENTRIES), in front of the
+llm_response_cache table shared by every worker (written in the background, read with a
+RESPONSE_CACHE_DB_TIMEOUT_S budget; expired rows are deleted by the maintenance loop).
+Only calls through ainvoke / the agent loop use the cache; sync calls and astream() go to
+the provider as usual.
+
+An answer that was streamed is stored as its chunks and replayed chunk by chunk through
+the run's callbacks, so SSE streaming, first-token timings and astream_events behave as
+for a provider answer (only faster). Answers without text or tool calls, failed and
+cancelled calls are never stored.
+
+Usage: the AIMessage of a call carries response_metadata["response_cache"] = "hit" or
+"miss", written to agent_message_usage.response_cache. A hit reports zero tokens, so it
+costs nothing in usage or budgets, its rate-limit reservation is refunded and it feeds no
+latency statistics (see served_from_cache). Metrics: response_cache_hits{model,tier=
+memory|postgres}, response_cache_misses{model}, response_cache_saved_usd{model},
+response_cache_errors{op} (counters), response_cache_entries (gauge, memory tier).
+
+Env knobs (all optional):
+    RESPONSE_CACHE_TTL_S            default lifetime of an entry (default 3600)
+    RESPONSE_CACHE_MAX_ENTRIES      entries kept in memory per worker (default 2000)
+    RESPONSE_CACHE_DB               1 = use the Postgres tier when a pool exists (default 1)
+    RESPONSE_CACHE_DB_TIMEOUT_S     longest Postgres lookup before a miss (default 0.25)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from traceback import format_exc
+from typing import Any
+
+import orjson
+from langchain.agents.middleware.types import ModelResponse
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.utils.utils import LC_ID_PREFIX
+from pydantic import BaseModel
+
+from api.core.agents import metrics
+from api.core.agents.models import ModelConfig, compute_cost_usd, find_model_config
+from api.repositories.agents.response_cache import get_cached_response, upsert_cached_response
+from config import database as database_module
+
+RESPONSE_CACHE_TTL_S: float = float(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_DB: bool = os.getenv("RESPONSE_CACHE_DB", "1").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+RESPONSE_CACHE_DB_TIMEOUT_S: float = float(os.getenv("RESPONSE_CACHE_DB_TIMEOUT_S", "0.25"))
+
+RESPONSE_CACHE_HIT = "hit"
+RESPONSE_CACHE_MISS = "miss"
+
+_ZERO_USAGE = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+# Chunks streamed by the call being cached (set around the provider call only).
+_recording: ContextVar[list[ChatGenerationChunk] | None] = ContextVar(
+    "response_cache_recording", default=None
+)
+
+
+def served_from_cache(response: ModelResponse[Any]) -> bool:
+    """Whether a model call was answered by the response cache (nothing about the provider's
+    latency, capacity or rate limits can be learned from it)."""
+    return any(
+        isinstance(message, AIMessage)
+        and message.response_metadata.get("response_cache") == RESPONSE_CACHE_HIT
+        for message in response.result
+    )
+
+
+def _canonical(value: Any) -> Any:
+    """orjson fallback: pydantic models by value, anything else by type (never by repr,
+    which would put memory addresses in the key)."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", exclude_none=True)
+    return f"<{type(value).__module__}.{type(value).__qualname__}>"
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(
+        orjson.dumps(value, option=orjson.OPT_SORT_KEYS, default=_canonical)
+    ).hexdigest()
+
+
+def params_fingerprint(config: ModelConfig, overrides: dict[str, Any]) -> str:
+    """Hash of what init_model builds the model from (called before it consumes overrides)."""
+    return _digest(
+        [
+            config.provider,
+            config.model_id,
+            config.reasoning,
+            config.thinking,
+            config.reasoning_effort,
+            overrides,
+        ]
+    )
+
+
+def _message_key(message: BaseMessage) -> list[Any]:
+    return [
+        message.type,
+        message.content,
+        message.name,
+        getattr(message, "tool_calls", None),
+        getattr(message, "tool_call_id", None),
+        message.additional_kwargs,
+    ]
+
+
+def response_cache_key(
+    params: str, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict[str, Any]
+) -> str:
+    """Canonical hash of one call (see module docstring)."""
+    return _digest([params, stop, kwargs, [_message_key(message) for message in messages]])
+
+
+def _chunk_data(message: AIMessageChunk) -> dict[str, Any]:
+    return {
+        "content": message.content,
+        "additional_kwargs": message.additional_kwargs,
+        "response_metadata": message.response_metadata,
+        "tool_call_chunks": message.tool_call_chunks,
+        "chunk_position": message.chunk_position,
+    }
+
+
+def _message_as_chunk(message: AIMessage) -> dict[str, Any]:
+    """A non-streamed answer, stored as the one chunk that replays it."""
+    return {
+        "content": message.content,
+        "additional_kwargs": message.additional_kwargs,
+        "response_metadata": message.response_metadata,
+        "tool_call_chunks": [
+            {
+                "name": call["name"],
+                "args": orjson.dumps(call["args"]).decode(),
+                "id": call.get("id"),
+                "index": index,
+            }
+            for index, call in enumerate(message.tool_calls)
+        ],
+        "chunk_position": "last",
+    }
+
+
+def _payload(result: ChatResult, chunks: list[ChatGenerationChunk]) -> bytes | None:
+    """What gets stored for a call, or None when it is not worth caching."""
+    if len(result.generations) != 1:
+        return None
+    message = result.generations[0].message
+    if not isinstance(message, AIMessage) or not (message.text or message.tool_calls):
+        return None
+    stored = (
+        [
+            _chunk_data(chunk.message)
+            for chunk in chunks
+            if isinstance(chunk.message, AIMessageChunk)
+        ]
+        if chunks
+        else [_message_as_chunk(message)]
+    )
+    try:
+        return orjson.dumps({"chunks": stored, "usage": message.usage_metadata})
+    except TypeError:  # e.g. bytes in additional_kwargs
+        metrics.increment("response_cache_errors", op="serialize")
+        return None
+
+
+class _MemoryTier:
+    """LRU of payloads with their expiry (monotonic), per worker."""
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, payload: bytes, ttl_s: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl_s, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > RESPONSE_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Both tiers of the exact-match response cache."""
+
+    def __init__(self) -> None:
+        self._memory = _MemoryTier()
+        self._writes: set[asyncio.Task] = set()
+        self._collector_registered = False
+
+    @staticmethod
+    def _pool() -> Any:
+        return getattr(database_module, "asyncpg_pool", None) if RESPONSE_CACHE_DB else None
+
+    async def get(self, key: str, model: str) -> bytes | None:
+        payload = self._memory.get(key)
+        if payload is not None:
+            metrics.increment("response_cache_hits", model=model, tier="memory")
+            return payload
+        pool = self._pool()
+        if pool is not None:
+            try:
+                async with asyncio.timeout(RESPONSE_CACHE_DB_TIMEOUT_S):
+                    async with pool.acquire() as conn:
+                        row = await get_cached_response(conn, key)
+            except Exception:
+                metrics.increment("response_cache_errors", op="get")
+                row = None
+            if row is not None:
+                metrics.increment("response_cache_hits", model=model, tier="postgres")
+                self._memory.set(key, row["response"], row["ttl_s"])
+                return row["response"]
+        metrics.increment("response_cache_misses", model=model)
+        return None
+
+    def set(self, key: str, config: ModelConfig, payload: bytes, ttl_s: float) -> None:
+        if not self._collector_registered:
+            metrics.register_collector(self._collect_metrics)
+            self._collector_registered = True
+        self._memory.set(key, payload, ttl_s)
+        if self._pool() is not None:
+            task = asyncio.create_task(self._write(key, config, payload, ttl_s))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, key: str, config: ModelConfig, payload: bytes, ttl_s: float) -> None:
+        pool = self._pool()
+        if pool is None:
+            return
+        try:
+            async with pool.acquire() as conn:
+                await upsert_cached_response(
+                    conn, key, config.provider, config.model_id, payload, ttl_s
+                )
+        except Exception:
+            metrics.increment("response_cache_errors", op="set")
+            print(f"[ResponseCache] write failed\n{format_exc()}")
+
+    async def drain(self) -> None:
+        """Wait for the pending Postgres writes (called at shutdown)."""
+        if self._writes:
+            with contextlib.suppress(Exception):
+                await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _collect_metrics(self) -> None:
+        metrics.set_gauge("response_cache_entries", len(self._memory))
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMixin:
+    """Put in front of a chat model class by enable_response_cache(): serves ainvoke calls
+    from the cache and records the chunks of the ones it sends."""
+
+    async def _astream(self, *args: Any, **kwargs: Any) -> Any:
+        recording = _recording.get()
+        async for chunk in super()._astream(*args, **kwargs):
+            if recording is not None:
+                recording.append(chunk)
+            yield chunk
+
+    async def _agenerate_with_cache(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        model: BaseChatModel = self
+        metadata = model.metadata or {}
+        config = find_model_config(
+            str(metadata.get("model_provider")), str(metadata.get("model_id"))
+        )
+        if config is None or not metadata.get("response_cache_params"):
+            return await super()._agenerate_with_cache(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+        label = f"{config.provider}/{config.model_id}"
+        key = response_cache_key(metadata["response_cache_params"], messages, stop, kwargs)
+
+        payload = await response_cache.get(key, label)
+        if payload is not None:
+            return await self._replay(orjson.loads(payload), config, label, run_manager, **kwargs)
+
+        recording: list[ChatGenerationChunk] = []
+        token = _recording.set(recording)
+        try:
+            result: ChatResult = await super()._agenerate_with_cache(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+        finally:
+            _recording.reset(token)
+        for generation in result.generations:
+            generation.message.response_metadata["response_cache"] = RESPONSE_CACHE_MISS
+        stored = _payload(result, recording)
+        if stored is not None:
+            ttl_s = float(metadata.get("response_cache_ttl_s") or RESPONSE_CACHE_TTL_S)
+            response_cache.set(key, config, stored, ttl_s)
+        return result
+
+    async def _replay(
+        self,
+        payload: dict[str, Any],
+        config: ModelConfig,
+        label: str,
+        run_manager: AsyncCallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        model: BaseChatModel = self
+        run_id = f"{LC_ID_PREFIX}-{run_manager.run_id}" if run_manager else None
+        chunks = [
+            ChatGenerationChunk(message=AIMessageChunk(**data, id=run_id))
+            for data in payload["chunks"]
+        ]
+        if chunks[-1].message.chunk_position != "last":
+            chunks.append(
+                ChatGenerationChunk(
+                    message=AIMessageChunk(
+                        content="" if isinstance(chunks[-1].message.content, str) else [],
+                        chunk_position="last",
+                        id=run_id,
+                    )
+                )
+            )
+        if run_manager and model._should_stream(async_api=True, run_manager=run_manager, **kwargs):
+            for chunk in chunks:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+
+        result = generate_from_stream(iter(chunks))
+        message = result.generations[0].message
+        message.usage_metadata = dict(_ZERO_USAGE)
+        message.response_metadata["response_cache"] = RESPONSE_CACHE_HIT
+        metrics.increment(
+            "response_cache_saved_usd", compute_cost_usd(payload.get("usage"), config), model=label
+        )
+        return result
+
+
+@functools.cache
+def _cached_model_class(cls: type[BaseChatModel]) -> type[BaseChatModel]:
+    return type(f"ResponseCached{cls.__name__}", (ResponseCacheMixin, cls), {})
+
+
+def enable_response_cache(
+    model: BaseChatModel, params: str, ttl_s: float | None = None
+) -> BaseChatModel:
+    """Serve `model`'s calls from the response cache (in place: the model keeps its clients,
+    isinstance checks still hold). `params` comes from params_fingerprint()."""
+    model.__class__ = _cached_model_class(type(model))
+    model.metadata = {
+        **(model.metadata or {}),
+        "response_cache_params": params,
+        "response_cache_ttl_s": ttl_s if ttl_s is not None else RESPONSE_CACHE_TTL_S,
+    }
+    return model
@@ -0,0 +1,98 @@
+"""Route each LLM call to the best model of a pool, by latency and/or cost.
+
+Instead of one hardcoded model, an agent declares the ModelConfigs it accepts and a
+RoutingObjective; every call goes to the model api.services.agents.model_router ranks
+first from its live scoreboard (TTFT, tokens/s, error rate, price), the rest of the
+ranking being the failover order. Built on FailoverMiddleware, so circuit breakers,
+fallback and hedging (hedge=True) work the same:
+
+    router = ModelRouterMiddleware(
+        Models.Groq.GPT_OSS_120B,
+        Models.Chutes.GPT_OSS_120B_TEE,
+        objective=RoutingObjective(goal="cost", latency_target_s=4),
+    )
+    config = AgentConfig(..., model=router.model)
+    create_agent(..., middleware=[budget_middleware, router, rate_limit_middleware,
+                                  concurrency_middleware])
+
+Same place in the middleware list as FailoverMiddleware. Every attempt feeds the
+scoreboard: TTFT (waits in the rate / concurrency limits included: they are part of what
+a provider costs right now) and generation speed on success, an error on 429 / 5xx /
+timeout / connection error. Cancelled attempts (lost hedges) and answers served by the
+response cache feed nothing.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from api.core.agents.custom_providers import classify_provider_error, model_config_of
+from api.core.agents.failover_middleware import FailoverMiddleware
+from api.core.agents.latency import FirstTokenWatcher, watch_first_token
+from api.core.agents.models import ModelConfig
+from api.core.agents.response_cache import served_from_cache
+from api.services.agents.model_router import RoutingObjective, model_router
+
+
+def _output_tokens(response: ModelResponse[Any]) -> int:
+    for message in reversed(response.result):
+        if isinstance(message, AIMessage) and message.usage_metadata:
+            return int(message.usage_metadata.get("output_tokens") or 0)
+    return 0
+
+
+class ModelRouterMiddleware(FailoverMiddleware):
+    """Serve each model call from the pool model that best fits `objective`."""
+
+    def __init__(
+        self,
+        *configs: ModelConfig,
+        objective: RoutingObjective | None = None,
+        hedge: bool = False,
+        **overrides: Any,
+    ) -> None:
+        """`overrides` go to init_model for every model of the pool (e.g. max_tokens)."""
+        super().__init__(*configs, hedge=hedge, **overrides)
+        self.objective = objective or RoutingObjective()
+
+    def chain(self, request: ModelRequest[Any]) -> list[int]:
+        messages = list(request.messages)
+        if request.system_message is not None:
+            messages.insert(0, request.system_message)
+        prompt_tokens = count_tokens_approximately(messages, tools=request.tools)
+        return model_router.rank(list(self.configs), self.objective, prompt_tokens)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        async def observed(attempt: ModelRequest[Any]) -> ModelResponse[Any]:
+            config = model_config_of(attempt.model)
+            if config is None:
+                return await handler(attempt)
+            watcher = FirstTokenWatcher()
+            started = time.monotonic()
+            try:
+                with watch_first_token(watcher):
+                    response = await handler(attempt)
+            except Exception as e:
+                if classify_provider_error(e) is not None:
+                    model_router.observe_error(config)
+                raise
+            if served_from_cache(response):
+                return response
+            ended = time.monotonic()
+            first_token_at = watcher.first_token_at or ended
+            model_router.observe(
+                config, first_token_at - started, _output_tokens(response), ended - first_token_at
+            )
+            return response
+
+        return await super().awrap_model_call(request, observed)
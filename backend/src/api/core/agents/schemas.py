@@ -6,6 +6,28 @@ from pydantic import BaseModel, ConfigDict, Field
 
 SuggestionSection = Literal["direct", "template", "follow_up"]
 
+# LangGraph checkpoint durability: "sync" persists every super-step before the next one
+# starts, "async" persists in the background while the next step runs, "exit" persists
+# only the final state of the run (fewest DB round trips; a crash mid-turn loses the turn).
+CheckpointDurability = Literal["sync", "async", "exit"]
+
+# Where the UI history of a thread comes from: "chat_history" keeps a reshaped copy of
+# every turn in chat_history.messages; "checkpoint" keeps only thread metadata there and
+# projects the history from the LangGraph checkpoint (requires save_to_db=True).
+HistorySource = Literal["chat_history", "checkpoint"]
+
+# What a request does when its thread already has a run in flight (see run_coordinator):
+# wait for it ("queue"), fail with 409 ("reject") or follow its SSE stream ("join").
+ConcurrencyPolicy = Literal["queue", "reject", "join"]
+
+# What happens once a budget is exhausted (see api.services.agents.budgets): fail the
+# request, or keep serving it with AgentBudget.fallback_model.
+BudgetAction = Literal["reject", "downgrade"]
+
+# Per-request speed / depth trade-off (ChatRequest.latency_profile), mapped per agent to
+# init_model overrides by AgentConfig.latency_profiles (see api.services.agents.latency_profiles).
+LatencyProfile = Literal["fast", "balanced", "deep"]
+
 
 class AgentSuggestionInstant(BaseModel):
     kind: Literal["instant"] = "instant"
@@ -30,6 +52,42 @@ AgentSuggestion = Annotated[
 ]
 
 
+class BudgetLimit(BaseModel):
+    """Daily (UTC) ceiling; None means unlimited."""
+
+    cost_usd: float | None = None
+    tokens: int | None = None
+
+
+class AgentBudget(BaseModel):
+    """Per-agent quotas, checked before each run and before each LLM call."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    total: BudgetLimit | None = None  # the agent as a whole, all users
+    per_user: BudgetLimit | None = None  # each user, on this agent
+    per_client: BudgetLimit | None = None  # each active_client_id, on this agent
+    on_exhausted: BudgetAction = "reject"
+    fallback_model: BaseChatModel | None = None  # required for "downgrade"
+
+
+class SemanticCachePolicy(BaseModel):
+    """Answer first-turn paraphrases from the semantic cache (api.services.agents.semantic_cache)."""
+
+    threshold: float = 0.8  # min cosine of the hashed n-gram vectors (then terms must match)
+    ttl_s: float = 3600  # how long a stored answer can be served
+    synonyms: dict[str, str] = {}  # word -> replacement before matching ("" drops the word)
+
+
+class BrownoutPolicy(BaseModel):
+    """How the agent steps down under load (api.services.agents.brownout)."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    profile: LatencyProfile = "fast"  # "reduced": serve every call with this latency profile
+    fallback_model: BaseChatModel | None = None  # "fallback": serve every call with this model
+
+
 class AgentConfig(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -40,6 +98,15 @@ class AgentConfig(BaseModel):
     tools: list[BaseTool] = []
     suggestions: list[AgentSuggestion] = []
     save_to_db: bool = True
+    durability: CheckpointDurability = "async"
+    history_source: HistorySource = "chat_history"
+    concurrency_policy: ConcurrencyPolicy = "queue"
+    budget: AgentBudget | None = None
+    semantic_cache: SemanticCachePolicy | None = None  # needs semantic_cache_middleware
+    # init_model overrides per latency profile, applied to every model the agent calls
+    # (needs latency_profile_middleware); a profile left out serves the models as built.
+    latency_profiles: dict[LatencyProfile, dict[str, Any]] = {}
+    brownout: BrownoutPolicy | None = None  # needs brownout_middleware
 
 
 SUGGESTION_LABEL_MAX_CHARS = 56
@@ -0,0 +1,202 @@
+"""Serve first-turn paraphrases from the semantic cache (api.services.agents.semantic_cache).
+
+For agents with AgentConfig.semantic_cache set:
+    - the first model call of a turn that starts from the question alone (first turn of a
+      thread, or any turn of an agent without checkpointer) looks the question up; on a
+      hit the call is answered by _CachedAnswerModel, which streams the stored answer in
+      chunks through the run's callbacks, so SSE, chat history, checkpoints and turn
+      timings see an ordinary model answer — no provider call, no tools, no spend;
+    - when such a turn ends with a plain text answer (no tool error on the way), the
+      question and that answer are stored — unless a call of the turn was served by a
+      budget fallback, a latency-profile variant or a brownout fallback (e.g. a "fast"
+      answer), which would then be replayed to requests that didn't ask for it.
+
+The served call writes a usage row with zero tokens and response_cache="semantic",
+attributed to the agent's model. Put it first, so hits skip the budget, rate-limit and
+concurrency checks of the provider call they replace:
+
+    create_agent(..., middleware=[semantic_cache_middleware, budget_middleware, ...])
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    AgentState,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    AnyMessage,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.config import get_config
+from langgraph.runtime import Runtime
+
+from api.core.agents.custom_providers import model_config_of
+from api.services.agents.semantic_cache import semantic_cache
+
+SEMANTIC_CACHE_HIT = "semantic"
+
+# Characters per replayed chunk.
+_CHUNK_CHARS = 48
+_ZERO_USAGE = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+# response_metadata keys set by BudgetMiddleware, LatencyProfileMiddleware and
+# BrownoutMiddleware.
+_DOWNGRADE_TAGS = frozenset({"budget", "latency_profile", "brownout"})
+
+
+def _agent_id() -> str | None:
+    try:
+        agent_id = (get_config().get("metadata") or {}).get("agent_id")
+    except RuntimeError:
+        return None
+    return str(agent_id) if agent_id else None
+
+
+def _question(messages: Sequence[AnyMessage]) -> str | None:
+    """Text of the only message when it is a plain-text user question, else None."""
+    if len(messages) != 1 or not isinstance(messages[0], HumanMessage):
+        return None
+    content = messages[0].content
+    if isinstance(content, str):
+        return content
+    if all(isinstance(block, dict) and block.get("type") == "text" for block in content):
+        return " ".join(str(block.get("text") or "") for block in content)
+    return None  # images, files, ...
+
+
+class _CachedAnswerModel(BaseChatModel):
+    """Chat model that answers with a stored text, streamed in _CHUNK_CHARS pieces."""
+
+    answer: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "semantic-cache"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],  # noqa: ARG002
+        stop: list[str] | None = None,  # noqa: ARG002
+        run_manager: CallbackManagerForLLMRun | None = None,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ARG002
+    ) -> ChatResult:
+        message = AIMessage(
+            content=self.answer,
+            usage_metadata=dict(_ZERO_USAGE),
+            response_metadata={"response_cache": SEMANTIC_CACHE_HIT},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],  # noqa: ARG002
+        stop: list[str] | None = None,  # noqa: ARG002
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ARG002
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for start in range(0, len(self.answer), _CHUNK_CHARS):
+            piece = self.answer[start : start + _CHUNK_CHARS]
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                usage_metadata=dict(_ZERO_USAGE),
+                response_metadata={"response_cache": SEMANTIC_CACHE_HIT},
+                chunk_position="last",
+            )
+        )
+
+
+class SemanticCacheMiddleware(AgentMiddleware):
+    """Answer first-turn paraphrases from the semantic cache and fill it (see module)."""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any]:
+        agent_id = _agent_id()
+        if agent_id is None or not semantic_cache.enabled(agent_id):
+            return await handler(request)
+        question = _question(request.messages)
+        if question is None or request.response_format is not None:
+            return await handler(request)
+        hit = semantic_cache.lookup(agent_id, question)
+        if hit is None:
+            return await handler(request)
+
+        config = model_config_of(request.model)
+        model = _CachedAnswerModel(
+            answer=hit.answer,
+            cache=False,
+            metadata=(
+                {"model_provider": config.provider, "model_id": config.model_id}
+                if config is not None
+                else None
+            ),
+        )
+        # Runs under the model node's config: same callbacks, metadata and stream events.
+        message = await model.ainvoke(request.messages)
+        return ModelResponse(result=[message])
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], ModelResponse[Any]],
+    ) -> ModelResponse[Any]:
+        # Sync invocations are not served from the cache (the API streams async).
+        return handler(request)
+
+    def after_agent(self, state: AgentState[Any], runtime: Runtime[Any]) -> dict[str, Any] | None:  # noqa: ARG002
+        self._store(state)
+        return None
+
+    async def aafter_agent(
+        self,
+        state: AgentState[Any],
+        runtime: Runtime[Any],  # noqa: ARG002
+    ) -> dict[str, Any] | None:
+        self._store(state)
+        return None
+
+    @staticmethod
+    def _store(state: AgentState[Any]) -> None:
+        agent_id = _agent_id()
+        if agent_id is None or not semantic_cache.enabled(agent_id):
+            return
+        messages = state["messages"]
+        if sum(isinstance(message, HumanMessage) for message in messages) != 1:
+            return  # not a first turn
+        question = _question(messages[:1])
+        final = messages[-1]
+        if (
+            question is None
+            or not isinstance(final, AIMessage)
+            or final.tool_calls
+            or not final.text
+            or final.response_metadata.get("response_cache") == SEMANTIC_CACHE_HIT
+        ):
+            return
+        if any(isinstance(m, ToolMessage) and m.status == "error" for m in messages):
+            return
+        if any(
+            isinstance(m, AIMessage) and _DOWNGRADE_TAGS & m.response_metadata.keys()
+            for m in messages
+        ):
+            return  # made with a variant or fallback model
+        semantic_cache.store(agent_id, question, final.text)
+
+
+semantic_cache_middleware = SemanticCacheMiddleware()
@@ -6,15 +6,27 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from api import agents_router
 from api.core.agents.checkpointer import close_checkpointer, init_checkpointer
+from api.core.agents.http_clients import close_http_clients
+from api.core.agents.response_cache import response_cache
+from api.services.agents.brownout import brownout
+from api.services.agents.budgets import budget_ledger
+from api.services.agents.maintenance import start_maintenance, stop_maintenance
+from api.services.agents.model_catalog import start_model_catalog, stop_model_catalog
+from api.services.agents.rate_limits import rate_limiter
 from api.services.agents.registry import get_agents_registry, reload_agents_registry
-from config.database import close_asyncpg_pool, init_asyncpg_pool
+from api.services.agents.usage_writer import usage_writer
+from config.database import close_asyncpg_pool, init_asyncpg_pool, init_asyncpg_read_pool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup / shutdown lifecycle for the application."""
-    # 1. Initialize database pool
+    # 1. Initialize database pools (primary + optional read replica)
     await init_asyncpg_pool()
+    await init_asyncpg_read_pool()
+
+    # 2. Model catalog overrides (prices/capabilities from file or DB), hot-reloaded
+    await start_model_catalog()
 
     # 3. Initialize checkpointer (Postgres)
     await init_checkpointer()
@@ -22,11 +34,27 @@ async def lifespan(app: FastAPI):
     # 4. Load agents
     await reload_agents_registry()
 
+    # 5. Background tasks: usage partitions maintenance, batched usage writer, budgets,
+    #    cross-worker provider rate limit shares, brownout level
+    start_maintenance()
+    usage_writer.start()
+    budget_ledger.start()
+    rate_limiter.start()
+    brownout.start()
+
     yield
 
-    # Cleanup
+    # Cleanup (usage writer first: it drains pending rows through the pool)
+    await usage_writer.close()
+    await response_cache.drain()
+    await budget_ledger.stop()
+    await rate_limiter.stop()
+    await brownout.stop()
+    await stop_model_catalog()
+    await stop_maintenance()
     await close_checkpointer()
     await close_asyncpg_pool()
+    await close_http_clients()
 
 
 app = FastAPI(title="Multi-Agent LiteLLM Proxy", version="1.0.0", lifespan=lifespan)
@@ -1,10 +1,27 @@
 from api.models.agents.checkpoint import AgentCheckpoint, AgentCheckpointWrite
 from api.models.agents.history import ChatHistoryThread
+from api.models.agents.latency import AgentTurnLatency, agent_turn_latency_table
+from api.models.agents.model_catalog import model_catalog_table
+from api.models.agents.rate_limits import provider_rate_limit_demand_table
+from api.models.agents.response_cache import llm_response_cache_table
 from api.models.agents.usage import AgentMessageUsage
+from api.models.agents.usage_rollups import (
+    agent_thread_usage_table,
+    agent_usage_daily_table,
+    agent_usage_hourly_table,
+)
 
 __all__ = [
     "AgentCheckpoint",
     "AgentCheckpointWrite",
     "AgentMessageUsage",
+    "AgentTurnLatency",
     "ChatHistoryThread",
+    "agent_thread_usage_table",
+    "agent_turn_latency_table",
+    "agent_usage_daily_table",
+    "agent_usage_hourly_table",
+    "llm_response_cache_table",
+    "model_catalog_table",
+    "provider_rate_limit_demand_table",
 ]
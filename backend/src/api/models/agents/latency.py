@@ -0,0 +1,83 @@
+import datetime as dt
+
+from pydantic import BaseModel
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    Table,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from api.models.metadata import metadata
+
+# One row per chat turn (one stream_agent run). (thread_id, message_id) matches the
+# agent_message_usage rows of the LLM calls made during the turn.
+agent_turn_latency_table = Table(
+    "agent_turn_latency",
+    metadata,
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    Column("thread_id", String(128), nullable=False),
+    Column("message_id", String(64), nullable=False),
+    Column("user_id", String(255), nullable=True),
+    Column("client_id", String(255), nullable=True),
+    Column("agent_id", String(255), nullable=False),
+    # Model of the last LLM call of the turn (NULL when no call finished).
+    Column("provider", String(64), nullable=True),
+    Column("model_id", String(255), nullable=True),
+    Column("status", String(16), nullable=False),
+    Column("queue_wait_ms", Float, nullable=False, server_default="0"),
+    Column("checkpoint_load_ms", Float, nullable=False, server_default="0"),
+    Column("ttft_ms", Float, nullable=True),
+    Column("model_ttft_ms", Float, nullable=True),
+    Column("generation_ms", Float, nullable=False, server_default="0"),
+    Column("llm_ms", Float, nullable=False, server_default="0"),
+    Column("llm_calls", Integer, nullable=False, server_default="0"),
+    Column("tool_ms", Float, nullable=False, server_default="0"),
+    Column("tools", JSONB, nullable=False, server_default=text("'[]'::jsonb")),
+    Column("persistence_ms", Float, nullable=False, server_default="0"),
+    Column("total_ms", Float, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index("ix_agent_turn_latency_thread_id_message_id", "thread_id", "message_id"),
+    # Percentiles by agent / model over a time range.
+    Index("ix_agent_turn_latency_agent_id_created_at", "agent_id", "created_at"),
+    Index("ix_agent_turn_latency_model_created_at", "provider", "model_id", "created_at"),
+    Index("ix_agent_turn_latency_created_at_brin", "created_at", postgresql_using="brin"),
+)
+
+
+class ToolTiming(BaseModel):
+    name: str
+    ms: float
+    error: bool = False
+
+
+class AgentTurnLatency(BaseModel):
+    thread_id: str
+    message_id: str
+    user_id: str | None = None
+    client_id: str | None = None
+    agent_id: str
+    provider: str | None = None
+    model_id: str | None = None
+    status: str = "ok"
+    queue_wait_ms: float = 0.0
+    checkpoint_load_ms: float = 0.0
+    ttft_ms: float | None = None
+    model_ttft_ms: float | None = None
+    generation_ms: float = 0.0
+    llm_ms: float = 0.0
+    llm_calls: int = 0
+    tool_ms: float = 0.0
+    tools: list[ToolTiming] = []
+    persistence_ms: float = 0.0
+    total_ms: float = 0.0
+    created_at: dt.datetime | None = None
+
+    model_config = {"from_attributes": True}
@@ -0,0 +1,23 @@
+from sqlalchemy import Boolean, Column, DateTime, String, Table, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from api.models.metadata import metadata
+
+# Runtime overrides of the Models registry (see api.services.agents.model_catalog).
+# `config` holds ModelConfig fields (prices, capabilities, limits); entries for models not
+# in the registry must carry everything needed to build one. enabled=false hides a model.
+model_catalog_table = Table(
+    "model_catalog",
+    metadata,
+    Column("provider", String(64), primary_key=True),
+    Column("model_id", String(255), primary_key=True),
+    Column("config", JSONB, nullable=False, server_default=text("'{}'::jsonb")),
+    Column("enabled", Boolean, nullable=False, server_default=text("true")),
+    Column(
+        "updated_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    ),
+)
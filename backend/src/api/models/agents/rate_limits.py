@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Float, Index, String, Table, func
+
+from api.models.metadata import metadata
+
+# Live demand of every worker per rate-limited model (see api.services.agents.rate_limits).
+# Rows are rewritten every few seconds and only recent ones count, so the table is
+# UNLOGGED: losing it in a crash only resets the shares for one sync interval.
+# provider = model_id = '*' is the worker's heartbeat row.
+provider_rate_limit_demand_table = Table(
+    "provider_rate_limit_demand",
+    metadata,
+    Column("worker_id", String(128), primary_key=True),
+    Column("provider", String(64), primary_key=True),
+    Column("model_id", String(255), primary_key=True),
+    Column("requests_per_min", Float, nullable=False, server_default="0"),
+    Column("tokens_per_min", Float, nullable=False, server_default="0"),
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index("ix_provider_rate_limit_demand_updated_at", "updated_at"),
+    prefixes=["UNLOGGED"],
+)
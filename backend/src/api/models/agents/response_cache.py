@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Index, LargeBinary, String, Table, func
+
+from api.models.metadata import metadata
+
+# Shared tier of the exact-match LLM response cache (see api.core.agents.response_cache).
+# key is the sha256 of the canonical call; response is the orjson payload of the answer
+# (its stream chunks when it was streamed). A cache, so UNLOGGED: a crash only costs misses.
+# Expired rows are ignored on read and deleted by the maintenance loop.
+llm_response_cache_table = Table(
+    "llm_response_cache",
+    metadata,
+    Column("key", String(64), primary_key=True),
+    Column("provider", String(64), nullable=False),
+    Column("model_id", String(255), nullable=False),
+    Column("response", LargeBinary, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column("expires_at", DateTime(timezone=True), nullable=False),
+    Index("ix_llm_response_cache_expires_at", "expires_at"),
+    prefixes=["UNLOGGED"],
+)
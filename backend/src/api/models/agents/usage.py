@@ -20,12 +20,12 @@ agent_message_usage_table = Table(
     metadata,
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("thread_id", String(128), nullable=False, index=True),
-    Column("message_id", String(64), nullable=False, index=True),
-    Column("user_id", String(255), nullable=True, index=True),
-    Column("client_id", String(255), nullable=True, index=True),
-    Column("agent_id", String(255), nullable=False, index=True),
+    Column("message_id", String(64), nullable=False),
+    Column("user_id", String(255), nullable=True),
+    Column("client_id", String(255), nullable=True),
+    Column("agent_id", String(255), nullable=False),
     Column("provider", String(64), nullable=False),
-    Column("model_id", String(255), nullable=False, index=True),
+    Column("model_id", String(255), nullable=False),
     Column("input_tokens", Integer, nullable=False, server_default="0"),
     Column("cached_input_tokens", Integer, nullable=False, server_default="0"),
     Column("output_tokens", Integer, nullable=False, server_default="0"),
@@ -33,8 +33,23 @@ agent_message_usage_table = Table(
     Column("total_tokens", Integer, nullable=False, server_default="0"),
     Column("cost_usd", Numeric(12, 6), nullable=False, server_default="0"),
     Column("error", Text, nullable=True),
-    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
-    Index("ix_agent_message_usage_created_at", "created_at"),
+    # Exact-match response cache of the model: "hit" (served from cache, no tokens billed),
+    # "miss" (cacheable call sent to the provider), NULL for models without the cache;
+    # "semantic" for a first-turn answer served by the semantic cache (no provider call).
+    Column("response_cache", String(8), nullable=True),
+    # Partition key — must be part of the primary key of a partitioned table.
+    Column(
+        "created_at",
+        DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+        server_default=func.now(),
+    ),
+    Index("ix_agent_message_usage_user_id_created_at", "user_id", "created_at"),
+    Index("ix_agent_message_usage_created_at_brin", "created_at", postgresql_using="brin"),
+    # Monthly partitions (agent_message_usage_yYYYYmMM) are managed by
+    # api.repositories.agents.usage_partitions, not by this metadata.
+    postgresql_partition_by="RANGE (created_at)",
 )
 
 
@@ -53,6 +68,7 @@ class AgentMessageUsage(BaseModel):
     total_tokens: int = 0
     cost_usd: float = 0.0
     error: str | None = None
+    response_cache: str | None = None
     created_at: dt.datetime | None = None
 
     model_config = {"from_attributes": True}
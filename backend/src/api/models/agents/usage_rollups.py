@@ -0,0 +1,65 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Date,
+    DateTime,
+    Index,
+    Numeric,
+    String,
+    Table,
+)
+
+from api.models.metadata import metadata
+
+
+def _rollup_measures() -> list[Column]:
+    return [
+        Column("calls", BigInteger, nullable=False, server_default="0"),
+        Column("error_calls", BigInteger, nullable=False, server_default="0"),
+        Column("input_tokens", BigInteger, nullable=False, server_default="0"),
+        Column("cached_input_tokens", BigInteger, nullable=False, server_default="0"),
+        Column("output_tokens", BigInteger, nullable=False, server_default="0"),
+        Column("reasoning_tokens", BigInteger, nullable=False, server_default="0"),
+        Column("total_tokens", BigInteger, nullable=False, server_default="0"),
+        Column("cost_usd", Numeric(18, 6), nullable=False, server_default="0"),
+    ]
+
+
+def _rollup_dimensions() -> list[Column]:
+    # user_id/client_id are '' (not NULL) when unknown so they can be part of the primary key.
+    return [
+        Column("user_id", String(255), primary_key=True, server_default=""),
+        Column("client_id", String(255), primary_key=True, server_default=""),
+        Column("agent_id", String(255), primary_key=True),
+        Column("provider", String(64), primary_key=True),
+        Column("model_id", String(255), primary_key=True),
+    ]
+
+
+# Pre-aggregated agent_message_usage, maintained by api.repositories.agents.usage_rollups in
+# the same transaction as the raw inserts. Buckets are UTC.
+agent_usage_hourly_table = Table(
+    "agent_usage_hourly",
+    metadata,
+    Column("bucket", DateTime(timezone=True), primary_key=True),
+    *_rollup_dimensions(),
+    *_rollup_measures(),
+    Index("ix_agent_usage_hourly_user_id_bucket", "user_id", "bucket"),
+)
+
+agent_usage_daily_table = Table(
+    "agent_usage_daily",
+    metadata,
+    Column("bucket", Date, primary_key=True),
+    *_rollup_dimensions(),
+    *_rollup_measures(),
+    Index("ix_agent_usage_daily_user_id_bucket", "user_id", "bucket"),
+)
+
+agent_thread_usage_table = Table(
+    "agent_thread_usage",
+    metadata,
+    Column("thread_id", String(128), primary_key=True),
+    *_rollup_measures(),
+    Column("last_used_at", DateTime(timezone=True), nullable=True),
+)
@@ -33,14 +33,51 @@ async def save_chat(conn: Connection, chat_history_thread: ChatHistoryThread) ->
     return dict(row)
 
 
+async def save_chat_metadata(
+    conn: Connection, chat_history_thread: ChatHistoryThread
+) -> dict[str, Any]:
+    """Save or update only the thread metadata; `messages` is left untouched.
+
+    Used by agents whose history is projected from the checkpoint (history_source="checkpoint").
+    """
+    row = await conn.fetchrow(
+        """
+        INSERT INTO chat_history (thread_id, user_id, client_id, agent_id, preview, updated_at)
+        VALUES ($1, $2, $3, $4, $5, CURRENT_TIMESTAMP)
+        ON CONFLICT(thread_id) DO UPDATE SET
+            preview = EXCLUDED.preview,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING thread_id, user_id, client_id, agent_id, preview, updated_at
+        """,
+        chat_history_thread.thread_id,
+        chat_history_thread.user_id,
+        chat_history_thread.client_id,
+        chat_history_thread.agent_id,
+        chat_history_thread.preview,
+    )
+    return dict(row)
+
+
+# Per-thread usage comes from the agent_thread_usage rollup (one row per thread), so
+# listing threads with their cost stays a single indexed join instead of N SUM()s.
+_THREAD_LIST_COLUMNS = """
+    h.thread_id, h.agent_id, h.preview, h.updated_at as created_at,
+    COALESCE(u.input_tokens, 0) AS input_tokens,
+    COALESCE(u.output_tokens, 0) AS output_tokens,
+    COALESCE(u.total_tokens, 0) AS total_tokens,
+    COALESCE(u.cost_usd, 0)::float AS cost_usd
+"""
+
+
 async def get_user_threads(conn: Connection, user_id: str) -> list[dict[str, Any]]:
-    """List all threads for a user."""
+    """List all threads for a user, with tokens and cost per thread."""
     rows = await conn.fetch(
-        """
-        SELECT thread_id, agent_id, preview, updated_at as created_at
-        FROM chat_history
-        WHERE user_id = $1
-        ORDER BY updated_at DESC
+        f"""
+        SELECT {_THREAD_LIST_COLUMNS}
+        FROM chat_history h
+        LEFT JOIN agent_thread_usage u ON u.thread_id = h.thread_id
+        WHERE h.user_id = $1
+        ORDER BY h.updated_at DESC
         """,
         user_id,
     )
@@ -58,13 +95,14 @@ async def delete_chat(conn: Connection, thread_id: str) -> bool:
 async def get_threads_by_client(
     conn: Connection, client_id: str, user_id: str
 ) -> list[dict[str, Any]]:
-    """List chat threads associated with a specific client for a user."""
+    """List chat threads associated with a specific client for a user, with usage per thread."""
     rows = await conn.fetch(
-        """
-        SELECT thread_id, agent_id, preview, updated_at as created_at
-        FROM chat_history
-        WHERE user_id = $1 AND client_id = $2
-        ORDER BY updated_at DESC
+        f"""
+        SELECT {_THREAD_LIST_COLUMNS}
+        FROM chat_history h
+        LEFT JOIN agent_thread_usage u ON u.thread_id = h.thread_id
+        WHERE h.user_id = $1 AND h.client_id = $2
+        ORDER BY h.updated_at DESC
         """,
         user_id,
         client_id,
@@ -0,0 +1,148 @@
+import datetime as dt
+from typing import Any, Literal
+
+import orjson
+from asyncpg.connection import Connection
+
+from api.models.agents.latency import AgentTurnLatency
+
+# column -> Postgres array type used by the unnest() insert
+LATENCY_COLUMNS: dict[str, str] = {
+    "thread_id": "text",
+    "message_id": "text",
+    "user_id": "text",
+    "client_id": "text",
+    "agent_id": "text",
+    "provider": "text",
+    "model_id": "text",
+    "status": "text",
+    "queue_wait_ms": "float8",
+    "checkpoint_load_ms": "float8",
+    "ttft_ms": "float8",
+    "model_ttft_ms": "float8",
+    "generation_ms": "float8",
+    "llm_ms": "float8",
+    "llm_calls": "int4",
+    "tool_ms": "float8",
+    "tools": "text",  # serialized JSON, cast to jsonb in the INSERT
+    "persistence_ms": "float8",
+    "total_ms": "float8",
+    "created_at": "timestamptz",
+}
+
+_INSERT_LATENCY = f"""
+INSERT INTO agent_turn_latency ({", ".join(LATENCY_COLUMNS)})
+SELECT {", ".join("tools::jsonb" if c == "tools" else c for c in LATENCY_COLUMNS)}
+FROM unnest({", ".join(f"${i}::{t}[]" for i, t in enumerate(LATENCY_COLUMNS.values(), 1))})
+    AS r({", ".join(LATENCY_COLUMNS)})
+"""
+
+LatencyMetric = Literal[
+    "queue_wait_ms",
+    "checkpoint_load_ms",
+    "ttft_ms",
+    "model_ttft_ms",
+    "generation_ms",
+    "llm_ms",
+    "tool_ms",
+    "persistence_ms",
+    "total_ms",
+]
+LATENCY_METRICS: tuple[str, ...] = LatencyMetric.__args__
+LatencyGroup = Literal["agent", "model"]
+_GROUP_COLUMNS: dict[str, tuple[str, ...]] = {
+    "agent": ("agent_id",),
+    "model": ("provider", "model_id"),
+}
+
+
+async def insert_agent_turn_latency_batch(conn: Connection, rows: list[AgentTurnLatency]) -> int:
+    """Persist many turn latency records in one round trip (INSERT ... SELECT FROM unnest).
+
+    Not COPY like agent_message_usage: asyncpg's binary COPY can't encode jsonb with the
+    text codec the pool installs. Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    now = dt.datetime.now(dt.UTC)
+    columns: dict[str, list[Any]] = {name: [] for name in LATENCY_COLUMNS}
+    for row in rows:
+        values = row.model_dump(include=set(LATENCY_COLUMNS))
+        values["tools"] = orjson.dumps(values["tools"]).decode("utf-8")
+        values["created_at"] = row.created_at or now
+        for name in LATENCY_COLUMNS:
+            columns[name].append(values[name])
+    await conn.execute(_INSERT_LATENCY, *columns.values())
+    return len(rows)
+
+
+async def get_turn_latency_percentiles(
+    conn: Connection,
+    *,
+    metric: LatencyMetric,
+    since: dt.datetime,
+    until: dt.datetime,
+    group_by: LatencyGroup = "agent",
+    agent_id: str | None = None,
+    percentiles: tuple[float, ...] = (0.5, 0.9, 0.99),
+) -> list[dict[str, Any]]:
+    """p50/p90/p99 (or `percentiles`) of one latency column per agent or per model.
+
+    `metric` is interpolated into the SQL, so it must be one of LATENCY_METRICS. Only
+    turns with status "ok" count; NULL values (e.g. no token streamed) are ignored.
+    """
+    if metric not in LATENCY_METRICS:
+        raise ValueError(f"Unknown latency metric '{metric}'")
+    group_columns = ", ".join(_GROUP_COLUMNS[group_by])
+    conditions = ["created_at >= $1", "created_at < $2", "status = 'ok'"]
+    args: list[Any] = [since, until, list(percentiles)]
+    if agent_id is not None:
+        args.append(agent_id)
+        conditions.append(f"agent_id = ${len(args)}")
+    rows = await conn.fetch(
+        f"""
+        SELECT {group_columns}, count({metric}) AS turns,
+               percentile_cont($3::float8[]) WITHIN GROUP (ORDER BY {metric}) AS values,
+               avg({metric}) AS mean
+        FROM agent_turn_latency
+        WHERE {" AND ".join(conditions)}
+        GROUP BY {group_columns}
+        ORDER BY {group_columns}
+        """,
+        *args,
+    )
+    return [
+        {
+            **{column: row[column] for column in _GROUP_COLUMNS[group_by]},
+            "turns": row["turns"],
+            "mean": row["mean"],
+            **{
+                f"p{round(p * 100, 1):g}": value
+                for p, value in zip(percentiles, row["values"] or [], strict=False)
+            },
+        }
+        for row in rows
+    ]
+
+
+async def delete_expired_turn_latency(
+    conn: Connection, retention_days: int, *, batch_size: int = 50_000
+) -> int:
+    """Delete latency records older than `retention_days`, in batches. Returns rows deleted."""
+    cutoff = dt.datetime.now(dt.UTC) - dt.timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        status = await conn.execute(
+            """
+            DELETE FROM agent_turn_latency
+            WHERE id IN (
+                SELECT id FROM agent_turn_latency WHERE created_at < $1 LIMIT $2
+            )
+            """,
+            cutoff,
+            batch_size,
+        )
+        count = int(status.split()[-1])
+        deleted += count
+        if count < batch_size:
+            return deleted
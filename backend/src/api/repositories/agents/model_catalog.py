@@ -0,0 +1,26 @@
+import datetime as dt
+from typing import Any
+
+from asyncpg.connection import Connection
+
+
+async def get_model_catalog_entries(conn: Connection) -> list[dict[str, Any]]:
+    """All rows of model_catalog as flat dicts: provider, model_id, enabled + config fields."""
+    rows = await conn.fetch("SELECT provider, model_id, config, enabled FROM model_catalog")
+    entries = []
+    for row in rows:
+        entries.append(
+            {
+                **(row["config"] or {}),
+                "provider": row["provider"],
+                "model_id": row["model_id"],
+                "enabled": row["enabled"],
+            }
+        )
+    return entries
+
+
+async def get_model_catalog_version(conn: Connection) -> tuple[int, dt.datetime | None]:
+    """(row count, latest updated_at) — changes whenever a row is added, edited or removed."""
+    row = await conn.fetchrow("SELECT count(*) AS n, max(updated_at) AS ts FROM model_catalog")
+    return int(row["n"]), row["ts"]
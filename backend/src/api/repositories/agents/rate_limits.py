@@ -0,0 +1,63 @@
+from typing import Any
+
+from asyncpg.connection import Connection
+
+HEARTBEAT_KEY: tuple[str, str] = ("*", "*")
+
+
+async def upsert_rate_limit_demand(
+    conn: Connection, worker_id: str, demand: dict[tuple[str, str], tuple[float, float]]
+) -> None:
+    """Write this worker's (requests/min, tokens/min) demand per (provider, model_id).
+
+    Always writes the worker's heartbeat row too, so idle workers still count.
+    """
+    rows = {HEARTBEAT_KEY: (0.0, 0.0), **demand}
+    await conn.execute(
+        """
+        INSERT INTO provider_rate_limit_demand
+            (worker_id, provider, model_id, requests_per_min, tokens_per_min, updated_at)
+        SELECT $1, provider, model_id, requests_per_min, tokens_per_min, now()
+        FROM unnest($2::text[], $3::text[], $4::float8[], $5::float8[])
+            AS r(provider, model_id, requests_per_min, tokens_per_min)
+        ON CONFLICT (worker_id, provider, model_id) DO UPDATE
+        SET requests_per_min = excluded.requests_per_min,
+            tokens_per_min = excluded.tokens_per_min,
+            updated_at = excluded.updated_at
+        """,
+        worker_id,
+        [key[0] for key in rows],
+        [key[1] for key in rows],
+        [value[0] for value in rows.values()],
+        [value[1] for value in rows.values()],
+    )
+
+
+async def get_rate_limit_demand(conn: Connection, max_age_s: float) -> list[dict[str, Any]]:
+    """Demand rows of every worker seen in the last `max_age_s` seconds."""
+    rows = await conn.fetch(
+        """
+        SELECT worker_id, provider, model_id, requests_per_min, tokens_per_min
+        FROM provider_rate_limit_demand
+        WHERE updated_at > now() - make_interval(secs => $1)
+        """,
+        max_age_s,
+    )
+    return [dict(row) for row in rows]
+
+
+async def delete_worker_rate_limit_demand(conn: Connection, worker_id: str) -> None:
+    """Drop a worker's rows (shutdown), so its share goes back to the others right away."""
+    await conn.execute("DELETE FROM provider_rate_limit_demand WHERE worker_id = $1", worker_id)
+
+
+async def delete_stale_rate_limit_demand(conn: Connection, max_age_s: float) -> int:
+    """Drop rows of workers gone for more than `max_age_s` seconds. Returns rows deleted."""
+    status = await conn.execute(
+        """
+        DELETE FROM provider_rate_limit_demand
+        WHERE updated_at < now() - make_interval(secs => $1)
+        """,
+        max_age_s,
+    )
+    return int(status.split()[-1])
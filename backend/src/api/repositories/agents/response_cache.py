@@ -0,0 +1,43 @@
+from typing import Any
+
+from asyncpg.connection import Connection
+
+
+async def get_cached_response(conn: Connection, key: str) -> dict[str, Any] | None:
+    """{"response": payload, "ttl_s": seconds left} of `key`, None if missing or expired."""
+    row = await conn.fetchrow(
+        """
+        SELECT response, extract(epoch FROM expires_at - now())::float8 AS ttl_s
+        FROM llm_response_cache
+        WHERE key = $1 AND expires_at > now()
+        """,
+        key,
+    )
+    return dict(row) if row is not None else None
+
+
+async def upsert_cached_response(
+    conn: Connection, key: str, provider: str, model_id: str, response: bytes, ttl_s: float
+) -> None:
+    """Store (or refresh) the payload of `key` for `ttl_s` seconds."""
+    await conn.execute(
+        """
+        INSERT INTO llm_response_cache (key, provider, model_id, response, created_at, expires_at)
+        VALUES ($1, $2, $3, $4, now(), now() + make_interval(secs => $5))
+        ON CONFLICT (key) DO UPDATE
+        SET response = excluded.response,
+            created_at = excluded.created_at,
+            expires_at = excluded.expires_at
+        """,
+        key,
+        provider,
+        model_id,
+        response,
+        ttl_s,
+    )
+
+
+async def delete_expired_responses(conn: Connection) -> int:
+    """Drop expired entries. Returns rows deleted."""
+    status = await conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= now()")
+    return int(status.split()[-1])
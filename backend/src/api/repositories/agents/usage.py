@@ -1,3 +1,5 @@
+import datetime as dt
+from decimal import Decimal
 from typing import Any
 
 from asyncpg.connection import Connection
@@ -5,6 +7,7 @@ from langchain_core.messages import AIMessage
 
 from api.core.agents.models import canonical_provider, compute_cost_usd, find_model_config
 from api.models.agents.usage import AgentMessageUsage
+from api.repositories.agents.usage_rollups import apply_usage_rollups
 
 
 def build_usage_from_ai_message(
@@ -15,9 +18,15 @@ def build_usage_from_ai_message(
     agent_id: str,
     user_id: str | None = None,
     client_id: str | None = None,
+    served_by: tuple[str, str] | None = None,
 ) -> AgentMessageUsage | None:
     """Build an AgentMessageUsage row from a finished AIMessage (response_metadata + usage_metadata).
 
+    `served_by` is the (provider, model_id) of the ModelConfig that made the call, when
+    known (init_model tags its models): it wins over response_metadata, whose provider is
+    LangChain's name (Chutes reports "openai") and whose model name may be a dated
+    snapshot missing from the catalog.
+
     Returns None if the message has no usage_metadata or no provider/model info — the registry
     needs both to compute cost via compute_cost_usd.
     """
@@ -27,8 +36,10 @@ def build_usage_from_ai_message(
     if not usage:
         return None
     rm = getattr(ai, "response_metadata", None) or {}
-    provider = rm.get("model_provider")
-    model_id = rm.get("model_name") or rm.get("model")
+    provider, model_id = served_by or (
+        rm.get("model_provider"),
+        rm.get("model_name") or rm.get("model"),
+    )
     if not provider or not model_id:
         return None
 
@@ -50,54 +61,148 @@ def build_usage_from_ai_message(
         reasoning_tokens=int(out_det.get("reasoning") or 0),
         total_tokens=int(usage.get("total_tokens") or 0),
         cost_usd=cost_usd,
+        # Set by the exact-match response cache of init_model (api.core.agents.response_cache).
+        response_cache=rm.get("response_cache"),
     )
 
 
 async def insert_agent_message_usage(conn: Connection, usage: AgentMessageUsage) -> dict[str, Any]:
-    """Persist one row per LLM invocation. Receives Pydantic, returns raw dict to confirm execution."""
-    row = await conn.fetchrow(
-        """
-        INSERT INTO agent_message_usage (
-            thread_id, message_id, user_id, client_id, agent_id, provider, model_id,
-            input_tokens, cached_input_tokens, output_tokens, reasoning_tokens, total_tokens,
-            cost_usd, error
+    """Persist one row per LLM invocation (and its rollups). Receives Pydantic, returns raw dict to confirm execution."""
+    async with conn.transaction():
+        row = await conn.fetchrow(
+            """
+            INSERT INTO agent_message_usage (
+                thread_id, message_id, user_id, client_id, agent_id, provider, model_id,
+                input_tokens, cached_input_tokens, output_tokens, reasoning_tokens, total_tokens,
+                cost_usd, error, response_cache
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15)
+            RETURNING id, thread_id, message_id, agent_id, provider, model_id,
+                      input_tokens, cached_input_tokens, output_tokens, reasoning_tokens,
+                      total_tokens, cost_usd, error, response_cache, created_at
+            """,
+            usage.thread_id,
+            usage.message_id,
+            usage.user_id,
+            usage.client_id,
+            usage.agent_id,
+            usage.provider,
+            usage.model_id,
+            usage.input_tokens,
+            usage.cached_input_tokens,
+            usage.output_tokens,
+            usage.reasoning_tokens,
+            usage.total_tokens,
+            usage.cost_usd,
+            usage.error,
+            usage.response_cache,
+        )
+        await apply_usage_rollups(
+            conn, [usage.model_copy(update={"created_at": row["created_at"]})]
         )
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
-        RETURNING id, thread_id, message_id, agent_id, provider, model_id,
-                  input_tokens, cached_input_tokens, output_tokens, reasoning_tokens,
-                  total_tokens, cost_usd, error, created_at
-        """,
-        usage.thread_id,
-        usage.message_id,
-        usage.user_id,
-        usage.client_id,
-        usage.agent_id,
-        usage.provider,
-        usage.model_id,
-        usage.input_tokens,
-        usage.cached_input_tokens,
-        usage.output_tokens,
-        usage.reasoning_tokens,
-        usage.total_tokens,
-        usage.cost_usd,
-        usage.error,
-    )
     return dict(row)
 
 
+USAGE_COPY_COLUMNS = (
+    "thread_id",
+    "message_id",
+    "user_id",
+    "client_id",
+    "agent_id",
+    "provider",
+    "model_id",
+    "input_tokens",
+    "cached_input_tokens",
+    "output_tokens",
+    "reasoning_tokens",
+    "total_tokens",
+    "cost_usd",
+    "error",
+    "response_cache",
+    "created_at",
+)
+
+
+async def insert_agent_message_usage_batch(
+    conn: Connection, usages: list[AgentMessageUsage]
+) -> int:
+    """Persist many rows in one COPY round trip and add them to the rollups, atomically.
+    Returns the number of rows written.
+
+    Rows should carry `created_at` (the time the LLM call ended, not the flush time) — the
+    batch may be flushed seconds later and the value decides partition and rollup bucket.
+    """
+    if not usages:
+        return 0
+    now = dt.datetime.now(dt.UTC)
+    usages = [u if u.created_at else u.model_copy(update={"created_at": now}) for u in usages]
+    records = [
+        (
+            usage.thread_id,
+            usage.message_id,
+            usage.user_id,
+            usage.client_id,
+            usage.agent_id,
+            usage.provider,
+            usage.model_id,
+            usage.input_tokens,
+            usage.cached_input_tokens,
+            usage.output_tokens,
+            usage.reasoning_tokens,
+            usage.total_tokens,
+            Decimal(str(usage.cost_usd)),
+            usage.error,
+            usage.response_cache,
+            usage.created_at,
+        )
+        for usage in usages
+    ]
+    async with conn.transaction():
+        await conn.copy_records_to_table(
+            "agent_message_usage", records=records, columns=USAGE_COPY_COLUMNS
+        )
+        await apply_usage_rollups(conn, usages)
+    return len(records)
+
+
 async def get_thread_total_cost_usd(conn: Connection, thread_id: str) -> float:
-    """Sum cost across all messages in a thread."""
+    """Sum cost across all messages in a thread (from the per-thread rollup)."""
     val = await conn.fetchval(
-        "SELECT COALESCE(SUM(cost_usd), 0)::float FROM agent_message_usage WHERE thread_id = $1",
-        thread_id,
+        "SELECT cost_usd::float FROM agent_thread_usage WHERE thread_id = $1", thread_id
     )
     return float(val or 0.0)
 
 
-async def get_user_total_cost_usd(conn: Connection, user_id: str) -> float:
-    """Sum cost across all threads of a user."""
+async def get_user_total_cost_usd(
+    conn: Connection,
+    user_id: str,
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+) -> float:
+    """Sum cost across all threads of a user, optionally within [since, until).
+
+    Served from the rollups: the daily table for all-time totals, the hourly one when a
+    range is given. Bounds are applied at hour granularity — every hour bucket overlapping
+    [since, until) counts in full, so pass hour-aligned bounds for exact figures.
+    """
+    if since is None and until is None:
+        val = await conn.fetchval(
+            "SELECT COALESCE(SUM(cost_usd), 0)::float FROM agent_usage_daily WHERE user_id = $1",
+            user_id,
+        )
+        return float(val or 0.0)
+
+    conditions = ["user_id = $1"]
+    args: list[Any] = [user_id]
+    if since is not None:
+        args.append(since)
+        conditions.append(f"bucket >= date_trunc('hour', ${len(args)}::timestamptz, 'UTC')")
+    if until is not None:
+        args.append(until)
+        conditions.append(f"bucket < ${len(args)}")
     val = await conn.fetchval(
-        "SELECT COALESCE(SUM(cost_usd), 0)::float FROM agent_message_usage WHERE user_id = $1",
-        user_id,
+        "SELECT COALESCE(SUM(cost_usd), 0)::float FROM agent_usage_hourly "
+        f"WHERE {' AND '.join(conditions)}",
+        *args,
     )
     return float(val or 0.0)
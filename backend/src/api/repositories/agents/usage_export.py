@@ -0,0 +1,60 @@
+import datetime as dt
+from collections.abc import AsyncIterator
+
+from asyncpg import Record
+from asyncpg.connection import Connection
+
+USAGE_EXPORT_COLUMNS = (
+    "id",
+    "created_at",
+    "thread_id",
+    "message_id",
+    "user_id",
+    "client_id",
+    "agent_id",
+    "provider",
+    "model_id",
+    "input_tokens",
+    "cached_input_tokens",
+    "output_tokens",
+    "reasoning_tokens",
+    "total_tokens",
+    "cost_usd",
+    "error",
+    "response_cache",
+)
+
+
+async def iter_usage_chunks(
+    conn: Connection,
+    *,
+    after_id: int,
+    chunk_size: int,
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+) -> AsyncIterator[list[Record]]:
+    """Yield agent_message_usage rows with id > after_id, in id order, `chunk_size` at a time.
+
+    Reads through a server-side cursor inside one REPEATABLE READ, read-only transaction, so
+    memory stays at one chunk and the whole export sees a single snapshot. `since`/`until`
+    bound created_at (plain predicates, so partitions outside the range are pruned).
+    """
+    conditions = ["id > $1"]
+    args: list = [after_id]
+    if since is not None:
+        args.append(since)
+        conditions.append(f"created_at >= ${len(args)}")
+    if until is not None:
+        args.append(until)
+        conditions.append(f"created_at < ${len(args)}")
+    query = (
+        f"SELECT {', '.join(USAGE_EXPORT_COLUMNS)} FROM agent_message_usage "
+        f"WHERE {' AND '.join(conditions)} ORDER BY id"
+    )
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        cursor = await conn.cursor(query, *args)
+        while True:
+            rows = await cursor.fetch(chunk_size)
+            if not rows:
+                return
+            yield rows
@@ -0,0 +1,134 @@
+"""Monthly RANGE partitions of agent_message_usage (one per UTC month).
+
+Partition names are `agent_message_usage_yYYYYmMM`. DDL can't take bind parameters, so
+every identifier/bound below is generated here from dates — never from user input.
+
+`agent_message_usage_default` (DEFAULT partition) catches rows outside every monthly
+partition (a month not created yet because maintenance didn't run, or one already
+detached), so a usage write never fails for lack of a partition. Creating the month's
+partition later moves its rows out of the default one first.
+"""
+
+import datetime as dt
+import re
+
+from asyncpg.connection import Connection
+
+USAGE_TABLE = "agent_message_usage"
+USAGE_DEFAULT_PARTITION = f"{USAGE_TABLE}_default"
+DETACH_LOCK_TIMEOUT = "5s"
+_PARTITION_NAME_RE = re.compile(rf"^{USAGE_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def add_months(month: dt.date, months: int) -> dt.date:
+    """First day of the month `months` away from `month` (negative goes back)."""
+    index = month.year * 12 + month.month - 1 + months
+    return dt.date(index // 12, index % 12 + 1, 1)
+
+
+def usage_partition_name(month: dt.date) -> str:
+    return f"{USAGE_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def _partition_month(name: str) -> dt.date | None:
+    match = _PARTITION_NAME_RE.match(name)
+    return dt.date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def _current_month(today: dt.date | None) -> dt.date:
+    return (today or dt.datetime.now(dt.UTC).date()).replace(day=1)
+
+
+async def list_usage_partitions(conn: Connection) -> list[str]:
+    """Names of the partitions currently attached to agent_message_usage."""
+    rows = await conn.fetch(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = $1
+        ORDER BY child.relname
+        """,
+        USAGE_TABLE,
+    )
+    return [row["relname"] for row in rows]
+
+
+async def create_usage_default_partition(conn: Connection) -> None:
+    """Create (if missing) the DEFAULT partition."""
+    await conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {USAGE_DEFAULT_PARTITION} PARTITION OF {USAGE_TABLE} DEFAULT"
+    )
+
+
+async def create_usage_partition(conn: Connection, month: dt.date) -> str:
+    """Create (if missing) the partition holding `month`. Returns its name.
+
+    Rows of that month already in the DEFAULT partition are moved into it (Postgres
+    refuses the new partition while the default one holds rows of its range).
+    """
+    name = usage_partition_name(month)
+    start = dt.datetime(month.year, month.month, 1, tzinfo=dt.UTC)
+    end = dt.datetime.combine(add_months(month, 1), dt.time(), tzinfo=dt.UTC)
+    bounds = f"created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}'"
+    async with conn.transaction():
+        await conn.execute(
+            f"CREATE TEMP TABLE usage_partition_moved ON COMMIT DROP AS "
+            f"WITH moved AS (DELETE FROM {USAGE_DEFAULT_PARTITION} WHERE {bounds} RETURNING *) "
+            f"SELECT * FROM moved"
+        )
+        await conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {USAGE_TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        await conn.execute(f"INSERT INTO {USAGE_TABLE} SELECT * FROM usage_partition_moved")
+    return name
+
+
+async def ensure_usage_partitions(
+    conn: Connection, months_ahead: int, today: dt.date | None = None
+) -> list[str]:
+    """Pre-create partitions from the current month up to `months_ahead` (and the DEFAULT
+    one). Returns new names."""
+    existing = set(await list_usage_partitions(conn))
+    created: list[str] = []
+    if USAGE_DEFAULT_PARTITION not in existing:
+        await create_usage_default_partition(conn)
+        created.append(USAGE_DEFAULT_PARTITION)
+    current = _current_month(today)
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if usage_partition_name(month) not in existing:
+            created.append(await create_usage_partition(conn, month))
+    return created
+
+
+async def detach_expired_usage_partitions(
+    conn: Connection,
+    retention_months: int,
+    *,
+    drop: bool = False,
+    today: dt.date | None = None,
+) -> list[str]:
+    """Detach (and optionally drop) partitions older than `retention_months` full months.
+
+    DETACH ... CONCURRENTLY is not allowed next to a DEFAULT partition, so each detach
+    takes a brief exclusive lock on agent_message_usage, waiting at most
+    DETACH_LOCK_TIMEOUT (a busy table fails this round; the next one retries). Rows
+    written later for a detached month land in the DEFAULT partition. Detached tables
+    stay around for archiving unless `drop`.
+    """
+    cutoff = add_months(_current_month(today), -retention_months)
+    expired: list[str] = []
+    for name in await list_usage_partitions(conn):
+        month = _partition_month(name)
+        if month is None or month >= cutoff:
+            continue
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'")
+            await conn.execute(f"ALTER TABLE {USAGE_TABLE} DETACH PARTITION {name}")
+        if drop:
+            await conn.execute(f"DROP TABLE {name}")
+        expired.append(name)
+    return expired
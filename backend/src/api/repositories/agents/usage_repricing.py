@@ -0,0 +1,122 @@
+"""Set-based recomputation of agent_message_usage.cost_usd from the token columns.
+
+One statement per [since, until) window: rows whose stored cost differs from the cost
+under the given prices are updated, and the per-bucket / per-thread difference is applied
+to agent_usage_hourly, agent_usage_daily and agent_thread_usage in the same statement —
+so rollups stay exact even for rows whose raw partition was later detached.
+
+The cost expression mirrors compute_cost_usd step by step in float8 (same IEEE operations
+in the same order, then ceil to 6 decimals), so SQL and Python agree to the micro-dollar.
+"""
+
+import datetime as dt
+from typing import Any
+
+from asyncpg.connection import Connection
+
+from api.core.agents.models import ModelConfig
+
+_REPRICED_CTE = """
+WITH prices AS (
+    SELECT *
+    FROM unnest($3::text[], $4::text[], $5::float8[], $6::float8[], $7::float8[])
+        AS p(provider, model_id, input_price, cached_price, output_price)
+),
+repriced AS (
+    SELECT
+        u.id, u.created_at, u.thread_id, u.user_id, u.client_id, u.agent_id,
+        u.provider, u.model_id,
+        u.cost_usd AS old_cost,
+        (
+            ceil(
+                (
+                    greatest(u.input_tokens - u.cached_input_tokens, 0)::float8 * p.input_price
+                    + u.cached_input_tokens::float8 * p.cached_price
+                    + u.output_tokens::float8 * p.output_price
+                ) / 1000000 * 1000000
+            ) / 1000000
+        )::numeric(12, 6) AS new_cost
+    FROM agent_message_usage u
+    JOIN prices p ON p.provider = u.provider AND p.model_id = u.model_id
+    WHERE u.created_at >= $1 AND u.created_at < $2
+),
+changed AS (
+    SELECT * FROM repriced WHERE new_cost <> old_cost
+)
+"""
+
+_SUMMARY = """
+SELECT provider, model_id, count(*) AS rows,
+       sum(old_cost)::float AS old_cost_usd, sum(new_cost)::float AS new_cost_usd
+FROM {source}
+GROUP BY provider, model_id
+ORDER BY provider, model_id
+"""
+
+
+def _rollup_delta_update(table: str, bucket_expr: str) -> str:
+    return f"""
+{table}_delta AS (
+    UPDATE {table} r SET cost_usd = r.cost_usd + d.delta
+    FROM (
+        SELECT {bucket_expr} AS bucket, COALESCE(user_id, '') AS user_id,
+               COALESCE(client_id, '') AS client_id, agent_id, provider, model_id,
+               sum(new_cost - old_cost) AS delta
+        FROM updated
+        GROUP BY 1, 2, 3, 4, 5, 6
+    ) d
+    WHERE r.bucket = d.bucket AND r.user_id = d.user_id AND r.client_id = d.client_id
+      AND r.agent_id = d.agent_id AND r.provider = d.provider AND r.model_id = d.model_id
+)"""
+
+
+_APPLY = f"""
+{_REPRICED_CTE},
+updated AS (
+    UPDATE agent_message_usage u SET cost_usd = c.new_cost
+    FROM changed c
+    WHERE u.id = c.id AND u.created_at = c.created_at
+    RETURNING c.*
+),
+{_rollup_delta_update("agent_usage_hourly", "date_trunc('hour', created_at, 'UTC')")},
+{_rollup_delta_update("agent_usage_daily", "(created_at AT TIME ZONE 'UTC')::date")},
+agent_thread_usage_delta AS (
+    UPDATE agent_thread_usage t SET cost_usd = t.cost_usd + d.delta
+    FROM (
+        SELECT thread_id, sum(new_cost - old_cost) AS delta FROM updated GROUP BY thread_id
+    ) d
+    WHERE t.thread_id = d.thread_id
+)
+{_SUMMARY.format(source="updated")}
+"""
+
+_DRY_RUN = f"{_REPRICED_CTE}{_SUMMARY.format(source='changed')}"
+
+
+def _price_arrays(prices: list[ModelConfig]) -> list[list[Any]]:
+    return [
+        [cfg.provider for cfg in prices],
+        [cfg.model_id for cfg in prices],
+        [cfg.input_price_per_1m for cfg in prices],
+        [cfg.cached_input_price_per_1m for cfg in prices],
+        [cfg.output_price_per_1m for cfg in prices],
+    ]
+
+
+async def reprice_usage_window(
+    conn: Connection,
+    prices: list[ModelConfig],
+    since: dt.datetime,
+    until: dt.datetime,
+    *,
+    dry_run: bool = False,
+) -> list[dict[str, Any]]:
+    """Reprice rows created in [since, until) whose model is in `prices`.
+
+    Returns one summary row per (provider, model_id) that changed: rows, old and new cost.
+    With `dry_run` nothing is written. Keep windows small (the caller batches by day):
+    every changed row stays locked until the statement's transaction ends.
+    """
+    query = _DRY_RUN if dry_run else _APPLY
+    rows = await conn.fetch(query, since, until, *_price_arrays(prices))
+    return [dict(row) for row in rows]
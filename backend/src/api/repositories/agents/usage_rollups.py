@@ -0,0 +1,213 @@
+"""Incremental rollups of agent_message_usage.
+
+Three tables are kept in step with the raw rows (see api.models.agents.usage_rollups):
+
+    agent_usage_hourly   (hour, user, client, agent, provider, model) -> calls, tokens, cost
+    agent_usage_daily    (day,  user, client, agent, provider, model) -> same measures
+    agent_thread_usage   (thread_id)                                  -> same measures
+
+`apply_usage_rollups` is called in the same transaction as the raw insert, so a rollup never
+counts a row that was not written (and vice versa). The batch is first reduced in Python —
+a COPY of 200 rows usually touches a handful of buckets — and each table gets one upsert
+from unnest() arrays. Keys are sorted so concurrent workers lock rows in the same order
+and can't deadlock each other.
+"""
+
+import datetime as dt
+from decimal import Decimal
+from typing import Any, Literal
+
+from asyncpg.connection import Connection
+
+from api.models.agents.usage import AgentMessageUsage
+
+MEASURES = (
+    "calls",
+    "error_calls",
+    "input_tokens",
+    "cached_input_tokens",
+    "output_tokens",
+    "reasoning_tokens",
+    "total_tokens",
+    "cost_usd",
+)
+DIMENSIONS = ("user_id", "client_id", "agent_id", "provider", "model_id")
+_MEASURE_TYPES = ("bigint",) * 7 + ("numeric",)
+
+
+def hour_bucket(ts: dt.datetime) -> dt.datetime:
+    return ts.astimezone(dt.UTC).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(ts: dt.datetime) -> dt.date:
+    return ts.astimezone(dt.UTC).date()
+
+
+def _measures(usage: AgentMessageUsage) -> list[Any]:
+    return [
+        1,
+        1 if usage.error else 0,
+        usage.input_tokens,
+        usage.cached_input_tokens,
+        usage.output_tokens,
+        usage.reasoning_tokens,
+        usage.total_tokens,
+        Decimal(str(usage.cost_usd)),
+    ]
+
+
+def _add(into: list[Any], measures: list[Any]) -> None:
+    for idx, value in enumerate(measures):
+        into[idx] += value
+
+
+def _dimensions(usage: AgentMessageUsage) -> tuple[str, ...]:
+    return (
+        usage.user_id or "",
+        usage.client_id or "",
+        usage.agent_id,
+        usage.provider,
+        usage.model_id,
+    )
+
+
+async def _upsert(
+    conn: Connection,
+    table: str,
+    key_columns: tuple[str, ...],
+    key_types: tuple[str, ...],
+    groups: dict[tuple, list[Any]],
+) -> None:
+    if not groups:
+        return
+    keys = sorted(groups)
+    columns = (*key_columns, *MEASURES)
+    types = (*key_types, *_MEASURE_TYPES)
+    arrays = [[key[idx] for key in keys] for idx in range(len(key_columns))]
+    arrays += [[groups[key][idx] for key in keys] for idx in range(len(MEASURES))]
+    unnest = ", ".join(f"${idx + 1}::{type_}[]" for idx, type_ in enumerate(types))
+    updates = ", ".join(f"{m} = {table}.{m} + EXCLUDED.{m}" for m in MEASURES)
+    await conn.execute(
+        f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        SELECT * FROM unnest({unnest})
+        ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {updates}
+        """,
+        *arrays,
+    )
+
+
+async def apply_usage_rollups(conn: Connection, usages: list[AgentMessageUsage]) -> None:
+    """Add a batch of freshly inserted usage rows to the rollup tables.
+
+    Call inside the transaction that inserted `usages`; rows must have `created_at` set.
+    """
+    if not usages:
+        return
+    hourly: dict[tuple, list[Any]] = {}
+    daily: dict[tuple, list[Any]] = {}
+    threads: dict[tuple, list[Any]] = {}
+    last_used: dict[str, dt.datetime] = {}
+    for usage in usages:
+        created_at = usage.created_at or dt.datetime.now(dt.UTC)
+        measures = _measures(usage)
+        dims = _dimensions(usage)
+        for groups, key in (
+            (hourly, (hour_bucket(created_at), *dims)),
+            (daily, (day_bucket(created_at), *dims)),
+            (threads, (usage.thread_id,)),
+        ):
+            _add(groups.setdefault(key, [0] * 7 + [Decimal(0)]), measures)
+        last_used[usage.thread_id] = max(last_used.get(usage.thread_id, created_at), created_at)
+
+    text_types = ("text",) * len(DIMENSIONS)
+    await _upsert(
+        conn, "agent_usage_hourly", ("bucket", *DIMENSIONS), ("timestamptz", *text_types), hourly
+    )
+    await _upsert(conn, "agent_usage_daily", ("bucket", *DIMENSIONS), ("date", *text_types), daily)
+
+    # Thread totals also track the last call; stored as an extra key-aligned array.
+    keys = sorted(threads)
+    await conn.execute(
+        f"""
+        INSERT INTO agent_thread_usage (thread_id, {", ".join(MEASURES)}, last_used_at)
+        SELECT * FROM unnest(
+            $1::text[], {", ".join(f"${i + 2}::{t}[]" for i, t in enumerate(_MEASURE_TYPES))},
+            ${len(MEASURES) + 2}::timestamptz[]
+        )
+        ON CONFLICT (thread_id) DO UPDATE SET
+            {", ".join(f"{m} = agent_thread_usage.{m} + EXCLUDED.{m}" for m in MEASURES)},
+            last_used_at = GREATEST(agent_thread_usage.last_used_at, EXCLUDED.last_used_at)
+        """,
+        [key[0] for key in keys],
+        *[[threads[key][idx] for key in keys] for idx in range(len(MEASURES))],
+        [last_used[key[0]] for key in keys],
+    )
+
+
+UsageGranularity = Literal["hour", "day", "week", "month"]
+UsageDimension = Literal["agent", "model", "provider", "user", "client"]
+
+USAGE_DIMENSION_COLUMNS: dict[str, str] = {
+    "agent": "agent_id",
+    "model": "model_id",
+    "provider": "provider",
+    "user": "user_id",
+    "client": "client_id",
+}
+
+
+async def get_usage_series(
+    conn: Connection,
+    *,
+    granularity: UsageGranularity,
+    since: dt.datetime,
+    until: dt.datetime,
+    group_by: list[UsageDimension] | None = None,
+    filters: dict[UsageDimension, str] | None = None,
+) -> list[dict[str, Any]]:
+    """Time-bucketed usage in [since, until), grouped by the given dimensions.
+
+    "hour" reads agent_usage_hourly; day/week/month read agent_usage_daily (weeks and months
+    are re-bucketed with date_trunc). `since`/`until` are applied at the granularity of the
+    table read, so a partial first/last bucket counts whole.
+    """
+    if granularity == "hour":
+        table = "agent_usage_hourly"
+        bucket_expr = "bucket"
+        args: list[Any] = [hour_bucket(since), until]
+    else:
+        table = "agent_usage_daily"
+        bucket_expr = (
+            "bucket" if granularity == "day" else f"date_trunc('{granularity}', bucket)::date"
+        )
+        args = [day_bucket(since), day_bucket(until - dt.timedelta(microseconds=1))]
+    conditions = [
+        "bucket >= $1",
+        "bucket < $2" if granularity == "hour" else "bucket <= $2",
+    ]
+    for dimension, value in (filters or {}).items():
+        args.append(value)
+        conditions.append(f"{USAGE_DIMENSION_COLUMNS[dimension]} = ${len(args)}")
+
+    group_columns = [USAGE_DIMENSION_COLUMNS[d] for d in dict.fromkeys(group_by or [])]
+    select_dims = "".join(f", {column}" for column in group_columns)
+    rows = await conn.fetch(
+        f"""
+        SELECT {bucket_expr} AS bucket{select_dims},
+               sum(calls)::bigint AS calls,
+               sum(error_calls)::bigint AS error_calls,
+               sum(input_tokens)::bigint AS input_tokens,
+               sum(cached_input_tokens)::bigint AS cached_input_tokens,
+               sum(output_tokens)::bigint AS output_tokens,
+               sum(reasoning_tokens)::bigint AS reasoning_tokens,
+               sum(total_tokens)::bigint AS total_tokens,
+               sum(cost_usd)::float AS cost_usd
+        FROM {table}
+        WHERE {" AND ".join(conditions)}
+        GROUP BY 1{select_dims}
+        ORDER BY 1{select_dims}
+        """,
+        *args,
+    )
+    return [dict(row) for row in rows]
@@ -1,11 +1,15 @@
 from fastapi import APIRouter
 
 from api.routes.agents.chat import router as chat_router
+from api.routes.agents.metrics import router as metrics_router
 from api.routes.agents.models import router as models_router
 from api.routes.agents.threads import router as threads_router
+from api.routes.agents.usage import router as usage_router
 
 router = APIRouter()
 
 router.include_router(chat_router, prefix="/agents")
+router.include_router(metrics_router, prefix="/agents")
 router.include_router(models_router, prefix="/agents")
 router.include_router(threads_router, prefix="/agents")
+router.include_router(usage_router, prefix="/agents")
@@ -10,8 +10,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from api.core.agents.schemas import LatencyProfile
+from api.services.agents.budgets import BudgetExceededError, budget_ledger
 from api.services.agents.executors import call_agent_async
 from api.services.agents.registry import get_agents_registry
+from api.services.agents.run_coordinator import ThreadBusyError, run_coordinator
 from api.services.agents.streaming import sse_error_chunk, stream_agent
 from api.services.agents.utils import convert_file_to_text
 from config.database import get_conn
@@ -28,6 +31,9 @@ class ChatRequest(BaseModel):
     files: list[str] | None = None  # Optional list of file paths to process
     realtor_id: int | None = None
     active_client_id: str | None = None
+    # fast / balanced / deep: the agent's models rebuilt with the init_model overrides it
+    # maps to the profile (as built if it maps none); see api.services.agents.latency_profiles.
+    latency_profile: LatencyProfile | None = None
 
 
 async def _process_files(
@@ -148,6 +154,7 @@ async def chat_completions(
     - Non-streaming (stream=False).
     - File processing (via 'files' field).
     """
+    received_at = time.perf_counter()
     try:
         # 1. Validation
         if not request.messages:
@@ -173,24 +180,59 @@ async def chat_completions(
         print(
             f"[chat_completions] model={request.model!r} session_id={session_id!r} agent_name={agent_info.get('name')!r}"
         )
+
+        # Quotas (in-memory, see budgets). "downgrade" is applied per LLM call by the
+        # agent's budget middleware, so only a rejection matters here.
+        budget = budget_ledger.check(request.model, user_id, request.active_client_id)
+        if budget.action == "reject":
+            raise HTTPException(status_code=429, detail=budget.reason)
+        if budget.action == "downgrade":
+            print(f"[chat_completions] {budget.reason}; serving with fallback model")
+
+        # One run per thread at a time (see run_coordinator for the policies).
+        policy = agent_info.get("concurrency_policy", "queue")
+        follow_stream = (
+            run_coordinator.follow(session_id) if policy == "join" and request.stream else None
+        )
+        if (
+            follow_stream is None
+            and policy in ("reject", "join")
+            and await run_coordinator.is_busy(session_id, conn=conn)
+        ):
+            raise HTTPException(
+                status_code=409, detail=f"Thread '{session_id}' already has a run in progress"
+            )
+
         # 4. Streaming Response
         if request.stream:
 
             async def generate_stream():
                 try:
-                    async for chunk in stream_agent(
-                        agent_info,
-                        user_query,
-                        user_id,
-                        session_id,
-                        completion_id,
-                        current_timestamp,
-                        request.model,
-                        conn=conn,
-                        realtor_id=request.realtor_id,
-                        active_client_id=request.active_client_id,
-                    ):
-                        yield chunk
+                    if follow_stream is not None:
+                        async for chunk in follow_stream:
+                            yield chunk
+                    else:
+                        async with await run_coordinator.acquire(
+                            session_id, wait=policy == "queue", conn=conn
+                        ) as lease:
+                            async for chunk in stream_agent(
+                                agent_info,
+                                user_query,
+                                user_id,
+                                session_id,
+                                completion_id,
+                                current_timestamp,
+                                request.model,
+                                conn=conn,
+                                realtor_id=request.realtor_id,
+                                active_client_id=request.active_client_id,
+                                received_at=received_at,
+                                latency_profile=request.latency_profile,
+                            ):
+                                lease.publish(chunk)
+                                yield chunk
+                except ThreadBusyError as e:
+                    yield sse_error_chunk(str(e))
                 except Exception as e:
                     print(
                         f"[chat_completions] stream iteration failed session_id={session_id!r} model={request.model!r}\n{format_exc()}"
@@ -210,12 +252,16 @@ async def chat_completions(
             )
 
         # 5. Non-streaming Response
-        response_text = await call_agent_async(
-            query=user_query,
-            session_id=session_id,
-            model_id=request.model,
-            agents_registry=agents_registry,
-        )
+        async with await run_coordinator.acquire(session_id, wait=policy != "reject", conn=conn):
+            response_text = await call_agent_async(
+                query=user_query,
+                session_id=session_id,
+                model_id=request.model,
+                agents_registry=agents_registry,
+                user_id=user_id,
+                client_id=request.active_client_id,
+                latency_profile=request.latency_profile,
+            )
 
         return {
             "id": completion_id,
@@ -238,5 +284,9 @@ async def chat_completions(
 
     except HTTPException:
         raise
+    except ThreadBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
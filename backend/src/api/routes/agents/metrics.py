@@ -0,0 +1,13 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from api.core.agents.metrics import snapshot
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics() -> dict[str, Any]:
+    """Counters and gauges of the worker that served the request."""
+    return snapshot()
@@ -29,6 +29,7 @@ async def list_models(agents_registry: dict = Depends(get_agents_registry)):
                 "save_to_db": agent_info.get("save_to_db", True),
                 "mode": agent_info.get("mode", "single-shot"),
                 "suggestions": agent_info.get("suggestions", []),
+                "latency_profiles": agent_info.get("latency_profiles", []),
             }
         )
 
@@ -3,8 +3,13 @@ from typing import Any
 from asyncpg.connection import Connection
 from fastapi import APIRouter, Depends, HTTPException
 
+from api.core.agents.checkpointer import get_checkpointer
 from api.repositories.agents.chat_history import delete_chat, get_chat_messages, get_user_threads
-from config.database import get_conn
+from api.services.agents.history_projection import (
+    get_projected_history,
+    invalidate_projected_history,
+)
+from config.database import get_conn, get_read_conn, mark_primary_write
 
 router = APIRouter()
 
@@ -13,7 +18,7 @@ router = APIRouter()
 async def list_threads(
     agent_id: str | None = None,
     user_id: str | None = None,
-    conn: Connection = Depends(get_conn),
+    conn: Connection = Depends(get_read_conn),
 ) -> dict[str, Any]:
     """List all conversation threads for a user."""
     if not user_id:
@@ -29,10 +34,13 @@ async def list_threads(
 @router.get("/threads/{thread_id}")
 async def get_thread(
     thread_id: str,
-    conn: Connection = Depends(get_conn),
+    conn: Connection = Depends(get_read_conn),
 ) -> dict[str, Any]:
     """Get the message history for a specific thread."""
     messages = await get_chat_messages(conn, thread_id)
+    if not messages:
+        # history_source="checkpoint" threads keep no copy in chat_history.messages.
+        messages = await get_projected_history(thread_id)
 
     if not messages:
         return {"thread_id": thread_id, "messages": []}
@@ -74,6 +82,13 @@ async def get_thread(
 @router.delete("/threads/{thread_id}")
 async def delete_thread(thread_id: str, conn: Connection = Depends(get_conn)) -> dict[str, str]:
     deleted = await delete_chat(conn, thread_id)
+    mark_primary_write(thread_id)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Thread '{thread_id}' not found")
+
+    # Checkpoint-derived history would otherwise resurrect the thread on the next read.
+    checkpointer = get_checkpointer()
+    if checkpointer is not None:
+        await checkpointer.adelete_thread(thread_id)
+    invalidate_projected_history(thread_id)
     return {"status": "deleted", "thread_id": thread_id}
@@ -0,0 +1,140 @@
+import datetime as dt
+import time
+from typing import Any
+
+from asyncpg.connection import Connection
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+
+from api.core.agents.prompt_cache import prompt_cache
+from api.repositories.agents.latency import (
+    LatencyGroup,
+    LatencyMetric,
+    get_turn_latency_percentiles,
+)
+from api.repositories.agents.usage_rollups import UsageDimension, UsageGranularity
+from api.services.agents.usage_analytics import USAGE_REPORT_CACHE_TTL_S, get_usage_report
+from api.services.agents.usage_export import stream_usage_arrow
+from config.database import get_read_conn
+
+router = APIRouter()
+
+_DEFAULT_RANGE: dict[str, dt.timedelta] = {
+    "hour": dt.timedelta(days=1),
+    "day": dt.timedelta(days=30),
+    "week": dt.timedelta(weeks=12),
+    "month": dt.timedelta(days=365),
+}
+
+
+def _as_utc(value: dt.datetime | None) -> dt.datetime | None:
+    """Query datetimes without an offset (e.g. ?since=2026-10-01) are UTC."""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=dt.UTC)
+
+
+def _default_until() -> dt.datetime:
+    """Now, rounded up to the report cache TTL so repeated requests share a cache key."""
+    step = max(1, int(USAGE_REPORT_CACHE_TTL_S))
+    return dt.datetime.fromtimestamp(-(-int(time.time()) // step) * step, dt.UTC)
+
+
+@router.get("/usage")
+async def usage_report(
+    *,
+    response: Response,
+    granularity: UsageGranularity = "day",
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+    group_by: list[UsageDimension] = Query(default=[]),
+    agent_id: str | None = None,
+    model_id: str | None = None,
+    provider: str | None = None,
+    user_id: str | None = None,
+    client_id: str | None = None,
+    conn: Connection = Depends(get_read_conn),
+) -> dict[str, Any]:
+    """Tokens, cost and cached-token ratio per time bucket, optionally grouped and filtered.
+
+    Example: /usage?granularity=day&group_by=agent&group_by=model&since=2026-10-01T00:00:00Z
+    """
+    until = _as_utc(until) or _default_until()
+    since = _as_utc(since) or until - _DEFAULT_RANGE[granularity]
+    filters: dict[UsageDimension, str] = {
+        dimension: value
+        for dimension, value in (
+            ("agent", agent_id),
+            ("model", model_id),
+            ("provider", provider),
+            ("user", user_id),
+            ("client", client_id),
+        )
+        if value is not None
+    }
+    try:
+        report = await get_usage_report(
+            conn,
+            granularity=granularity,
+            since=since,
+            until=until,
+            group_by=group_by,
+            filters=filters,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    response.headers["Cache-Control"] = f"private, max-age={int(USAGE_REPORT_CACHE_TTL_S)}"
+    return report
+
+
+@router.get("/usage/latency")
+async def latency_report(
+    *,
+    metric: LatencyMetric = "total_ms",
+    group_by: LatencyGroup = "agent",
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+    agent_id: str | None = None,
+    conn: Connection = Depends(get_read_conn),
+) -> dict[str, Any]:
+    """p50/p90/p99 of one per-turn latency component, per agent or per model.
+
+    Example: /usage/latency?metric=model_ttft_ms&group_by=model&since=2026-10-12T00:00:00Z
+    """
+    until = _as_utc(until) or _default_until()
+    since = _as_utc(since) or until - dt.timedelta(days=7)
+    rows = await get_turn_latency_percentiles(
+        conn, metric=metric, since=since, until=until, group_by=group_by, agent_id=agent_id
+    )
+    return {"metric": metric, "since": since, "until": until, "groups": rows}
+
+
+@router.get("/usage/prompt-cache")
+async def prompt_cache_report() -> dict[str, Any]:
+    """Expected vs provider-reported cache_read tokens per agent, in the worker that answers.
+
+    Expected comes from the prompt prefix each call shares with the previous one (see
+    api.core.agents.prompt_cache); a reported ratio well below it points at a prefix that
+    changes between calls.
+    """
+    return {"agents": prompt_cache.stats()}
+
+
+@router.get("/usage/export")
+async def export_usage(
+    after_id: int = 0,
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+    conn: Connection = Depends(get_read_conn),
+) -> StreamingResponse:
+    """Raw usage rows with id > after_id as an Arrow IPC stream (read with pyarrow.ipc.open_stream).
+
+    Streams chunk by chunk from a server-side cursor; pass the highest `id` received as
+    `after_id` next time for an incremental pull. Monthly Parquet dumps: scripts/export_usage.py.
+    """
+    return StreamingResponse(
+        stream_usage_arrow(conn, after_id=after_id, since=_as_utc(since), until=_as_utc(until)),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": 'attachment; filename="agent_message_usage.arrows"'},
+    )
@@ -0,0 +1,243 @@
+"""Load-adaptive brownout: step agents down to cheaper models while the worker is overloaded.
+
+Under a traffic spike the reasoning-heavy configurations (high reasoning effort, Gemini
+thinking, Kimi K2 thinking) are what drives latency and provider queueing up. Instead of
+letting every request slow down, agents with AgentConfig.brownout give up quality first:
+
+    level 0  normal     models as configured
+    level 1  reduced    every call served with BrownoutPolicy.profile (a latency profile
+                        of AgentConfig.latency_profiles, e.g. lower reasoning effort)
+    level 2  fallback   every call served with BrownoutPolicy.fallback_model (agents
+                        without one stay at "reduced")
+
+The level follows the load of this worker, measured every BROWNOUT_INTERVAL_S over the
+last BROWNOUT_WINDOW_S from three signals, each divided by its threshold:
+
+    streams        agent runs in flight (run_coordinator)     / BROWNOUT_MAX_STREAMS
+    queue wait     p90 wait for a provider slot, per call     / BROWNOUT_QUEUE_WAIT_S
+                   (concurrency_middleware)
+    latency        median TTFT / the model's normal TTFT      / BROWNOUT_LATENCY_RATIO
+                   (normal = slow moving average of the median TTFT of the model's
+                   last calls, response-cache hits left out)
+
+The normal TTFT follows every call at every level, but through a median and a small
+weight: a burst of slow calls barely moves it, while a lasting change of the model's
+speed (or a first few calls unusually fast) becomes the new normal after a few dozen
+calls, so the latency signal can't get stuck high.
+
+load = the highest of the three. The level goes up as soon as load reaches 1 ("reduced")
+or BROWNOUT_SEVERE_LOAD ("fallback"), and down one level at a time once load has stayed
+under BROWNOUT_RECOVER_RATIO times the current level's threshold for BROWNOUT_HOLD_S.
+Each worker decides alone, from its own load.
+
+Applied per model call by BrownoutMiddleware (fallback model) and LatencyProfileMiddleware
+(profile), so a run already in progress steps down or back up from its next call.
+
+Every level change is logged with the signals behind it and the agents it affects.
+Metrics: brownout_level, brownout_load{signal=streams|queue_wait|latency} (gauges),
+brownout_transitions{from,to}, brownout_downgraded_calls{agent,step} (counters).
+
+Env knobs (all optional):
+    BROWNOUT_ENABLED          "0" disables the controller (default 1)
+    BROWNOUT_INTERVAL_S       seconds between two evaluations (default 2)
+    BROWNOUT_WINDOW_S         seconds of calls the signals look at (default 30)
+    BROWNOUT_MAX_STREAMS      runs in flight per worker at load 1 (default 32)
+    BROWNOUT_QUEUE_WAIT_S     p90 provider queue wait at load 1 (default 2)
+    BROWNOUT_LATENCY_RATIO    median TTFT / normal TTFT at load 1 (default 2)
+    BROWNOUT_SEVERE_LOAD      load that moves to "fallback" (default 1.5)
+    BROWNOUT_RECOVER_RATIO    fraction of a level's threshold to recover under (default 0.7)
+    BROWNOUT_HOLD_S           seconds of low load before stepping back up (default 30)
+"""
+
+import asyncio
+import contextlib
+import os
+import time
+from collections import deque
+from traceback import format_exc
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from api.core.agents import metrics
+from api.core.agents.schemas import BrownoutPolicy, LatencyProfile
+from api.services.agents.run_coordinator import run_coordinator
+
+BROWNOUT_ENABLED: bool = os.getenv("BROWNOUT_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+BROWNOUT_INTERVAL_S: float = float(os.getenv("BROWNOUT_INTERVAL_S", "2"))
+BROWNOUT_WINDOW_S: float = float(os.getenv("BROWNOUT_WINDOW_S", "30"))
+BROWNOUT_MAX_STREAMS: int = int(os.getenv("BROWNOUT_MAX_STREAMS", "32"))
+BROWNOUT_QUEUE_WAIT_S: float = float(os.getenv("BROWNOUT_QUEUE_WAIT_S", "2"))
+BROWNOUT_LATENCY_RATIO: float = float(os.getenv("BROWNOUT_LATENCY_RATIO", "2"))
+BROWNOUT_SEVERE_LOAD: float = float(os.getenv("BROWNOUT_SEVERE_LOAD", "1.5"))
+BROWNOUT_RECOVER_RATIO: float = float(os.getenv("BROWNOUT_RECOVER_RATIO", "0.7"))
+BROWNOUT_HOLD_S: float = float(os.getenv("BROWNOUT_HOLD_S", "30"))
+
+NORMAL, REDUCED, FALLBACK = 0, 1, 2
+LEVELS = ("normal", "reduced", "fallback")
+
+# Calls needed in the window before queue wait / latency count as a signal.
+_MIN_SAMPLES = 5
+# Normal TTFT: calls the median looks at, moving average weight per call and calls
+# needed before ratios are computed.
+_BASELINE_WINDOW = 20
+_BASELINE_ALPHA = 0.05
+_BASELINE_MIN_SAMPLES = 10
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Baseline:
+    """Normal TTFT of a model: moving average of the median of its recent calls."""
+
+    def __init__(self) -> None:
+        self.recent: deque[float] = deque(maxlen=_BASELINE_WINDOW)
+        self.value = 0.0
+        self.samples = 0
+
+    def observe(self, seconds: float) -> None:
+        self.recent.append(seconds)
+        self.samples += 1
+        if self.samples < _BASELINE_MIN_SAMPLES:
+            return
+        median = _quantile(list(self.recent), 0.5)
+        if self.samples == _BASELINE_MIN_SAMPLES:
+            self.value = median
+        else:
+            self.value += _BASELINE_ALPHA * (median - self.value)
+
+
+class BrownoutController:
+    """Brownout level of this worker, the signals it comes from, and agents' policies."""
+
+    def __init__(self) -> None:
+        self.level = NORMAL
+        self.load: dict[str, float] = {"streams": 0.0, "queue_wait": 0.0, "latency": 0.0}
+        self._policies: dict[str, BrownoutPolicy] = {}
+        # (monotonic time, value) of recent calls.
+        self._queue_waits: deque[tuple[float, float]] = deque()
+        self._latency_ratios: deque[tuple[float, float]] = deque()
+        self._baselines: dict[str, _Baseline] = {}
+        self._calm_since: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def set_agent_policy(self, agent_id: str, policy: BrownoutPolicy | None) -> None:
+        """Called by the registry for every agent (None = never stepped down)."""
+        if policy is None:
+            self._policies.pop(agent_id, None)
+        else:
+            self._policies[agent_id] = policy
+
+    def step(self, agent_id: str) -> int:
+        """Level applied to the agent now: the worker's, capped by what its policy offers."""
+        policy = self._policies.get(agent_id)
+        if policy is None or self.level == NORMAL:
+            return NORMAL
+        return min(self.level, FALLBACK if policy.fallback_model is not None else REDUCED)
+
+    def profile_for(self, agent_id: str, requested: LatencyProfile | None) -> LatencyProfile | None:
+        """Latency profile to serve the agent's calls with (the requested one when normal)."""
+        if self.step(agent_id) != REDUCED:
+            return requested
+        metrics.increment("brownout_downgraded_calls", agent=agent_id, step=LEVELS[REDUCED])
+        return self._policies[agent_id].profile
+
+    def fallback_for(self, agent_id: str) -> BaseChatModel | None:
+        """Model replacing the agent's at level "fallback", else None."""
+        if self.step(agent_id) != FALLBACK:
+            return None
+        metrics.increment("brownout_downgraded_calls", agent=agent_id, step=LEVELS[FALLBACK])
+        return self._policies[agent_id].fallback_model
+
+    def observe_call(self, model_id: str, queue_wait_s: float, ttft_s: float) -> None:
+        """A successful provider call (not a cache hit): its slot wait and its TTFT."""
+        now = time.monotonic()
+        self._queue_waits.append((now, queue_wait_s))
+        baseline = self._baselines.setdefault(model_id, _Baseline())
+        if baseline.value > 0:
+            self._latency_ratios.append((now, ttft_s / baseline.value))
+        baseline.observe(ttft_s)
+
+    def _measure(self, now: float) -> float:
+        for samples in (self._queue_waits, self._latency_ratios):
+            while samples and samples[0][0] < now - BROWNOUT_WINDOW_S:
+                samples.popleft()
+        waits = [value for _, value in self._queue_waits]
+        ratios = [value for _, value in self._latency_ratios]
+        self.load = {
+            "streams": run_coordinator.in_flight() / BROWNOUT_MAX_STREAMS,
+            "queue_wait": (
+                _quantile(waits, 0.9) / BROWNOUT_QUEUE_WAIT_S if len(waits) >= _MIN_SAMPLES else 0.0
+            ),
+            "latency": (
+                _quantile(ratios, 0.5) / BROWNOUT_LATENCY_RATIO
+                if len(ratios) >= _MIN_SAMPLES
+                else 0.0
+            ),
+        }
+        for signal, value in self.load.items():
+            metrics.set_gauge("brownout_load", value, signal=signal)
+        return max(self.load.values())
+
+    def evaluate(self, now: float | None = None) -> int:
+        """Update the level from the current load (see module docstring); returns it."""
+        now = time.monotonic() if now is None else now
+        load = self._measure(now)
+        target = FALLBACK if load >= BROWNOUT_SEVERE_LOAD else REDUCED if load >= 1 else NORMAL
+        if target > self.level:
+            self._set_level(target, load)
+            self._calm_since = None
+        elif self.level > NORMAL:
+            threshold = BROWNOUT_SEVERE_LOAD if self.level == FALLBACK else 1.0
+            if load >= threshold * BROWNOUT_RECOVER_RATIO:
+                self._calm_since = None
+            elif self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= BROWNOUT_HOLD_S:
+                self._set_level(self.level - 1, load)
+                self._calm_since = now if self.level > NORMAL else None
+        metrics.set_gauge("brownout_level", self.level)
+        return self.level
+
+    def _set_level(self, level: int, load: float) -> None:
+        previous, self.level = self.level, level
+        metrics.increment("brownout_transitions", **{"from": LEVELS[previous], "to": LEVELS[level]})
+        signals = ", ".join(f"{signal}={value:.2f}" for signal, value in self.load.items())
+        affected = []
+        for agent_id, policy in sorted(self._policies.items()):
+            step = self.step(agent_id)
+            if step == REDUCED:
+                affected.append(f"{agent_id}: profile {policy.profile!r}")
+            elif step == FALLBACK:
+                metadata = getattr(policy.fallback_model, "metadata", None) or {}
+                affected.append(f"{agent_id}: fallback {metadata.get('model_id', 'model')!r}")
+        print(
+            f"[Brownout] {LEVELS[previous]} -> {LEVELS[level]} (load {load:.2f}: {signals}); "
+            + ("; ".join(affected) if affected else "all agents as configured")
+        )
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(BROWNOUT_INTERVAL_S)
+            try:
+                self.evaluate()
+            except Exception:
+                print(f"[Brownout] evaluation failed\n{format_exc()}")
+
+    def start(self) -> None:
+        """Start evaluating the load (called at startup, after the registry is loaded)."""
+        if self._task is None and BROWNOUT_ENABLED and self._policies:
+            metrics.set_gauge("brownout_level", self.level)
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+brownout = BrownoutController()
@@ -0,0 +1,255 @@
+"""Spend/token quotas per user, per client (active_client_id) and per agent.
+
+Checks never touch the database. Each worker keeps, per UTC day:
+
+    base   totals of the day read from agent_usage_daily (all workers' flushed usage)
+    local  usage this worker recorded since the last reconciliation
+
+and `spent = base + local`. Every BUDGET_RECONCILE_INTERVAL_S the worker re-reads the
+rollup (one GROUP BY over today's rows) and resets `local`, which is how spend from other
+workers becomes visible. Consequences worth knowing:
+    - other workers' spend is seen with up to one interval (+ one usage-writer flush) of
+      delay, so a budget can be overshot by what the fleet spends in that window;
+    - rows recorded right before a reconciliation but not flushed yet are briefly not
+      counted anywhere (at most one usage-writer flush interval).
+
+Scopes (limits of 0/None are ignored):
+    user            BUDGET_USER_DAILY_COST_USD / BUDGET_USER_DAILY_TOKENS, all agents
+    client          BUDGET_CLIENT_DAILY_COST_USD / BUDGET_CLIENT_DAILY_TOKENS, all agents
+    agent           AgentConfig.budget.total
+    agent+user      AgentConfig.budget.per_user
+    agent+client    AgentConfig.budget.per_client
+
+When a scope is exhausted the decision is "downgrade" if the agent has
+`on_exhausted="downgrade"` and a fallback_model, else "reject". Global user/client limits
+follow the agent's policy too.
+"""
+
+import asyncio
+import contextlib
+import datetime as dt
+import os
+from dataclasses import dataclass
+from traceback import format_exc
+from typing import Any, Literal
+
+from api.core.agents import metrics
+from api.core.agents.schemas import AgentBudget, BudgetLimit
+from api.models.agents.usage import AgentMessageUsage
+from config import database as database_module
+
+
+def _env_float(name: str) -> float | None:
+    value = os.getenv(name)
+    return float(value) if value and float(value) > 0 else None
+
+
+BUDGET_RECONCILE_INTERVAL_S: float = float(os.getenv("BUDGET_RECONCILE_INTERVAL_S", "10"))
+USER_DAILY_LIMIT = BudgetLimit(
+    cost_usd=_env_float("BUDGET_USER_DAILY_COST_USD"),
+    tokens=int(_env_float("BUDGET_USER_DAILY_TOKENS") or 0) or None,
+)
+CLIENT_DAILY_LIMIT = BudgetLimit(
+    cost_usd=_env_float("BUDGET_CLIENT_DAILY_COST_USD"),
+    tokens=int(_env_float("BUDGET_CLIENT_DAILY_TOKENS") or 0) or None,
+)
+
+# (scope, *ids) -> [cost_usd, tokens]
+_ScopeKey = tuple[str, ...]
+
+
+class BudgetExceededError(Exception):
+    """Raised when a budget is exhausted and the agent can't downgrade."""
+
+
+@dataclass(frozen=True)
+class BudgetDecision:
+    action: Literal["allow", "reject", "downgrade"]
+    reason: str | None = None
+    fallback_model: Any = None
+
+
+ALLOW = BudgetDecision("allow")
+
+
+def _today() -> dt.date:
+    return dt.datetime.now(dt.UTC).date()
+
+
+def _scope_keys(agent_id: str, user_id: str | None, client_id: str | None) -> list[_ScopeKey]:
+    keys: list[_ScopeKey] = [("agent", agent_id)]
+    if user_id:
+        keys += [("user", user_id), ("agent_user", agent_id, user_id)]
+    if client_id:
+        keys += [("client", client_id), ("agent_client", agent_id, client_id)]
+    return keys
+
+
+def _exceeded(limit: BudgetLimit | None, spent: list[float]) -> str | None:
+    if limit is None:
+        return None
+    if limit.cost_usd is not None and spent[0] >= limit.cost_usd:
+        return f"US$ {spent[0]:.4f} of US$ {limit.cost_usd:.4f}"
+    if limit.tokens is not None and spent[1] >= limit.tokens:
+        return f"{int(spent[1])} of {limit.tokens} tokens"
+    return None
+
+
+class BudgetLedger:
+    """In-memory daily spend per scope, reconciled periodically with agent_usage_daily."""
+
+    def __init__(self) -> None:
+        self._agent_budgets: dict[str, AgentBudget] = {}
+        self._day = _today()
+        self._base: dict[_ScopeKey, list[float]] = {}
+        self._local: dict[_ScopeKey, list[float]] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self._agent_budgets
+            or USER_DAILY_LIMIT.cost_usd
+            or USER_DAILY_LIMIT.tokens
+            or CLIENT_DAILY_LIMIT.cost_usd
+            or CLIENT_DAILY_LIMIT.tokens
+        )
+
+    def set_agent_budget(self, agent_id: str, budget: AgentBudget | None) -> None:
+        if budget is None:
+            self._agent_budgets.pop(agent_id, None)
+        else:
+            self._agent_budgets[agent_id] = budget
+
+    def _roll_day(self) -> None:
+        today = _today()
+        if today != self._day:
+            self._day = today
+            self._base = {}
+            self._local = {}
+
+    def _spent(self, key: _ScopeKey) -> list[float]:
+        base = self._base.get(key, (0.0, 0.0))
+        local = self._local.get(key, (0.0, 0.0))
+        return [base[0] + local[0], base[1] + local[1]]
+
+    def spent(self, scope: str, *ids: str) -> tuple[float, int]:
+        """(cost_usd, tokens) spent today by one scope, e.g. spent("user", "u1")."""
+        self._roll_day()
+        cost, tokens = self._spent((scope, *ids))
+        return cost, int(tokens)
+
+    def record(self, usage: AgentMessageUsage) -> None:
+        """Count a finished LLM call (called by UsageRecorderCallback)."""
+        if not self.enabled:
+            return
+        self._roll_day()
+        for key in _scope_keys(usage.agent_id, usage.user_id, usage.client_id):
+            entry = self._local.setdefault(key, [0.0, 0.0])
+            entry[0] += usage.cost_usd
+            entry[1] += usage.total_tokens
+
+    def check(
+        self, agent_id: str, user_id: str | None = None, client_id: str | None = None
+    ) -> BudgetDecision:
+        """Decide whether a run / LLM call may proceed. Pure in-memory."""
+        if not self.enabled:
+            return ALLOW
+        self._roll_day()
+        budget = self._agent_budgets.get(agent_id)
+        limits: list[tuple[str, BudgetLimit | None, _ScopeKey]] = [
+            (f"agent '{agent_id}'", budget.total if budget else None, ("agent", agent_id))
+        ]
+        if user_id:
+            limits += [
+                (f"user '{user_id}'", USER_DAILY_LIMIT, ("user", user_id)),
+                (
+                    f"user '{user_id}' on agent '{agent_id}'",
+                    budget.per_user if budget else None,
+                    ("agent_user", agent_id, user_id),
+                ),
+            ]
+        if client_id:
+            limits += [
+                (f"client '{client_id}'", CLIENT_DAILY_LIMIT, ("client", client_id)),
+                (
+                    f"client '{client_id}' on agent '{agent_id}'",
+                    budget.per_client if budget else None,
+                    ("agent_client", agent_id, client_id),
+                ),
+            ]
+
+        for label, limit, key in limits:
+            usage = _exceeded(limit, self._spent(key))
+            if usage is None:
+                continue
+            reason = f"Daily budget exhausted for {label} ({usage})"
+            scope = key[0]
+            if budget and budget.on_exhausted == "downgrade" and budget.fallback_model is not None:
+                metrics.increment("budget_downgrades", agent=agent_id, scope=scope)
+                return BudgetDecision("downgrade", reason, budget.fallback_model)
+            metrics.increment("budget_rejections", agent=agent_id, scope=scope)
+            return BudgetDecision("reject", reason)
+        return ALLOW
+
+    async def reconcile(self) -> None:
+        """Replace `base` with today's totals from agent_usage_daily and reset `local`."""
+        pool = getattr(database_module, "asyncpg_pool", None)
+        if pool is None:
+            return
+        self._roll_day()
+        day = self._day
+        local, self._local = self._local, {}
+        try:
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT user_id, client_id, agent_id,
+                           sum(cost_usd)::float AS cost_usd, sum(total_tokens)::float AS tokens
+                    FROM agent_usage_daily
+                    WHERE bucket = $1
+                    GROUP BY user_id, client_id, agent_id
+                    """,
+                    day,
+                )
+        except Exception:
+            # Keep counting locally; the next round will try again.
+            for key, (cost, tokens) in local.items():
+                entry = self._local.setdefault(key, [0.0, 0.0])
+                entry[0] += cost
+                entry[1] += tokens
+            raise
+
+        base: dict[_ScopeKey, list[float]] = {}
+        for row in rows:
+            for key in _scope_keys(row["agent_id"], row["user_id"], row["client_id"]):
+                entry = base.setdefault(key, [0.0, 0.0])
+                entry[0] += row["cost_usd"]
+                entry[1] += row["tokens"]
+        if day == self._day:
+            self._base = base
+        metrics.increment("budget_reconciliations")
+
+    async def _reconcile_loop(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                metrics.increment("budget_reconcile_failures")
+                print(f"[BudgetLedger] reconcile failed\n{format_exc()}")
+            await asyncio.sleep(BUDGET_RECONCILE_INTERVAL_S)
+
+    def start(self) -> None:
+        """Start periodic reconciliation (called at startup, after the registry is loaded)."""
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+budget_ledger = BudgetLedger()
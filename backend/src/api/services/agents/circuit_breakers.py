@@ -0,0 +1,112 @@
+"""Per-provider circuit breakers for failover_middleware.
+
+    closed      calls go through; CIRCUIT_FAILURE_THRESHOLD overload failures in a row
+                (429, 5xx, timeout, connection error) open the circuit
+    open        calls skip the provider right away (the next model of the chain serves
+                them) for CIRCUIT_OPEN_S
+    half_open   one probe call goes through: success closes the circuit, an overload
+                failure opens it again
+
+Other errors (bad request, content filter, ...) prove the provider is up, so they reset
+the failure count like a success. Breakers are per worker and shared by every agent.
+
+Metrics, labelled provider: circuit_state (gauge: 0 closed, 1 half-open, 2 open),
+circuit_opens, circuit_skips (counters).
+
+Env knobs (all optional):
+    CIRCUIT_FAILURE_THRESHOLD   consecutive overload failures that open (default 5)
+    CIRCUIT_OPEN_S              seconds before a probe is let through (default 30)
+"""
+
+import os
+import time
+from typing import Literal
+
+from api.core.agents import metrics
+
+CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_S: float = float(os.getenv("CIRCUIT_OPEN_S", "30"))
+
+CircuitState = Literal["closed", "open", "half_open"]
+_STATE_GAUGE: dict[CircuitState, int] = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised when every model of a fallback chain is behind an open circuit."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state of one provider in this worker."""
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self.state: CircuitState = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._set_state("closed")
+
+    def _set_state(self, state: CircuitState) -> None:
+        self.state = state
+        metrics.set_gauge("circuit_state", _STATE_GAUGE[state], provider=self.provider)
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (takes the probe when half-open)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < CIRCUIT_OPEN_S:
+                metrics.increment("circuit_skips", provider=self.provider)
+                return False
+            self._set_state("half_open")
+        if self._probing:
+            metrics.increment("circuit_skips", provider=self.provider)
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._probing = False
+        self.failures = 0
+        if self.state != "closed":
+            self._set_state("closed")
+
+    def record_failure(self, overload: bool) -> None:
+        """A call failed; `overload` is True for 429 / 5xx / timeout / connection errors."""
+        if not overload:
+            self.record_success()
+            return
+        self._probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self._open()
+
+    def release(self) -> None:
+        """The call was cancelled before it said anything about the provider."""
+        self._probing = False
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self.failures = 0
+        if self.state != "open":
+            metrics.increment("circuit_opens", provider=self.provider)
+        self._set_state("open")
+
+
+class CircuitBreakers:
+    """The CircuitBreaker of every provider used by this worker."""
+
+    def __init__(self) -> None:
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker_for(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+    def states(self) -> dict[str, CircuitState]:
+        return {provider: breaker.state for provider, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakers()
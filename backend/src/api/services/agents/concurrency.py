@@ -0,0 +1,171 @@
+"""Adaptive (AIMD) concurrency limits per provider.
+
+A static cap on in-flight LLM calls is either too low (wasted capacity) or too high (429s
+and a tail-latency collapse as soon as the provider degrades). Each provider instead gets
+a limit that follows its real capacity (see concurrency_middleware):
+
+    success, normal TTFT         limit += 1 / limit  (about +1 per `limit` calls), only
+                                 while the limit is actually used (in flight >= limit / 2)
+    429, 5xx, timeout,           limit *= CONCURRENCY_DECREASE_FACTOR, at most once per
+    connection error or a        _DECREASE_COOLDOWN_S so one burst of failures counts once
+    latency spike
+
+A latency spike is a TTFT (the whole call when the model didn't stream) above
+CONCURRENCY_LATENCY_SPIKE_RATIO times the model's baseline, a slow moving average of its
+TTFT; baselines are per model because models of one provider differ a lot. Calls over the
+limit wait FIFO and fail with ConcurrencyTimeoutError after CONCURRENCY_MAX_WAIT_S.
+
+Limits are per worker: each Granian worker learns its own, and together they converge to
+what the provider sustains.
+
+Metrics, labelled provider: provider_inflight_limit, provider_inflight,
+provider_queue_depth (gauges), provider_limit_decreases{reason}, provider_queue_waits,
+provider_queue_wait_seconds, provider_queue_timeouts (counters).
+
+Env knobs (all optional):
+    CONCURRENCY_INITIAL_LIMIT        starting limit per provider (default 8)
+    CONCURRENCY_MIN_LIMIT            floor (default 1)
+    CONCURRENCY_MAX_LIMIT            ceiling (default 64)
+    CONCURRENCY_DECREASE_FACTOR      multiplicative decrease (default 0.5)
+    CONCURRENCY_LATENCY_SPIKE_RATIO  TTFT / baseline counted as a spike (default 2.0)
+    CONCURRENCY_MAX_WAIT_S           longest wait for a slot (default 60)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from api.core.agents import metrics
+
+CONCURRENCY_INITIAL_LIMIT: int = int(os.getenv("CONCURRENCY_INITIAL_LIMIT", "8"))
+CONCURRENCY_MIN_LIMIT: int = int(os.getenv("CONCURRENCY_MIN_LIMIT", "1"))
+CONCURRENCY_MAX_LIMIT: int = int(os.getenv("CONCURRENCY_MAX_LIMIT", "64"))
+CONCURRENCY_DECREASE_FACTOR: float = float(os.getenv("CONCURRENCY_DECREASE_FACTOR", "0.5"))
+CONCURRENCY_LATENCY_SPIKE_RATIO: float = float(os.getenv("CONCURRENCY_LATENCY_SPIKE_RATIO", "2.0"))
+CONCURRENCY_MAX_WAIT_S: float = float(os.getenv("CONCURRENCY_MAX_WAIT_S", "60"))
+
+_DECREASE_COOLDOWN_S = 2.0
+# TTFT baseline: moving average weight and samples needed before spikes are detected.
+_BASELINE_ALPHA = 0.05
+_BASELINE_MIN_SAMPLES = 20
+
+
+class ConcurrencyTimeoutError(Exception):
+    """Raised when a model call waited CONCURRENCY_MAX_WAIT_S for a provider slot."""
+
+
+class _LatencyBaseline:
+    def __init__(self) -> None:
+        self.mean = 0.0
+        self.samples = 0
+
+    def observe(self, seconds: float) -> bool:
+        """Add a sample; True when it is a spike compared to the baseline so far."""
+        spike = (
+            self.samples >= _BASELINE_MIN_SAMPLES
+            and seconds > CONCURRENCY_LATENCY_SPIKE_RATIO * self.mean
+        )
+        self.mean = (
+            seconds if self.samples == 0 else self.mean + _BASELINE_ALPHA * (seconds - self.mean)
+        )
+        self.samples += 1
+        return spike
+
+
+class AdaptiveLimit:
+    """In-flight limit of one provider in this worker, with its FIFO wait queue."""
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self.limit = float(CONCURRENCY_INITIAL_LIMIT)
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._baselines: dict[str, _LatencyBaseline] = {}
+        self._last_decrease = 0.0
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("provider_inflight_limit", int(self.limit), provider=self.provider)
+        metrics.set_gauge("provider_inflight", self.in_flight, provider=self.provider)
+        metrics.set_gauge("provider_queue_depth", len(self._waiters), provider=self.provider)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():  # timed out or cancelled
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._publish()
+
+    async def acquire(self, timeout: float) -> float:
+        """Take a slot, waiting up to `timeout` seconds. Returns the seconds waited."""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._publish()
+            return 0.0
+
+        started = time.monotonic()
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.increment("provider_queue_waits", provider=self.provider)
+        self._publish()
+        try:
+            await asyncio.wait((waiter,), timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        waited = time.monotonic() - started
+        metrics.increment("provider_queue_wait_seconds", waited, provider=self.provider)
+        if not waiter.done():
+            waiter.cancel()
+            self._publish()
+            metrics.increment("provider_queue_timeouts", provider=self.provider)
+            raise ConcurrencyTimeoutError(
+                f"No {self.provider} slot after {waited:.1f}s "
+                f"({self.in_flight} in flight, limit {int(self.limit)})"
+            )
+        return waited
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self, model_id: str, ttft_s: float) -> None:
+        """A call of `model_id` (still holding its slot) finished fine after `ttft_s`."""
+        baseline = self._baselines.setdefault(model_id, _LatencyBaseline())
+        if baseline.observe(ttft_s):
+            self.on_overload("latency")
+        elif self.in_flight >= self.limit / 2:
+            self.limit = min(float(CONCURRENCY_MAX_LIMIT), self.limit + 1 / self.limit)
+            self._publish()
+
+    def on_overload(self, reason: str) -> None:
+        """Multiplicative decrease after a 429 / 5xx / timeout / latency spike."""
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_COOLDOWN_S:
+            return
+        self._last_decrease = now
+        self.limit = max(float(CONCURRENCY_MIN_LIMIT), self.limit * CONCURRENCY_DECREASE_FACTOR)
+        metrics.increment("provider_limit_decreases", provider=self.provider, reason=reason)
+        self._publish()
+
+
+class ConcurrencyController:
+    """The AdaptiveLimit of every provider used by this worker."""
+
+    def __init__(self) -> None:
+        self._limits: dict[str, AdaptiveLimit] = {}
+
+    def limit_for(self, provider: str) -> AdaptiveLimit:
+        limit = self._limits.get(provider)
+        if limit is None:
+            limit = self._limits[provider] = AdaptiveLimit(provider)
+        return limit
+
+
+concurrency_controller = ConcurrencyController()
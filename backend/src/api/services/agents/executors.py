@@ -1,5 +1,7 @@
 from typing import Any
 
+from api.core.agents.schemas import LatencyProfile
+
 
 def _reasoning_summary_text_from_block(block: dict) -> str:
     """Text from a single Gemini/OpenAI-style reasoning content block."""
@@ -100,16 +102,37 @@ def _extract_message_content(agent_response: Any) -> str:
     return str(agent_response)
 
 
-async def execute_agent(agent_info: dict, query: str, session_id: str) -> str:
+async def execute_agent(
+    agent_info: dict,
+    query: str,
+    session_id: str,
+    agent_id: str | None = None,
+    user_id: str | None = None,
+    client_id: str | None = None,
+    latency_profile: LatencyProfile | None = None,
+) -> str:
     """Execute agent and return the final response."""
     agent = agent_info["agent"]
 
     config: dict = {"configurable": {"thread_id": session_id}}
+    if agent_id:
+        # Same keys as stream_agent: read by UsageRecorderCallback and the agent's
+        # middleware (budgets, semantic cache, latency profile, brownout).
+        config["metadata"] = {
+            "thread_id": session_id,
+            "agent_id": agent_id,
+            "user_id": user_id,
+            "client_id": client_id,
+            "latency_profile": latency_profile,
+        }
+    durability = agent_info.get("durability")
+    run_kwargs: dict[str, Any] = {"durability": durability} if durability else {}
 
     try:
         response = await agent.ainvoke(
             {"messages": [{"role": "user", "content": query}]},
             config=config,
+            **run_kwargs,
         )
         return _extract_message_content(response)
     except Exception as e:
@@ -117,7 +140,13 @@ async def execute_agent(agent_info: dict, query: str, session_id: str) -> str:
 
 
 async def call_agent_async(
-    query: str, session_id: str, model_id: str, agents_registry: dict
+    query: str,
+    session_id: str,
+    model_id: str,
+    agents_registry: dict,
+    user_id: str | None = None,
+    client_id: str | None = None,
+    latency_profile: LatencyProfile | None = None,
 ) -> str:
     """Execute agent and return response."""
     if model_id not in agents_registry:
@@ -125,4 +154,12 @@ async def call_agent_async(
         raise Exception(f"Model '{model_id}' not found. Available: {available}")
 
     agent_info = agents_registry[model_id]
-    return await execute_agent(agent_info, query, session_id)
+    return await execute_agent(
+        agent_info,
+        query,
+        session_id,
+        model_id,
+        user_id=user_id,
+        client_id=client_id,
+        latency_profile=latency_profile,
+    )
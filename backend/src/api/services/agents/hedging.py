@@ -0,0 +1,110 @@
+"""Hedged model calls: when the first token is late, race a second model.
+
+Used by FailoverMiddleware(..., hedge=True). The call goes to the first available model
+of the chain; if it has not streamed a token after the model's hedge delay, the same
+request also goes to the next available model. The first of the two to stream a token
+wins, the other is cancelled. A call that fails before any token still fails over as
+usual.
+
+Hedge delay of a model, in order:
+    ModelConfig.hedge_after_s    fixed value from the catalog
+    live p95 TTFT                of the model's last _TTFT_WINDOW calls in this worker,
+                                 once _TTFT_MIN_SAMPLES are known (a cancelled call counts
+                                 with the time it waited, a lower bound of its TTFT)
+    HEDGE_DEFAULT_AFTER_S        until then
+and never less than HEDGE_MIN_AFTER_S.
+
+Only the winner is served: its run is the one UsageRecorderCallback records, and the
+loser's run is dropped from the SSE stream and the turn timings (TurnTimer.discard_run).
+The loser was billed for its prompt all the same, so record_hedge_cost() writes it to
+agent_message_usage as its own row with error="hedge_cancelled" (approximate input
+tokens, no output): it counts towards budgets and cost reports, rollups count it in
+error_calls rather than as a served call.
+
+Metrics: hedges_started{model}, hedges{primary,hedge,winner=primary|hedge},
+hedge_cost_usd{model} (counters).
+
+Env knobs (all optional):
+    HEDGE_DEFAULT_AFTER_S   hedge delay while a model has too few samples (default 4)
+    HEDGE_MIN_AFTER_S       lower bound of every hedge delay (default 0.5)
+"""
+
+import math
+import os
+from collections import deque
+from typing import Any
+
+from api.core.agents import metrics
+from api.core.agents.models import ModelConfig, compute_cost_usd
+from api.models.agents.usage import AgentMessageUsage
+from api.services.agents.budgets import budget_ledger
+from api.services.agents.usage_writer import usage_writer
+
+HEDGE_DEFAULT_AFTER_S: float = float(os.getenv("HEDGE_DEFAULT_AFTER_S", "4"))
+HEDGE_MIN_AFTER_S: float = float(os.getenv("HEDGE_MIN_AFTER_S", "0.5"))
+
+HEDGE_CANCELLED_ERROR = "hedge_cancelled"
+
+_TTFT_WINDOW = 200
+_TTFT_MIN_SAMPLES = 20
+_TTFT_PERCENTILE = 0.95
+
+
+class _TtftWindow:
+    def __init__(self) -> None:
+        self.samples: deque[float] = deque(maxlen=_TTFT_WINDOW)
+
+    def p95(self) -> float | None:
+        if len(self.samples) < _TTFT_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(_TTFT_PERCENTILE * len(ordered)) - 1)]
+
+
+class HedgeStats:
+    """Recent TTFTs per model in this worker, and the hedge delays derived from them."""
+
+    def __init__(self) -> None:
+        self._windows: dict[tuple[str, str], _TtftWindow] = {}
+
+    def observe_ttft(self, config: ModelConfig, seconds: float) -> None:
+        window = self._windows.get(config.key)
+        if window is None:
+            window = self._windows[config.key] = _TtftWindow()
+        window.samples.append(seconds)
+
+    def hedge_after_s(self, config: ModelConfig) -> float:
+        """Seconds without a first token after which a call of `config` is hedged."""
+        if config.hedge_after_s is not None:
+            return max(HEDGE_MIN_AFTER_S, config.hedge_after_s)
+        window = self._windows.get(config.key)
+        p95 = window.p95() if window is not None else None
+        return max(HEDGE_MIN_AFTER_S, p95 if p95 is not None else HEDGE_DEFAULT_AFTER_S)
+
+
+hedge_stats = HedgeStats()
+
+
+def record_hedge_cost(config: ModelConfig, input_tokens: int, metadata: dict[str, Any]) -> None:
+    """Account for a cancelled hedge call of `config` that was sent `input_tokens`."""
+    cost_usd = compute_cost_usd({"input_tokens": input_tokens}, config)
+    metrics.increment("hedge_cost_usd", cost_usd, model=f"{config.provider}/{config.model_id}")
+    thread_id = metadata.get("thread_id")
+    agent_id = metadata.get("agent_id")
+    if not thread_id or not agent_id:
+        return
+    usage = AgentMessageUsage(
+        thread_id=str(thread_id),
+        message_id=str(metadata.get("message_id") or thread_id),
+        user_id=str(metadata["user_id"]) if metadata.get("user_id") is not None else None,
+        client_id=str(metadata["client_id"]) if metadata.get("client_id") is not None else None,
+        agent_id=str(agent_id),
+        provider=config.provider,
+        model_id=config.model_id,
+        input_tokens=input_tokens,
+        total_tokens=input_tokens,
+        cost_usd=cost_usd,
+        error=HEDGE_CANCELLED_ERROR,
+    )
+    usage_writer.enqueue(usage)
+    budget_ledger.record(usage)
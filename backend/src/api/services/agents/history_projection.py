@@ -0,0 +1,152 @@
+"""Projection of LangGraph checkpoint state into the UI chat history shape.
+
+Agents with ``AgentConfig.history_source="checkpoint"`` don't keep a second copy of the
+conversation in ``chat_history.messages`` — that row only carries thread metadata
+(owner, agent, preview, timestamps). The UI history is rebuilt from the latest
+checkpoint instead, so there is a single source of truth and one write per turn.
+
+Shape produced (same as what `stream_agent` used to persist):
+    {"role": "user", "content": "..."}
+    {"role": "assistant", "content": "...", "reasoning": "...", "parts": [...]}
+
+One assistant message per turn: every AIMessage / ToolMessage after a HumanMessage is
+folded into it (reasoning first, then tool parts in call order, then the text).
+
+Projections are cached per (thread_id, checkpoint_id). A new turn creates a new
+checkpoint id, so entries never go stale — they are only evicted by size.
+"""
+
+from __future__ import annotations
+
+import contextlib
+from collections import OrderedDict
+from typing import Any
+
+import orjson
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from api.core.agents.checkpointer import get_checkpointer
+from api.services.agents.executors import (
+    extract_thinking_from_content,
+    normalize_chunk_text,
+    reasoning_from_additional_kwargs,
+)
+
+PROJECTION_CACHE_MAX_ENTRIES: int = 512
+
+_projection_cache: OrderedDict[tuple[str, str], list[dict[str, Any]]] = OrderedDict()
+
+
+def _tool_output(message: ToolMessage) -> Any:
+    raw = message.content
+    if isinstance(raw, str):
+        with contextlib.suppress(orjson.JSONDecodeError):
+            return orjson.loads(raw)
+    return raw
+
+
+def _assistant_message(turn: list[AnyMessage]) -> dict[str, Any] | None:
+    """Fold the AI/Tool messages of one turn into a single UI assistant message."""
+    text = ""
+    reasoning = ""
+    tool_parts: dict[str, dict[str, Any]] = {}
+
+    for message in turn:
+        if isinstance(message, AIMessage):
+            text += normalize_chunk_text(message.content)
+            reasoning += extract_thinking_from_content(
+                message.content
+            ) + reasoning_from_additional_kwargs(message.additional_kwargs)
+            for call in message.tool_calls:
+                call_id = str(call.get("id") or "")
+                tool_parts[call_id] = {
+                    "type": "dynamic-tool",
+                    "toolName": call.get("name") or "",
+                    "toolCallId": call_id,
+                    "state": "input-available",
+                    "input": call.get("args"),
+                }
+        elif isinstance(message, ToolMessage):
+            part = tool_parts.setdefault(
+                message.tool_call_id,
+                {
+                    "type": "dynamic-tool",
+                    "toolName": message.name or "",
+                    "toolCallId": message.tool_call_id,
+                    "input": None,
+                },
+            )
+            if message.status == "error":
+                part["state"] = "output-error"
+                part["errorText"] = normalize_chunk_text(message.content)
+            else:
+                part["state"] = "output-available"
+                part["output"] = _tool_output(message)
+
+    parts: list[dict[str, Any]] = []
+    if reasoning:
+        parts.append({"type": "reasoning", "reasoning": reasoning})
+    parts.extend(tool_parts.values())
+    if text:
+        parts.append({"type": "text", "text": text})
+    if not parts:
+        return None
+
+    assistant: dict[str, Any] = {"role": "assistant", "content": text, "parts": parts}
+    if reasoning:
+        assistant["reasoning"] = reasoning
+    return assistant
+
+
+def project_messages(messages: list[AnyMessage]) -> list[dict[str, Any]]:
+    """Pure projection of checkpoint `messages` into UI history dicts."""
+    history: list[dict[str, Any]] = []
+    turn: list[AnyMessage] = []
+
+    def flush_turn() -> None:
+        if turn:
+            assistant = _assistant_message(turn)
+            if assistant is not None:
+                history.append(assistant)
+            turn.clear()
+
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            flush_turn()
+            history.append({"role": "user", "content": normalize_chunk_text(message.content)})
+        elif isinstance(message, AIMessage | ToolMessage):
+            turn.append(message)
+    flush_turn()
+    return history
+
+
+async def get_projected_history(thread_id: str) -> list[dict[str, Any]] | None:
+    """UI history for a thread derived from its latest checkpoint (None if there is none)."""
+    checkpointer = get_checkpointer()
+    if checkpointer is None:
+        return None
+
+    checkpoint_tuple = await checkpointer.aget_tuple(
+        {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    )
+    if checkpoint_tuple is None:
+        return None
+
+    key = (thread_id, str(checkpoint_tuple.checkpoint["id"]))
+    cached = _projection_cache.get(key)
+    if cached is not None:
+        _projection_cache.move_to_end(key)
+        return cached
+
+    messages = checkpoint_tuple.checkpoint.get("channel_values", {}).get("messages") or []
+    projected = project_messages(messages)
+    _projection_cache[key] = projected
+    while len(_projection_cache) > PROJECTION_CACHE_MAX_ENTRIES:
+        _projection_cache.popitem(last=False)
+    return projected
+
+
+def invalidate_projected_history(thread_id: str) -> None:
+    """Drop every cached projection of a thread (e.g. after the thread is deleted)."""
+    for key in [key for key in _projection_cache if key[0] == thread_id]:
+        del _projection_cache[key]
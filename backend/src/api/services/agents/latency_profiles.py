@@ -0,0 +1,122 @@
+"""Per-request latency profiles: fast / balanced / deep variants of an agent's models.
+
+Models are built once, at import, with fixed reasoning settings (reasoning_effort,
+thinking, max_tokens, ...). A request can ask for another trade-off with
+ChatRequest.latency_profile; the agent maps each profile it supports to init_model
+overrides:
+
+    config = AgentConfig(
+        ...,
+        latency_profiles={
+            "fast": {"reasoning_effort": "low", "max_tokens": 2048},
+            "deep": {"reasoning_effort": "high"},
+        },
+    )
+
+and LatencyProfileMiddleware (api.core.agents.latency_profile_middleware) serves each
+model call of the run with the variant of the model it was about to call: the same
+ModelConfig, built with the model's own init_model overrides updated with the profile's.
+A profile the agent leaves out (often "balanced") serves the models as built.
+
+Variants are built once and kept in a per-worker LRU keyed by ModelConfig + overrides
+(the response cache's params_fingerprint, so clients and other objects count by type),
+at most LATENCY_PROFILE_MAX_VARIANTS of them. Models share the pooled HTTP clients of
+their provider (api.core.agents.http_clients), so building a variant opens no connection,
+and the registry builds the variants of each agent's model and budget fallback model at
+startup: switching profiles costs a dict lookup on the hot path (other models, such as
+the rest of a failover chain, get theirs on first use). Models not built by init_model
+have no variants and are served as they are.
+
+Metrics: latency_profile_calls{agent,profile}, model_variants_built{model},
+model_variants_evicted (counters), model_variants (gauge).
+
+Env knobs (all optional):
+    LATENCY_PROFILE_MAX_VARIANTS   variant models kept per worker (default 64)
+"""
+
+import os
+from collections import OrderedDict
+from collections.abc import Sequence
+from traceback import format_exc
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from api.core.agents import metrics
+from api.core.agents.custom_providers import init_model, model_config_of, model_overrides_of
+from api.core.agents.response_cache import params_fingerprint
+from api.core.agents.schemas import LatencyProfile
+
+LATENCY_PROFILE_MAX_VARIANTS: int = int(os.getenv("LATENCY_PROFILE_MAX_VARIANTS", "64"))
+
+
+class LatencyProfiles:
+    """Profiles of every agent, and the LRU of variant models built for them."""
+
+    def __init__(self) -> None:
+        self._profiles: dict[str, dict[LatencyProfile, dict[str, Any]]] = {}
+        self._variants: OrderedDict[str, BaseChatModel] = OrderedDict()
+        self._collector_registered = False
+
+    def set_agent_profiles(
+        self,
+        agent_id: str,
+        profiles: dict[LatencyProfile, dict[str, Any]],
+        models: Sequence[BaseChatModel] = (),
+    ) -> None:
+        """Called by the registry for every agent; builds the variants of `models` now."""
+        if not profiles:
+            self._profiles.pop(agent_id, None)
+            return
+        self._profiles[agent_id] = profiles
+        if not self._collector_registered:
+            metrics.register_collector(self._collect_metrics)
+            self._collector_registered = True
+        for model in models:
+            for overrides in profiles.values():
+                self.variant(model, overrides)
+
+    def supported(self, agent_id: str) -> list[LatencyProfile]:
+        return sorted(self._profiles.get(agent_id, {}))
+
+    def overrides(self, agent_id: str, profile: LatencyProfile | None) -> dict[str, Any] | None:
+        """init_model overrides of `profile` on the agent, None when it has none."""
+        if profile is None:
+            return None
+        return self._profiles.get(agent_id, {}).get(profile)
+
+    def variant(self, model: BaseChatModel, overrides: dict[str, Any]) -> BaseChatModel:
+        """`model` rebuilt with `overrides` on top of its own (cached; `model` itself when
+        that changes nothing or the model wasn't built by init_model)."""
+        config = model_config_of(model)
+        if config is None or not overrides:
+            return model
+        base = model_overrides_of(model)
+        merged = {**base, **overrides}
+        if merged == base:
+            return model
+        key = params_fingerprint(config, merged)
+        variant = self._variants.get(key)
+        if variant is not None:
+            self._variants.move_to_end(key)
+            return variant
+        try:
+            variant = init_model(config, **merged)
+            metrics.increment("model_variants_built", model=config.model_id)
+        except Exception:
+            print(
+                f"[LatencyProfiles] can't build {config.provider}/{config.model_id} with "
+                f"{merged!r}; serving it as built\n{format_exc()}"
+            )
+            variant = model  # cached too: don't retry (and log) on every call
+        self._variants[key] = variant
+        while len(self._variants) > LATENCY_PROFILE_MAX_VARIANTS:
+            self._variants.popitem(last=False)
+            metrics.increment("model_variants_evicted")
+        return variant
+
+    def _collect_metrics(self) -> None:
+        metrics.set_gauge("model_variants", len(self._variants))
+
+
+latency_profiles = LatencyProfiles()
@@ -0,0 +1,107 @@
+"""Periodic database maintenance for the agents layer.
+
+Currently: keep agent_message_usage partitions ahead of time and apply retention, delete
+old agent_turn_latency rows, the provider_rate_limit_demand rows of dead workers and
+expired llm_response_cache entries.
+Runs once at startup and then every MAINTENANCE_INTERVAL_S in every worker; a Postgres
+advisory lock makes sure only one worker does the work per round.
+
+Env knobs (all optional):
+    USAGE_PARTITION_PREMAKE_MONTHS  months of partitions created ahead (default 3)
+    USAGE_RETENTION_MONTHS          detach partitions older than this (unset = keep all)
+    USAGE_RETENTION_DROP            "1" to drop detached partitions instead of keeping them
+    TURN_LATENCY_RETENTION_DAYS     delete turn latency rows older than this (default 90,
+                                    0 = keep all)
+"""
+
+import asyncio
+import contextlib
+import os
+from traceback import format_exc
+
+from api.repositories.agents.latency import delete_expired_turn_latency
+from api.repositories.agents.rate_limits import delete_stale_rate_limit_demand
+from api.repositories.agents.response_cache import delete_expired_responses
+from api.repositories.agents.usage_partitions import (
+    detach_expired_usage_partitions,
+    ensure_usage_partitions,
+)
+from config import database as database_module
+
+MAINTENANCE_INTERVAL_S: float = 6 * 60 * 60
+MAINTENANCE_LOCK_KEY: str = "agents-maintenance"
+
+USAGE_PARTITION_PREMAKE_MONTHS: int = int(os.getenv("USAGE_PARTITION_PREMAKE_MONTHS", "3"))
+USAGE_RETENTION_MONTHS: int | None = (
+    int(os.environ["USAGE_RETENTION_MONTHS"]) if os.getenv("USAGE_RETENTION_MONTHS") else None
+)
+USAGE_RETENTION_DROP: bool = os.getenv("USAGE_RETENTION_DROP", "0").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+TURN_LATENCY_RETENTION_DAYS: int = int(os.getenv("TURN_LATENCY_RETENTION_DAYS", "90"))
+# Demand rows not refreshed for this long belong to workers that died without cleanup.
+RATE_LIMIT_DEMAND_MAX_AGE_S: float = 60 * 60
+
+_maintenance_task: asyncio.Task | None = None
+
+
+async def run_usage_partition_maintenance() -> None:
+    """One maintenance round. No-op if another worker holds the lock or there is no pool."""
+    pool = getattr(database_module, "asyncpg_pool", None)
+    if pool is None:
+        return
+
+    async with pool.acquire() as conn:
+        if not await conn.fetchval(
+            "SELECT pg_try_advisory_lock(hashtextextended($1, 0))", MAINTENANCE_LOCK_KEY
+        ):
+            return
+        try:
+            created = await ensure_usage_partitions(conn, USAGE_PARTITION_PREMAKE_MONTHS)
+            expired: list[str] = []
+            if USAGE_RETENTION_MONTHS is not None:
+                expired = await detach_expired_usage_partitions(
+                    conn, USAGE_RETENTION_MONTHS, drop=USAGE_RETENTION_DROP
+                )
+            if created or expired:
+                print(f"[maintenance] usage partitions created={created} expired={expired}")
+            if TURN_LATENCY_RETENTION_DAYS > 0:
+                deleted = await delete_expired_turn_latency(conn, TURN_LATENCY_RETENTION_DAYS)
+                if deleted:
+                    print(f"[maintenance] deleted {deleted} expired turn latency rows")
+            await delete_stale_rate_limit_demand(conn, RATE_LIMIT_DEMAND_MAX_AGE_S)
+            deleted = await delete_expired_responses(conn)
+            if deleted:
+                print(f"[maintenance] deleted {deleted} expired LLM response cache rows")
+        finally:
+            await conn.execute(
+                "SELECT pg_advisory_unlock(hashtextextended($1, 0))", MAINTENANCE_LOCK_KEY
+            )
+
+
+async def _maintenance_loop() -> None:
+    while True:
+        try:
+            await run_usage_partition_maintenance()
+        except Exception:
+            print(f"[maintenance] usage partition maintenance failed\n{format_exc()}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_S)
+
+
+def start_maintenance() -> None:
+    """Start the background maintenance loop (called at startup)."""
+    global _maintenance_task
+    if _maintenance_task is None:
+        _maintenance_task = asyncio.create_task(_maintenance_loop())
+
+
+async def stop_maintenance() -> None:
+    """Cancel the background maintenance loop (called at shutdown)."""
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _maintenance_task
+        _maintenance_task = None
@@ -0,0 +1,165 @@
+"""Load the model catalog from a TOML/JSON file and/or the model_catalog table, hot.
+
+The built-in Models registry (api.core.agents.models) is always the base. External entries
+are overlaid per (canonical provider, model_id):
+    - entry for a known model   -> only the given fields change (e.g. a new price)
+    - entry for an unknown model -> a new ModelConfig (must be complete enough to build one)
+    - enabled = false            -> the model is removed from the catalog
+The table wins over the file when both define the same model.
+
+Each worker polls every MODEL_CATALOG_RELOAD_INTERVAL_S (file mtime, table row count +
+max(updated_at)) and rebuilds the index only when something changed; the swap is atomic.
+Prices feed compute_cost_usd right away. Capabilities of models already instantiated by
+init_model at import time (max_tokens etc.) are not re-applied — those need a restart.
+
+File format (TOML; JSON is the same list under "models" or a bare list):
+
+    [[models]]
+    provider = "groq"
+    model_id = "openai/gpt-oss-120b"
+    input_price_per_1m = 0.15
+    rpm_limit = 1000
+
+Env knobs (all optional):
+    MODEL_CATALOG_PATH               TOML/JSON file to overlay
+    MODEL_CATALOG_FROM_DB            "1" to overlay the model_catalog table
+    MODEL_CATALOG_RELOAD_INTERVAL_S  poll interval (default 30)
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import json
+import os
+import tomllib
+from pathlib import Path
+from traceback import format_exc
+from typing import Any
+
+from api.core.agents import metrics
+from api.core.agents.models import (
+    MODEL_CONFIG_FIELDS,
+    ModelConfig,
+    builtin_model_configs,
+    canonical_provider,
+    model_catalog,
+)
+from api.repositories.agents.model_catalog import (
+    get_model_catalog_entries,
+    get_model_catalog_version,
+)
+from config import database as database_module
+
+MODEL_CATALOG_PATH: Path | None = (
+    Path(os.environ["MODEL_CATALOG_PATH"]) if os.getenv("MODEL_CATALOG_PATH") else None
+)
+MODEL_CATALOG_FROM_DB: bool = os.getenv("MODEL_CATALOG_FROM_DB", "0").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+MODEL_CATALOG_RELOAD_INTERVAL_S: float = float(os.getenv("MODEL_CATALOG_RELOAD_INTERVAL_S", "30"))
+
+_watch_task: asyncio.Task | None = None
+_loaded_version: tuple[Any, Any] | None = None
+
+
+def load_catalog_file(path: Path) -> list[dict[str, Any]]:
+    """Read catalog entries from a .toml or .json file."""
+    raw = path.read_bytes()
+    data: Any = tomllib.loads(raw.decode()) if path.suffix == ".toml" else json.loads(raw)
+    entries = data.get("models", []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a list of models")
+    return entries
+
+
+def build_catalog(entries: list[dict[str, Any]]) -> list[ModelConfig]:
+    """Overlay external entries on the built-in registry. Raises ValueError on bad entries."""
+    index = {cfg.key: cfg for cfg in builtin_model_configs()}
+    for entry in entries:
+        fields = dict(entry)
+        enabled = fields.pop("enabled", True)
+        if not fields.get("provider") or not fields.get("model_id"):
+            raise ValueError(f"catalog entry without provider/model_id: {entry}")
+        unknown = set(fields) - MODEL_CONFIG_FIELDS
+        if unknown:
+            raise ValueError(f"unknown ModelConfig fields {sorted(unknown)} in {entry}")
+        fields["provider"] = canonical_provider(str(fields["provider"]))
+        key = (fields["provider"], fields["model_id"])
+        if not enabled:
+            index.pop(key, None)
+        elif key in index:
+            index[key] = dataclasses.replace(index[key], **fields)
+        else:
+            index[key] = ModelConfig(**fields)
+    return list(index.values())
+
+
+async def _current_version() -> tuple[Any, Any]:
+    file_version = None
+    if MODEL_CATALOG_PATH is not None and MODEL_CATALOG_PATH.exists():
+        file_version = MODEL_CATALOG_PATH.stat().st_mtime_ns
+    db_version = None
+    pool = getattr(database_module, "asyncpg_pool", None)
+    if MODEL_CATALOG_FROM_DB and pool is not None:
+        async with pool.acquire() as conn:
+            db_version = await get_model_catalog_version(conn)
+    return file_version, db_version
+
+
+async def reload_model_catalog() -> int:
+    """Rebuild the catalog from built-ins + file + table. Returns the number of models.
+
+    On any error the current catalog is kept and the error propagates.
+    """
+    global _loaded_version
+    version = await _current_version()
+    entries: list[dict[str, Any]] = []
+    if MODEL_CATALOG_PATH is not None and MODEL_CATALOG_PATH.exists():
+        entries += load_catalog_file(MODEL_CATALOG_PATH)
+    pool = getattr(database_module, "asyncpg_pool", None)
+    if MODEL_CATALOG_FROM_DB and pool is not None:
+        async with pool.acquire() as conn:
+            entries += await get_model_catalog_entries(conn)
+
+    model_catalog.replace(build_catalog(entries))
+    _loaded_version = version
+    metrics.increment("model_catalog_reloads")
+    metrics.set_gauge("model_catalog_models", len(model_catalog))
+    return len(model_catalog)
+
+
+async def _watch_loop() -> None:
+    while True:
+        await asyncio.sleep(MODEL_CATALOG_RELOAD_INTERVAL_S)
+        try:
+            if await _current_version() != _loaded_version:
+                count = await reload_model_catalog()
+                print(f"[model_catalog] reloaded ({count} models)")
+        except Exception:
+            metrics.increment("model_catalog_reload_failures")
+            print(f"[model_catalog] reload failed, keeping previous catalog\n{format_exc()}")
+
+
+async def start_model_catalog() -> None:
+    """Initial load + background watcher (called at startup). Never fails startup."""
+    global _watch_task
+    if MODEL_CATALOG_PATH is None and not MODEL_CATALOG_FROM_DB:
+        return
+    try:
+        await reload_model_catalog()
+    except Exception:
+        metrics.increment("model_catalog_reload_failures")
+        print(f"[model_catalog] initial load failed, using built-in models\n{format_exc()}")
+    if _watch_task is None:
+        _watch_task = asyncio.create_task(_watch_loop())
+
+
+async def stop_model_catalog() -> None:
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _watch_task
+        _watch_task = None
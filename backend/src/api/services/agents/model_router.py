@@ -0,0 +1,241 @@
+"""Latency- and cost-aware choice of a model among a pool of equivalent ones.
+
+ModelRouterMiddleware (api.core.agents.router_middleware) asks `model_router.rank()`
+which model of its pool should serve each call. The ranking comes from a scoreboard of
+every routed call in this worker, per provider/model:
+
+    ttft_s          time to first token
+    tokens_per_s    output tokens / (end - first token)
+    output_tokens   size of the answers, for the expected cost and generation time
+    error_rate      share of calls failing with 429 / 5xx / timeout / connection error
+
+Each is an exponentially decayed average (half-life ROUTER_HALF_LIFE_S): recent calls
+dominate, and a model that gets no traffic slowly loses its weight and with it the
+router's confidence in its numbers. Price comes from the catalog (hot-reloaded; a model
+without prices counts as free and is logged once), with the prompt size of the call and
+the model's usual answer size:
+
+    expected latency = (ttft_s + output_tokens / tokens_per_s) / (1 - error_rate)
+    expected cost    = (prompt tokens * input price + output_tokens * output price)
+                       / (1 - error_rate)
+
+Models with no data yet take the pool's average (or the defaults below). RoutingObjective
+picks the order:
+
+    RoutingObjective(goal="latency")                fastest first
+    RoutingObjective(goal="cost")                   cheapest first
+    RoutingObjective(goal="cost", max_cost_usd=0.002, latency_target_s=3)
+        only models under the per-call cost cap (all of them if none is); the cheapest
+        one meeting the latency target first, then the others fastest first
+    RoutingObjective(goal="latency", max_cost_usd=0.002)
+        fastest under the cap first
+
+Exploration: the call goes to the least known other model of the pool (lowest decayed
+weight) instead of the best one when that model has no recent data at all (never tried,
+or its last sample is more than a half-life old), and otherwise with probability
+ROUTER_EXPLORE_RATE, so the scoreboard notices when a provider gets faster or cheaper.
+The rest of the ranking is the failover order of the call.
+
+Metrics: router_choices{model,reason=best|explore} (counter); router_ttft_s,
+router_tokens_per_s, router_error_rate, router_weight (gauges, labelled model).
+
+Env knobs (all optional):
+    ROUTER_HALF_LIFE_S      half-life of scoreboard samples (default 300)
+    ROUTER_EXPLORE_RATE     share of calls sent to another model to learn (default 0.05)
+"""
+
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Literal
+
+from api.core.agents import metrics
+from api.core.agents.models import ModelConfig, find_model_config, warn_if_unpriced
+
+ROUTER_HALF_LIFE_S: float = float(os.getenv("ROUTER_HALF_LIFE_S", "300"))
+ROUTER_EXPLORE_RATE: float = float(os.getenv("ROUTER_EXPLORE_RATE", "0.05"))
+
+# Used while neither the model nor its pool has data.
+_DEFAULT_TTFT_S = 1.0
+_DEFAULT_TOKENS_PER_S = 50.0
+_DEFAULT_OUTPUT_TOKENS = 512.0
+# Decayed weight under which a model's numbers are too old to trust: it gets the next call.
+_STALE_WEIGHT = 0.5
+# Error rate cap in the expected-value penalty (a model failing every call is still ranked).
+_MAX_ERROR_RATE = 0.9
+
+
+@dataclass(frozen=True)
+class RoutingObjective:
+    """What a model pool optimizes per call (see module docstring)."""
+
+    goal: Literal["latency", "cost"] = "latency"
+    max_cost_usd: float | None = None  # per call
+    latency_target_s: float | None = None  # only with goal="cost"
+
+
+class _Decayed:
+    """Exponentially decayed mean (half-life ROUTER_HALF_LIFE_S)."""
+
+    def __init__(self) -> None:
+        self.weight = 0.0
+        self.total = 0.0
+        self._at = time.monotonic()
+
+    def _decay(self, now: float) -> None:
+        factor = 0.5 ** ((now - self._at) / ROUTER_HALF_LIFE_S)
+        self.weight *= factor
+        self.total *= factor
+        self._at = now
+
+    def add(self, value: float, now: float) -> None:
+        self._decay(now)
+        self.weight += 1.0
+        self.total += value
+
+    def mean(self, now: float) -> float | None:
+        self._decay(now)
+        return self.total / self.weight if self.weight > 0 else None
+
+
+class ModelScore:
+    """Scoreboard entry of one provider/model in this worker."""
+
+    def __init__(self) -> None:
+        self.ttft_s = _Decayed()
+        self.tokens_per_s = _Decayed()
+        self.output_tokens = _Decayed()
+        self.errors = _Decayed()
+
+    def observe(self, ttft_s: float, output_tokens: int, generation_s: float, now: float) -> None:
+        self.ttft_s.add(ttft_s, now)
+        self.errors.add(0.0, now)
+        if output_tokens > 0:
+            self.output_tokens.add(output_tokens, now)
+            if generation_s > 0:
+                self.tokens_per_s.add(output_tokens / generation_s, now)
+
+    def observe_error(self, now: float) -> None:
+        self.errors.add(1.0, now)
+
+
+class _Estimate:
+    def __init__(self, index: int, latency_s: float, cost_usd: float) -> None:
+        self.index = index
+        self.latency_s = latency_s
+        self.cost_usd = cost_usd
+
+
+class ModelRouter:
+    """Live scoreboard of the routed models and the ranking built from it."""
+
+    def __init__(self) -> None:
+        self._scores: dict[tuple[str, str], ModelScore] = {}
+        self._collector_registered = False
+
+    def score_for(self, config: ModelConfig) -> ModelScore:
+        score = self._scores.get(config.key)
+        if score is None:
+            score = self._scores[config.key] = ModelScore()
+            if not self._collector_registered:
+                metrics.register_collector(self._collect_metrics)
+                self._collector_registered = True
+        return score
+
+    def observe(
+        self, config: ModelConfig, ttft_s: float, output_tokens: int, generation_s: float
+    ) -> None:
+        """A routed call of `config` succeeded."""
+        self.score_for(config).observe(ttft_s, output_tokens, generation_s, time.monotonic())
+
+    def observe_error(self, config: ModelConfig) -> None:
+        """A routed call of `config` failed with an overload / provider error."""
+        self.score_for(config).observe_error(time.monotonic())
+
+    def _estimates(self, configs: list[ModelConfig], prompt_tokens: int) -> list[_Estimate]:
+        now = time.monotonic()
+        means = [
+            (
+                score.ttft_s.mean(now),
+                score.tokens_per_s.mean(now),
+                score.output_tokens.mean(now),
+                score.errors.mean(now),
+            )
+            for score in (self.score_for(config) for config in configs)
+        ]
+
+        def pool_mean(i: int, default: float) -> float:
+            known = [m[i] for m in means if m[i] is not None]
+            return sum(known) / len(known) if known else default
+
+        fallback = (
+            pool_mean(0, _DEFAULT_TTFT_S),
+            pool_mean(1, _DEFAULT_TOKENS_PER_S),
+            pool_mean(2, _DEFAULT_OUTPUT_TOKENS),
+        )
+        estimates = []
+        for index, (config, (ttft, tps, out, errors)) in enumerate(
+            zip(configs, means, strict=True)
+        ):
+            ttft = ttft if ttft is not None else fallback[0]
+            tps = tps if tps is not None else fallback[1]
+            out = out if out is not None else fallback[2]
+            retries = 1 - min(errors or 0.0, _MAX_ERROR_RATE)
+            priced = find_model_config(config.provider, config.model_id) or config
+            warn_if_unpriced(priced)
+            cost = (
+                prompt_tokens * priced.input_price_per_1m + out * priced.output_price_per_1m
+            ) / 1_000_000
+            estimates.append(
+                _Estimate(index, (ttft + out / max(tps, 1e-6)) / retries, cost / retries)
+            )
+        return estimates
+
+    def rank(
+        self, configs: list[ModelConfig], objective: RoutingObjective, prompt_tokens: int
+    ) -> list[int]:
+        """Indexes of `configs` in the order they should serve a call of `prompt_tokens`."""
+        if len(configs) <= 1:
+            return list(range(len(configs)))
+        estimates = self._estimates(configs, prompt_tokens)
+        pool = estimates
+        if objective.max_cost_usd is not None:
+            pool = [e for e in estimates if e.cost_usd <= objective.max_cost_usd] or estimates
+
+        by_latency = sorted(pool, key=lambda e: (e.latency_s, e.cost_usd))
+        if objective.goal == "cost":
+            target = objective.latency_target_s
+            meeting = [e for e in pool if target is None or e.latency_s <= target]
+            first = sorted(meeting, key=lambda e: (e.cost_usd, e.latency_s))
+            ordered = first + [e for e in by_latency if e not in first]
+        else:
+            ordered = by_latency
+        ordered += [e for e in sorted(estimates, key=lambda e: e.latency_s) if e not in ordered]
+        order = [e.index for e in ordered]
+
+        reason = "best"
+        # Weights were just decayed by _estimates().
+        explored = min(order[1:], key=lambda i: self.score_for(configs[i]).ttft_s.weight)
+        stale = self.score_for(configs[explored]).ttft_s.weight < _STALE_WEIGHT
+        if stale or random.random() < ROUTER_EXPLORE_RATE:
+            order.remove(explored)
+            order.insert(0, explored)
+            reason = "explore"
+        best = configs[order[0]]
+        metrics.increment("router_choices", model=f"{best.provider}/{best.model_id}", reason=reason)
+        return order
+
+    def _collect_metrics(self) -> None:
+        now = time.monotonic()
+        for (provider, model_id), score in self._scores.items():
+            model = f"{provider}/{model_id}"
+            metrics.set_gauge("router_ttft_s", score.ttft_s.mean(now) or 0.0, model=model)
+            metrics.set_gauge(
+                "router_tokens_per_s", score.tokens_per_s.mean(now) or 0.0, model=model
+            )
+            metrics.set_gauge("router_error_rate", score.errors.mean(now) or 0.0, model=model)
+            metrics.set_gauge("router_weight", score.ttft_s.weight, model=model)
+
+
+model_router = ModelRouter()
@@ -0,0 +1,371 @@
+"""Provider rate limits: RPM / TPM token buckets per (provider, model_id), with a fair queue.
+
+Providers (Groq, Chutes, ...) answer 429 once the account goes over its requests- or
+tokens-per-minute limit; the stream fails, the user retries and the load doubles. Instead,
+every LLM call made through rate_limit_middleware first takes
+
+    1 request    from the model's RPM bucket (ModelConfig.rpm_limit)
+    N tokens     from its TPM bucket (ModelConfig.tpm_limit), N = approximate prompt
+                 tokens + RATE_LIMIT_OUTPUT_TOKENS, corrected with the reported usage
+                 once the call returns
+
+and waits while a bucket is empty. A bucket holds at most one minute of budget and refills
+continuously. Limits come from the model catalog (Models registry, catalog file or
+model_catalog table), so they can be changed at runtime. Models without limits never wait.
+
+Queue: the waiters of a model are served round-robin across users (client or thread when
+there is no user) and FIFO within a user, so one user's burst can't starve the others and
+a large prompt is never overtaken forever by small ones. A call that can't start within
+RATE_LIMIT_MAX_WAIT_S fails with RateLimitTimeoutError.
+
+Across Granian workers every worker owns a share of each limit. Every
+RATE_LIMIT_SYNC_INTERVAL_S it writes its demand (requests and tokens per minute asked for)
+to provider_rate_limit_demand and reads the other workers' back; its share is
+
+    0.1 / workers + 0.9 * own demand / total demand
+
+so shares follow the load, never drop below a floor and always add up to the whole limit.
+Workers seen within the last 3 intervals are live. A model this worker hasn't used yet
+starts at an equal share; without a database the worker assumes it is alone. A 429 that
+still gets through (the account is shared with something else) empties the model's
+buckets in this worker.
+
+Metrics, labelled provider / model: rate_limit_waits, rate_limit_wait_seconds,
+rate_limit_timeouts, rate_limit_provider_429 (counters), rate_limit_queue_depth,
+rate_limit_share_rpm, rate_limit_share_tpm (gauges, per-minute budget of this worker).
+
+Env knobs (all optional):
+    RATE_LIMIT_MAX_WAIT_S         longest wait in the queue (default 30)
+    RATE_LIMIT_OUTPUT_TOKENS      expected output tokens added to estimates (default 1024)
+    RATE_LIMIT_SYNC_INTERVAL_S    cross-worker share refresh (default 5)
+"""
+
+import asyncio
+import contextlib
+import math
+import os
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
+from traceback import format_exc
+
+from api.core.agents import metrics
+from api.core.agents.models import ModelConfig
+from api.repositories.agents.rate_limits import (
+    HEARTBEAT_KEY,
+    delete_worker_rate_limit_demand,
+    get_rate_limit_demand,
+    upsert_rate_limit_demand,
+)
+from config import database as database_module
+
+RATE_LIMIT_MAX_WAIT_S: float = float(os.getenv("RATE_LIMIT_MAX_WAIT_S", "30"))
+RATE_LIMIT_OUTPUT_TOKENS: int = int(os.getenv("RATE_LIMIT_OUTPUT_TOKENS", "1024"))
+RATE_LIMIT_SYNC_INTERVAL_S: float = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL_S", "5"))
+
+# Part of every limit split evenly between live workers, whatever their demand.
+_SHARE_FLOOR = 0.1
+# Weight of the latest interval in the demand moving average.
+_DEMAND_ALPHA = 0.5
+
+_ModelKey = tuple[str, str]
+
+
+class RateLimitTimeoutError(Exception):
+    """Raised when a model call waited RATE_LIMIT_MAX_WAIT_S without getting through."""
+
+
+class _Bucket:
+    """Token bucket holding up to one minute of `per_minute`, refilled continuously."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self._updated, 0.0)
+        self.level = min(self.per_minute, self.level + elapsed * self.per_minute / 60)
+        self._updated = now
+
+    def set_rate(self, per_minute: float, now: float) -> None:
+        self._refill(now)
+        self.per_minute = per_minute
+        self.level = min(self.level, per_minute)
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken. More than a minute's worth waits for a
+        full bucket (and leaves it in debt), so oversized requests still go through."""
+        self._refill(now)
+        amount = min(amount, self.per_minute)
+        if self.level >= amount:
+            return 0.0
+        if self.per_minute <= 0:
+            return math.inf
+        return (amount - self.level) * 60 / self.per_minute
+
+    def adjust(self, delta: float) -> None:
+        self.level = min(self.per_minute, self.level + delta)
+
+    def drain(self) -> None:
+        self.level = min(self.level, 0.0)
+
+
+@dataclass
+class _Waiter:
+    tokens: int
+    future: asyncio.Future[None]
+
+
+class ModelRateLimiter:
+    """RPM/TPM buckets and the fair wait queue of one (provider, model_id) in this worker."""
+
+    def __init__(self, config: ModelConfig, share: float = 1.0) -> None:
+        self.provider, self.model_id = config.key
+        self.rpm_limit = config.rpm_limit
+        self.tpm_limit = config.tpm_limit
+        self.share = (share, share)  # (rpm, tpm) fraction of the limits owned by this worker
+        self._requests = _Bucket(self.rpm_limit * share) if self.rpm_limit else None
+        self._tokens = _Bucket(self.tpm_limit * share) if self.tpm_limit else None
+        # tenant -> waiters; dict order is the round-robin order
+        self._queues: dict[str, deque[_Waiter]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._asked = [0.0, 0.0]  # requests, tokens asked for since the last sync
+        self.demand = (0.0, 0.0)  # moving average, per minute
+
+    @property
+    def labels(self) -> dict[str, str]:
+        return {"provider": self.provider, "model": self.model_id}
+
+    def configure(self, config: ModelConfig) -> None:
+        """Pick up new limits after a catalog reload."""
+        if (config.rpm_limit, config.tpm_limit) == (self.rpm_limit, self.tpm_limit):
+            return
+        self.rpm_limit, self.tpm_limit = config.rpm_limit, config.tpm_limit
+        if self.rpm_limit and self._requests is None:
+            self._requests = _Bucket(0.0)
+        if self.tpm_limit and self._tokens is None:
+            self._tokens = _Bucket(0.0)
+        self.set_share(*self.share)
+
+    def set_share(self, rpm_share: float, tpm_share: float) -> None:
+        now = time.monotonic()
+        self.share = (rpm_share, tpm_share)
+        if self._requests is not None:
+            self._requests.set_rate((self.rpm_limit or 0) * rpm_share, now)
+            metrics.set_gauge("rate_limit_share_rpm", self._requests.per_minute, **self.labels)
+        if self._tokens is not None:
+            self._tokens.set_rate((self.tpm_limit or 0) * tpm_share, now)
+            metrics.set_gauge("rate_limit_share_tpm", self._tokens.per_minute, **self.labels)
+        if self._queues:
+            self._pump()
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = self._requests.wait_time(1, now)
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.wait_time(tokens, now))
+        return wait
+
+    def _take(self, tokens: int) -> None:
+        if self._requests is not None:
+            self._requests.adjust(-1)
+        if self._tokens is not None:
+            self._tokens.adjust(-tokens)
+
+    def refund(self, tokens: int) -> None:
+        """Give back a request and `tokens` taken by acquire() for a call that didn't happen."""
+        if self._requests is not None:
+            self._requests.adjust(1)
+        if self._tokens is not None:
+            self._tokens.adjust(tokens)
+        if self._queues:
+            self._pump()
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _pump(self) -> None:
+        """Grant waiters in round-robin order while the buckets allow; otherwise schedule
+        the next attempt for when the head waiter's budget will have refilled."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._queues:
+            tenant = next(iter(self._queues))
+            queue = self._queues[tenant]
+            waiter = queue[0]
+            if waiter.future.done():  # timed out or cancelled
+                queue.popleft()
+                if not queue:
+                    del self._queues[tenant]
+                continue
+            wait_s = self._wait_time(waiter.tokens, now)
+            if wait_s > 0:
+                if wait_s < math.inf:
+                    self._timer = asyncio.get_running_loop().call_later(wait_s, self._pump)
+                break
+            self._take(waiter.tokens)
+            queue.popleft()
+            waiter.future.set_result(None)
+            # The tenant goes to the back of the line.
+            del self._queues[tenant]
+            if queue:
+                self._queues[tenant] = queue
+        metrics.set_gauge("rate_limit_queue_depth", self.queued(), **self.labels)
+
+    async def acquire(self, tokens: int, tenant: str, timeout: float) -> float:
+        """Wait for one request and `tokens` tokens of budget. Returns the seconds waited.
+
+        Raises RateLimitTimeoutError after `timeout` seconds.
+        """
+        self._asked[0] += 1
+        self._asked[1] += tokens
+        started = time.monotonic()
+        if not self._queues and self._wait_time(tokens, started) == 0:
+            self._take(tokens)
+            return 0.0
+
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(tenant, deque()).append(waiter)
+        metrics.increment("rate_limit_waits", **self.labels)
+        self._pump()
+        try:
+            await asyncio.wait((waiter.future,), timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self.refund(tokens)
+            else:
+                waiter.future.cancel()
+                self._pump()
+            raise
+        waited = time.monotonic() - started
+        metrics.increment("rate_limit_wait_seconds", waited, **self.labels)
+        if not waiter.future.done():
+            waiter.future.cancel()
+            self._pump()
+            metrics.increment("rate_limit_timeouts", **self.labels)
+            raise RateLimitTimeoutError(
+                f"Rate limit of {self.provider}/{self.model_id}: no capacity after "
+                f"{waited:.1f}s in queue"
+            )
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the TPM bucket once the provider reported the real usage."""
+        if self._tokens is not None and actual_tokens > 0:
+            self._tokens.adjust(estimated_tokens - actual_tokens)
+            if self._queues:
+                self._pump()
+
+    def penalize(self) -> None:
+        """The provider answered 429 anyway: stop sending until the buckets refill."""
+        metrics.increment("rate_limit_provider_429", **self.labels)
+        for bucket in (self._requests, self._tokens):
+            if bucket is not None:
+                bucket.drain()
+
+    def take_demand(self, elapsed_s: float) -> tuple[float, float]:
+        """Update and return the (requests, tokens) per minute moving average."""
+        rate = [asked * 60 / elapsed_s for asked in self._asked]
+        self._asked = [0.0, 0.0]
+        self.demand = (
+            (1 - _DEMAND_ALPHA) * self.demand[0] + _DEMAND_ALPHA * rate[0],
+            (1 - _DEMAND_ALPHA) * self.demand[1] + _DEMAND_ALPHA * rate[1],
+        )
+        return self.demand
+
+
+def _share(own: float, total: float, workers: int) -> float:
+    if total <= 0:
+        return 1 / workers
+    return _SHARE_FLOOR / workers + (1 - _SHARE_FLOOR) * own / total
+
+
+class RateLimiter:
+    """Every ModelRateLimiter of this worker, and the loop that syncs their shares."""
+
+    def __init__(self) -> None:
+        self._limiters: dict[_ModelKey, ModelRateLimiter] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._workers = 1  # live workers at the last sync
+        self._last_sync = time.monotonic()
+        self._task: asyncio.Task | None = None
+
+    def limiter_for(self, config: ModelConfig) -> ModelRateLimiter | None:
+        """The limiter of `config`, or None when the model has no RPM/TPM limit."""
+        if not config.rpm_limit and not config.tpm_limit:
+            return None
+        limiter = self._limiters.get(config.key)
+        if limiter is None:
+            limiter = ModelRateLimiter(config, share=1 / self._workers)
+            self._limiters[config.key] = limiter
+        else:
+            limiter.configure(config)
+        return limiter
+
+    async def sync(self) -> None:
+        """Publish this worker's demand and recompute its share of every limit."""
+        pool = getattr(database_module, "asyncpg_pool", None)
+        if pool is None:
+            return
+        now = time.monotonic()
+        elapsed = max(now - self._last_sync, 1e-3)
+        self._last_sync = now
+        demand = {key: limiter.take_demand(elapsed) for key, limiter in self._limiters.items()}
+        async with pool.acquire() as conn:
+            await upsert_rate_limit_demand(conn, self.worker_id, demand)
+            rows = await get_rate_limit_demand(conn, 3 * RATE_LIMIT_SYNC_INTERVAL_S)
+
+        workers = {row["worker_id"] for row in rows} | {self.worker_id}
+        self._workers = len(workers)
+        totals: dict[_ModelKey, list[float]] = {}
+        for row in rows:
+            key = (row["provider"], row["model_id"])
+            if key == HEARTBEAT_KEY:
+                continue
+            entry = totals.setdefault(key, [0.0, 0.0])
+            entry[0] += row["requests_per_min"]
+            entry[1] += row["tokens_per_min"]
+        for key, limiter in self._limiters.items():
+            total = totals.get(key, [0.0, 0.0])
+            own = demand[key]
+            limiter.set_share(
+                _share(own[0], total[0], self._workers),
+                _share(own[1], total[1], self._workers),
+            )
+        metrics.set_gauge("rate_limit_workers", self._workers)
+
+    async def _sync_loop(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                metrics.increment("rate_limit_sync_failures")
+                print(f"[RateLimiter] sync failed\n{format_exc()}")
+            await asyncio.sleep(RATE_LIMIT_SYNC_INTERVAL_S)
+
+    def start(self) -> None:
+        """Start the cross-worker share sync (called at startup)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        """Stop syncing and hand this worker's shares back to the others."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        pool = getattr(database_module, "asyncpg_pool", None)
+        if pool is not None:
+            with contextlib.suppress(Exception):
+                async with pool.acquire() as conn:
+                    await delete_worker_rate_limit_demand(conn, self.worker_id)
+
+
+rate_limiter = RateLimiter()
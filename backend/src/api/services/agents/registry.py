@@ -4,6 +4,10 @@ from typing import Any
 from api.core.agents.callbacks import usage_recorder
 from api.core.agents.checkpointer import get_checkpointer
 from api.core.agents.schemas import serialize_suggestions_for_api
+from api.services.agents.brownout import brownout
+from api.services.agents.budgets import budget_ledger
+from api.services.agents.latency_profiles import latency_profiles
+from api.services.agents.semantic_cache import semantic_cache
 from config import paths
 
 agents_registry: dict[str, Any] = {}
@@ -49,12 +53,34 @@ def discover_agents() -> dict[str, Any]:
             # Single global callback persists agent_message_usage for ANY invocation path.
             agent = agent.with_config(callbacks=[usage_recorder])
 
+            budget_ledger.set_agent_budget(model_id, agent_config.budget)
+            semantic_cache.set_agent_policy(model_id, agent_config.semantic_cache)
+            brownout.set_agent_policy(model_id, agent_config.brownout)
+            latency_profiles.set_agent_profiles(
+                model_id,
+                agent_config.latency_profiles,
+                [
+                    model
+                    for model in (
+                        agent_config.model,
+                        agent_config.budget.fallback_model if agent_config.budget else None,
+                        agent_config.brownout.fallback_model if agent_config.brownout else None,
+                    )
+                    if model is not None
+                ],
+            )
+
             agents[model_id] = {
                 "agent": agent,
                 "name": agent_config.name,
                 "description": agent_config.description,
                 "suggestions": serialize_suggestions_for_api(agent_config.suggestions),
                 "save_to_db": agent_config.save_to_db,
+                # Only meaningful when a checkpointer is attached (LangGraph warns otherwise).
+                "durability": agent_config.durability if cp is not None else None,
+                "history_source": agent_config.history_source if cp is not None else "chat_history",
+                "concurrency_policy": agent_config.concurrency_policy,
+                "latency_profiles": latency_profiles.supported(model_id),
             }
         except Exception:
             pass
@@ -0,0 +1,239 @@
+"""Per-thread run serialization: at most one agent run per `session_id` at a time.
+
+Two requests for the same thread (double-submit, two tabs) would otherwise load the same
+checkpoint, call the LLM twice and race on the chat_history read-modify-write, silently
+losing one turn. Every run takes a lease on its thread first:
+
+- In-process: one `asyncio.Lock` per thread (FIFO, so queued turns keep their order).
+- Across Granian workers: a session-level Postgres advisory lock held for the whole run,
+  on the connection the request already holds when the caller passes it (`conn=`), else
+  on a dedicated pool connection. Without a pool only the in-process lock applies.
+
+What a second request does is the agent's `AgentConfig.concurrency_policy`:
+    queue  -> wait for the in-flight run to finish, then run its own turn
+    reject -> 409 while the thread is busy
+    join   -> replay + follow the in-flight run's SSE stream (same worker only; a run
+              owned by another worker can't be followed, so that case is a 409 too)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import asyncpg
+
+from config import database as database_module
+
+# How long a queued turn waits for the thread before giving up.
+QUEUE_WAIT_TIMEOUT_S: float = 120.0
+ADVISORY_LOCK_NAMESPACE: str = "agent-run:"
+
+
+class ThreadBusyError(Exception):
+    """Raised when a thread already has a run in flight and the caller won't wait."""
+
+    def __init__(self, thread_id: str) -> None:
+        super().__init__(f"Thread '{thread_id}' already has a run in progress")
+        self.thread_id = thread_id
+
+
+class InFlightRun:
+    """Replay buffer + fan-out of the chunks produced by the run that owns a thread."""
+
+    def __init__(self) -> None:
+        self.chunks: list[str] = []
+        self.done = False
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncGenerator[str]:
+        """Yield every chunk published so far, then the live ones until the run ends."""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                return
+            await changed.wait()
+
+
+class ThreadRunLease:
+    """Exclusive right to run a thread. Use as `async with lease:`; releases both locks."""
+
+    def __init__(
+        self,
+        coordinator: ThreadRunCoordinator,
+        thread_id: str,
+        run: InFlightRun,
+        conn: asyncpg.Connection | None,
+        owns_conn: bool,
+    ) -> None:
+        self._coordinator = coordinator
+        self.thread_id = thread_id
+        self.run = run
+        self._conn = conn
+        self._owns_conn = owns_conn
+
+    def publish(self, chunk: str) -> None:
+        self.run.publish(chunk)
+
+    async def __aenter__(self) -> ThreadRunLease:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._coordinator.release(self, self._conn, owns_conn=self._owns_conn)
+
+
+class ThreadRunCoordinator:
+    def __init__(self) -> None:
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._waiters: dict[str, int] = {}
+        self._runs: dict[str, InFlightRun] = {}
+
+    def in_flight(self) -> int:
+        """Runs holding a thread lease on this worker."""
+        return len(self._runs)
+
+    def follow(self, thread_id: str) -> AsyncGenerator[str] | None:
+        """Stream of the in-flight run of a thread on this worker, or None."""
+        run = self._runs.get(thread_id)
+        return run.follow() if run is not None else None
+
+    async def is_busy(self, thread_id: str, *, conn: asyncpg.Connection | None = None) -> bool:
+        """True if any worker is running the thread (one round trip when idle locally)."""
+        if thread_id in self._runs:
+            return True
+        if conn is not None:
+            return await self._probe_advisory_lock(thread_id, conn)
+        pool = getattr(database_module, "asyncpg_pool", None)
+        if pool is None:
+            return False
+        async with pool.acquire() as pool_conn:
+            return await self._probe_advisory_lock(thread_id, pool_conn)
+
+    @staticmethod
+    async def _probe_advisory_lock(thread_id: str, conn: asyncpg.Connection) -> bool:
+        key = ADVISORY_LOCK_NAMESPACE + thread_id
+        if not await conn.fetchval("SELECT pg_try_advisory_lock(hashtextextended($1, 0))", key):
+            return True
+        await conn.execute("SELECT pg_advisory_unlock(hashtextextended($1, 0))", key)
+        return False
+
+    async def acquire(
+        self, thread_id: str, *, wait: bool, conn: asyncpg.Connection | None = None
+    ) -> ThreadRunLease:
+        """Take the thread's lease. Raises ThreadBusyError if busy and `wait` is False
+        (or if it is still busy after QUEUE_WAIT_TIMEOUT_S, both locks' waits included).
+
+        `conn`: a connection the caller holds for the whole run, to take the advisory lock
+        on instead of a second pool connection.
+        """
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        if lock.locked() and not wait:
+            raise ThreadBusyError(thread_id)
+
+        deadline = time.monotonic() + QUEUE_WAIT_TIMEOUT_S
+        self._waiters[thread_id] = self._waiters.get(thread_id, 0) + 1
+        try:
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=QUEUE_WAIT_TIMEOUT_S)
+            except TimeoutError as e:
+                raise ThreadBusyError(thread_id) from e
+        finally:
+            self._waiters[thread_id] -= 1
+
+        owns_conn = conn is None
+        try:
+            conn = await self._acquire_advisory_lock(
+                thread_id,
+                timeout=max(deadline - time.monotonic(), 0.0) if wait else None,
+                conn=conn,
+            )
+        except BaseException:
+            self._release_local(thread_id, lock)
+            raise
+
+        run = InFlightRun()
+        self._runs[thread_id] = run
+        return ThreadRunLease(self, thread_id, run, conn, owns_conn)
+
+    async def release(
+        self, lease: ThreadRunLease, conn: asyncpg.Connection | None, *, owns_conn: bool = True
+    ) -> None:
+        lease.run.close()
+        if self._runs.get(lease.thread_id) is lease.run:
+            del self._runs[lease.thread_id]
+        try:
+            if conn is not None:
+                await self._release_advisory_lock(lease.thread_id, conn, owns_conn=owns_conn)
+        finally:
+            self._release_local(lease.thread_id, self._locks[lease.thread_id])
+
+    def _release_local(self, thread_id: str, lock: asyncio.Lock) -> None:
+        lock.release()
+        if not self._waiters.get(thread_id):
+            self._waiters.pop(thread_id, None)
+            self._locks.pop(thread_id, None)
+
+    async def _acquire_advisory_lock(
+        self, thread_id: str, *, timeout: float | None, conn: asyncpg.Connection | None = None
+    ) -> asyncpg.Connection | None:
+        """Take the advisory lock, waiting up to `timeout` seconds (None or 0: don't wait)."""
+        pool = getattr(database_module, "asyncpg_pool", None)
+        if pool is None:
+            return None
+
+        owns_conn = conn is None
+        if conn is None:
+            conn = await pool.acquire()
+        key = ADVISORY_LOCK_NAMESPACE + thread_id
+        try:
+            if timeout:
+                await conn.execute(
+                    "SELECT pg_advisory_lock(hashtextextended($1, 0))", key, timeout=timeout
+                )
+            elif not await conn.fetchval(
+                "SELECT pg_try_advisory_lock(hashtextextended($1, 0))", key
+            ):
+                raise ThreadBusyError(thread_id)
+        except TimeoutError as e:
+            if owns_conn:
+                await pool.release(conn)
+            raise ThreadBusyError(thread_id) from e
+        except BaseException:
+            if owns_conn:
+                await pool.release(conn)
+            raise
+        return conn
+
+    async def _release_advisory_lock(
+        self, thread_id: str, conn: asyncpg.Connection, *, owns_conn: bool
+    ) -> None:
+        pool = getattr(database_module, "asyncpg_pool", None)
+        try:
+            await conn.execute(
+                "SELECT pg_advisory_unlock(hashtextextended($1, 0))",
+                ADVISORY_LOCK_NAMESPACE + thread_id,
+            )
+        finally:
+            if owns_conn and pool is not None:
+                await pool.release(conn)
+
+
+run_coordinator = ThreadRunCoordinator()
@@ -0,0 +1,219 @@
+"""Semantic answer cache: serve paraphrases of recent first-turn questions without a model.
+
+Many conversations open with the same question in other words ("What are the latest
+trends in AI?" / "latest AI trends", "clima em São Paulo hoje?" / "como está o tempo em
+SP"). For agents with AgentConfig.semantic_cache set, SemanticCacheMiddleware
+(api.core.agents.semantic_cache_middleware) stores the final answer of every first turn
+(or every turn of an agent without a checkpointer: both start from the question alone)
+and answers a later question that means the same from here.
+
+Matching is local and vectorized, no embedding API:
+
+    normalize     lowercase, accents stripped, punctuation dropped, the agent's synonyms
+                  applied word by word ("sp" -> "sao paulo"; "" drops a word), function
+                  words (pt / en) removed: what is left are the question's terms
+    embed         signed feature hashing of the character 3- and 4-grams of the terms into
+                  _DIM floats (NumPy, fixed polynomial hash: the same in every worker),
+                  L2-normalized
+    search        one matrix product against the agent's stored questions; best cosine
+                  >= SemanticCachePolicy.threshold
+    term check    the two questions must also have the same terms, up to spelling
+                  (difflib ratio >= _TERM_MATCH_RATIO): n-gram similarity alone can't tell
+                  "SQL vs NoSQL" from "SQL vs GraphQL", nor "top 5" from "top 10"
+
+Entries live SemanticCachePolicy.ttl_s seconds, at most SEMANTIC_CACHE_MAX_ENTRIES per
+agent per worker (the oldest are overwritten). A question served from the cache is not
+stored again, so its entry still expires on time.
+
+Metrics: semantic_cache_hits{agent}, semantic_cache_misses{agent},
+semantic_cache_stores{agent} (counters), semantic_cache_entries{agent} (gauge).
+
+Env knobs (all optional):
+    SEMANTIC_CACHE_MAX_ENTRIES   stored questions per agent and worker (default 1000)
+"""
+
+import difflib
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+
+from api.core.agents import metrics
+from api.core.agents.schemas import SemanticCachePolicy
+
+SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+_DIM = 1 << 11
+_NGRAMS = (3, 4)
+_TERM_MATCH_RATIO = 0.8
+# Stored questions checked with same_terms() per lookup, best similarity first.
+_CANDIDATES = 5
+_PRIME = np.uint64(1_000_003)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+_WORD = re.compile(r"\w+")
+# Function words of the languages the agents are used in; everything else is a term.
+_STOPWORD_LIST = """
+    a o as os um uma uns umas de do da dos das em no na nos nas ao aos por pelo pela para
+    pra com sem como e ou que qual quais quem onde quando esta estao ser eh me meu minha
+    voce sobre isso isto essa esse aqui favor
+    the an of in on at to for with and or is are was were be been what which who whom
+    how why when where does do did can could would should will please me my i you your
+    it its this that these those there about tell explain give show
+"""
+_STOPWORDS = frozenset(_STOPWORD_LIST.split())
+
+
+def question_terms(text: str, synonyms: dict[str, str]) -> list[str]:
+    """The terms of a question (see module docstring), in order."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    terms: list[str] = []
+    for word in _WORD.findall(text):
+        terms.extend(synonyms.get(word, word).split())
+    return [term for term in terms if term not in _STOPWORDS]
+
+
+def embed(terms: list[str]) -> np.ndarray:
+    """L2-normalized hashed character n-gram vector of `terms` (zeros if there are none)."""
+    codes = np.frombuffer(f" {' '.join(terms)} ".encode("utf-32-le"), dtype=np.uint32)
+    codes = codes.astype(np.uint64)
+    indexes, signs = [], []
+    with np.errstate(over="ignore"):
+        for n in _NGRAMS:
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            hashed = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                hashed = hashed * _PRIME + codes[offset : offset + count]
+            hashed ^= hashed >> np.uint64(29)
+            hashed *= _MIX
+            hashed ^= hashed >> np.uint64(32)
+            indexes.append((hashed % np.uint64(_DIM)).astype(np.intp))
+            signs.append(((hashed >> np.uint64(40)) & np.uint64(1)).astype(np.float32) * 2 - 1)
+    if not indexes:
+        return np.zeros(_DIM, dtype=np.float32)
+    vector = np.bincount(
+        np.concatenate(indexes), weights=np.concatenate(signs), minlength=_DIM
+    ).astype(np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def same_terms(left: list[str], right: list[str]) -> bool:
+    """Whether two questions ask about the same terms, allowing typos and plurals."""
+    only_left = set(left) - set(right)
+    only_right = set(right) - set(left)
+    if len(only_left) != len(only_right):
+        return False
+    return all(
+        any(difflib.SequenceMatcher(None, a, b).ratio() >= _TERM_MATCH_RATIO for b in only_right)
+        for a in only_left
+    ) and all(
+        any(difflib.SequenceMatcher(None, a, b).ratio() >= _TERM_MATCH_RATIO for a in only_left)
+        for b in only_right
+    )
+
+
+@dataclass
+class SemanticHit:
+    answer: str
+    similarity: float
+    question: str
+
+
+class _AgentIndex:
+    """Ring buffer of one agent's questions: embeddings as one matrix, plus answers."""
+
+    def __init__(self) -> None:
+        self.vectors = np.zeros((SEMANTIC_CACHE_MAX_ENTRIES, _DIM), dtype=np.float32)
+        self.expires = np.zeros(SEMANTIC_CACHE_MAX_ENTRIES, dtype=np.float64)
+        self.terms: list[list[str]] = [[] for _ in range(SEMANTIC_CACHE_MAX_ENTRIES)]
+        self.questions: list[str] = [""] * SEMANTIC_CACHE_MAX_ENTRIES
+        self.answers: list[str] = [""] * SEMANTIC_CACHE_MAX_ENTRIES
+        self._next = 0
+
+    def add(
+        self, vector: np.ndarray, terms: list[str], question: str, answer: str, expires: float
+    ) -> None:
+        slot = self._next
+        self.vectors[slot] = vector
+        self.expires[slot] = expires
+        self.terms[slot] = terms
+        self.questions[slot] = question
+        self.answers[slot] = answer
+        self._next = (slot + 1) % SEMANTIC_CACHE_MAX_ENTRIES
+
+    def live(self, now: float) -> int:
+        return int(np.count_nonzero(self.expires > now))
+
+
+class SemanticCache:
+    """Per-agent semantic caches of this worker, and their policies."""
+
+    def __init__(self) -> None:
+        self._policies: dict[str, SemanticCachePolicy] = {}
+        self._indexes: dict[str, _AgentIndex] = {}
+        self._collector_registered = False
+
+    def set_agent_policy(self, agent_id: str, policy: SemanticCachePolicy | None) -> None:
+        """Called by the registry for every agent (None = no semantic cache)."""
+        if policy is None:
+            self._policies.pop(agent_id, None)
+            self._indexes.pop(agent_id, None)
+        else:
+            self._policies[agent_id] = policy
+
+    def enabled(self, agent_id: str) -> bool:
+        return agent_id in self._policies
+
+    def lookup(self, agent_id: str, question: str) -> SemanticHit | None:
+        """The stored answer of a question meaning the same as `question`, if any."""
+        policy = self._policies.get(agent_id)
+        if policy is None:
+            return None
+        index = self._indexes.get(agent_id)
+        terms = question_terms(question, policy.synonyms)
+        if index is None or not terms:
+            metrics.increment("semantic_cache_misses", agent=agent_id)
+            return None
+        similarities = index.vectors @ embed(terms)
+        similarities[index.expires <= time.monotonic()] = -1.0
+        # Best candidates first: the closest one may fail the term check.
+        for slot in np.argsort(similarities)[::-1][:_CANDIDATES]:
+            similarity = float(similarities[slot])
+            if similarity < policy.threshold:
+                break
+            if same_terms(terms, index.terms[slot]):
+                metrics.increment("semantic_cache_hits", agent=agent_id)
+                return SemanticHit(index.answers[slot], similarity, index.questions[slot])
+        metrics.increment("semantic_cache_misses", agent=agent_id)
+        return None
+
+    def store(self, agent_id: str, question: str, answer: str) -> None:
+        policy = self._policies.get(agent_id)
+        if policy is None:
+            return
+        terms = question_terms(question, policy.synonyms)
+        if not terms:
+            return
+        index = self._indexes.get(agent_id)
+        if index is None:
+            index = self._indexes[agent_id] = _AgentIndex()
+            if not self._collector_registered:
+                metrics.register_collector(self._collect_metrics)
+                self._collector_registered = True
+        index.add(embed(terms), terms, question, answer, time.monotonic() + policy.ttl_s)
+        metrics.increment("semantic_cache_stores", agent=agent_id)
+
+    def _collect_metrics(self) -> None:
+        now = time.monotonic()
+        for agent_id, index in self._indexes.items():
+            metrics.set_gauge("semantic_cache_entries", index.live(now), agent=agent_id)
+
+
+semantic_cache = SemanticCache()
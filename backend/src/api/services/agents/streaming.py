@@ -1,5 +1,7 @@
+import asyncio
 import contextlib
 import os
+import time
 from collections.abc import AsyncGenerator
 from traceback import format_exc
 from typing import Any
@@ -8,14 +10,23 @@ import orjson
 from asyncpg.connection import Connection
 
 from api.core.agents.callbacks import usage_recorder
+from api.core.agents.latency import TurnTimer, current_turn
+from api.core.agents.models import canonical_provider
+from api.core.agents.schemas import LatencyProfile
 from api.models.agents.history import ChatHistoryThread
-from api.repositories.agents.chat_history import get_chat_messages, save_chat
+from api.repositories.agents.chat_history import (
+    get_chat_messages,
+    save_chat,
+    save_chat_metadata,
+)
 from api.repositories.agents.usage import build_usage_from_ai_message
 from api.services.agents.executors import (
     extract_thinking_from_content,
     normalize_chunk_text,
     reasoning_from_additional_kwargs,
 )
+from api.services.agents.usage_writer import usage_writer
+from config.database import mark_primary_write
 
 PREVIEW_LENGTH = 200
 
@@ -90,6 +101,21 @@ def sse_error_chunk(error_text: str) -> str:
     return _error_chunk(error_text)
 
 
+def _preview(content: str) -> str | None:
+    if len(content) > PREVIEW_LENGTH:
+        return content[:PREVIEW_LENGTH] + "..."
+    return content or None
+
+
+def _ai_message_from_output(out: Any) -> Any:
+    """on_chat_model_end output: an AIMessage, or (v1 events inside a graph) an LLMResult dict."""
+    if isinstance(out, dict):
+        generations = out.get("generations") or [[]]
+        first = generations[0][0] if generations[0] else None
+        return first.get("message") if isinstance(first, dict) else None
+    return out
+
+
 def _reasoning_from_ai_message(msg: Any) -> str:
     """Full reasoning/thinking string from a finished AIMessage (e.g. Gemini on_chat_model_end)."""
     if msg is None:
@@ -111,13 +137,22 @@ async def stream_agent(
     conn: Connection | None,
     realtor_id: int | None = None,
     active_client_id: str | None = None,
+    received_at: float | None = None,
+    *,
+    latency_profile: LatencyProfile | None = None,
 ) -> AsyncGenerator[str]:
-    """Stream agent events - Vercel AI SDK Data Stream Protocol (SSE)."""
+    """Stream agent events - Vercel AI SDK Data Stream Protocol (SSE).
+
+    `received_at` (time.perf_counter() when the request arrived) makes the turn's latency
+    record include the time spent waiting for the thread lease. `latency_profile` picks
+    the agent's model variants (see LatencyProfileMiddleware).
+    """
     agent = agent_info["agent"]
     save_to_db: bool = agent_info.get("save_to_db", True)
+    history_source: str = agent_info.get("history_source", "chat_history")
 
     print(
-        f"[stream_agent] model={requested_model!r} agent_type={type(agent).__name__} session_id={session_id!r} query_len={len(query)}"
+        f"[stream_agent] model={requested_model!r} agent_type={type(agent).__name__} session_id={session_id!r} query_len={len(query)} latency_profile={latency_profile!r}"
     )
     yield f"data: {orjson.dumps({'type': 'start', 'messageId': completion_id}).decode('utf-8')}\n\n"
 
@@ -129,6 +164,26 @@ async def stream_agent(
     tool_parts_by_call_id: dict[str, dict[str, Any]] = {}
     tool_call_order: list[str] = []
     last_ai_message: Any | None = None
+    served_model: tuple[str | None, str | None] = (None, None)
+    turn = TurnTimer(received_at)
+    # TimedPostgresSaver reports checkpoint load/write time to this turn.
+    current_turn.set(turn)
+
+    def record_latency(status: str) -> None:
+        if turn.finished:
+            return
+        usage_writer.enqueue(
+            turn.row(
+                thread_id=session_id,
+                message_id=completion_id,
+                agent_id=requested_model,
+                user_id=user_id,
+                client_id=active_client_id,
+                provider=served_model[0],
+                model_id=served_model[1],
+                status=status,
+            )
+        )
 
     langgraph_config: dict = {
         "configurable": {
@@ -142,12 +197,20 @@ async def stream_agent(
             "agent_id": requested_model,
             "user_id": user_id,
             "client_id": active_client_id,
+            # Turn id: usage rows of this turn share it with its agent_turn_latency row.
+            "message_id": completion_id,
+            # Read by LatencyProfileMiddleware.
+            "latency_profile": latency_profile,
         },
         # astream_events doesn't propagate callbacks attached via .with_config() —
         # pass the recorder explicitly so on_chat_model_start/end fire on every LLM call.
         "callbacks": [usage_recorder],
     }
 
+    # Per-agent checkpoint durability (AgentConfig.durability); None when no checkpointer.
+    durability = agent_info.get("durability")
+    run_kwargs: dict[str, Any] = {"durability": durability} if durability else {}
+
     _stream_chunk_i = 0
     _stream_chars = 0
 
@@ -156,12 +219,16 @@ async def stream_agent(
             {"messages": [{"role": "user", "content": query}]},
             version="v1",
             config=langgraph_config,
+            **run_kwargs,
         ):
             event_type = event.get("event") or ""
+            if event_type.startswith("on_chat_model") and turn.is_discarded(event):
+                continue  # the losing call of a hedged request
             ev_name = event.get("name") or ""
             ev_run = str(event.get("run_id", ""))[:10]
             data = event.get("data") or {}
             err = data.get("error")
+            turn.on_event(event)
 
             if _agent_stream_debug():
                 if event_type == "on_chat_model_stream":
@@ -280,6 +347,9 @@ async def stream_agent(
                 additional = getattr(chunk, "additional_kwargs", None) or {}
                 reasoning_content = gemini_thinking + reasoning_from_additional_kwargs(additional)
 
+                if reasoning_content or content:
+                    turn.mark_first_token()
+
                 if reasoning_content:
                     if not reasoning_started:
                         yield _chunk("reasoning-start", completion_id)
@@ -296,7 +366,7 @@ async def stream_agent(
 
             elif event_type == "on_chat_model_end":
                 # Gemini often attaches full thinking blocks only on the final message, not in stream deltas.
-                out = data.get("output")
+                out = _ai_message_from_output(data.get("output"))
                 merged = _reasoning_from_ai_message(out)
                 if merged and len(merged) > len(full_reasoning):
                     pending = merged[len(full_reasoning) :]
@@ -310,6 +380,19 @@ async def stream_agent(
                 # Capture the last AIMessage so we can persist usage_metadata after the stream.
                 if out is not None and getattr(out, "usage_metadata", None):
                     last_ai_message = out
+                response_metadata = getattr(out, "response_metadata", None) or {}
+                event_metadata = event.get("metadata") or {}
+                if event_metadata.get("model_provider") and event_metadata.get("model_id"):
+                    # Tagged by init_model: the ModelConfig that actually served the call.
+                    served_model = (
+                        str(event_metadata["model_provider"]),
+                        str(event_metadata["model_id"]),
+                    )
+                elif response_metadata.get("model_provider"):
+                    served_model = (
+                        canonical_provider(str(response_metadata["model_provider"])),
+                        response_metadata.get("model_name") or response_metadata.get("model"),
+                    )
 
         if _agent_stream_debug():
             print(
@@ -318,6 +401,12 @@ async def stream_agent(
                 flush=True,
             )
 
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client went away mid-stream. `finally` still runs, but a closed generator can't
+        # yield: its first yield ends it before the record_latency at its end is reached,
+        # so record the turn as cancelled now (a turn is only recorded once).
+        record_latency("cancelled")
+        raise
     except Exception as e:
         stream_failed = True
         print(
@@ -335,7 +424,24 @@ async def stream_agent(
                 yield _chunk("text-start", completion_id)
             yield _chunk("text-end", completion_id)
 
-        if save_to_db and conn and not stream_failed:
+        persist_started = time.perf_counter()
+        if save_to_db and conn and not stream_failed and history_source == "checkpoint":
+            # The checkpoint already holds the turn; chat_history only tracks the thread.
+            try:
+                await save_chat_metadata(
+                    conn,
+                    ChatHistoryThread(
+                        thread_id=session_id,
+                        user_id=user_id,
+                        client_id=active_client_id,
+                        agent_id=requested_model,
+                        preview=_preview(full_response or full_reasoning),
+                    ),
+                )
+                mark_primary_write(session_id, user_id)
+            except Exception:
+                print(f"[stream_agent] failed to persist chat metadata\n{format_exc()}")
+        elif save_to_db and conn and not stream_failed:
             try:
                 history = await get_chat_messages(conn, session_id) or []
                 history.append({"role": "user", "content": query})
@@ -381,19 +487,20 @@ async def stream_agent(
                 if full_response or full_reasoning or assistant_parts:
                     history.append(assistant_msg)
 
-                preview_content = full_response or full_reasoning
                 thread = ChatHistoryThread(
                     thread_id=session_id,
                     user_id=user_id,
                     agent_id=requested_model,
                     messages=history,
-                    preview=(preview_content[:PREVIEW_LENGTH] + "...")
-                    if len(preview_content) > PREVIEW_LENGTH
-                    else (preview_content or None),
+                    preview=_preview(full_response or full_reasoning),
                 )
                 await save_chat(conn, thread)
+                mark_primary_write(session_id, user_id)
             except Exception:
                 print(f"[stream_agent] failed to persist chat history\n{format_exc()}")
+        turn.persistence_s += time.perf_counter() - persist_started
+        record_latency("error" if stream_failed else "ok")
+        current_turn.set(None)
 
         finish_payload: dict = {"type": "finish"}
         if stream_failed:
@@ -0,0 +1,116 @@
+"""Usage analytics served from the rollup tables, with a short in-process TTL cache.
+
+Rollups are updated in the same transaction as the raw usage rows
+(api.repositories.agents.usage_rollups), so the current hour/day is already exact and no
+query here ever touches agent_message_usage. Reports run on the read replica when one is
+configured; the TTL cache (USAGE_REPORT_CACHE_TTL_S, default 30s) absorbs dashboards
+polling the same range, and the route sets a matching Cache-Control max-age.
+"""
+
+import datetime as dt
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from asyncpg.connection import Connection
+
+from api.repositories.agents.usage_rollups import (
+    UsageDimension,
+    UsageGranularity,
+    get_usage_series,
+)
+
+USAGE_REPORT_CACHE_TTL_S: float = float(os.getenv("USAGE_REPORT_CACHE_TTL_S", "30"))
+USAGE_REPORT_CACHE_MAX_ENTRIES: int = 256
+# Upper bound of buckets per report, so a year of hourly data can't be requested by mistake.
+USAGE_REPORT_MAX_BUCKETS: int = 24 * 93
+
+_BUCKET_SECONDS: dict[str, int] = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 28 * 86400,
+}
+
+_report_cache: OrderedDict[tuple, tuple[float, dict[str, Any]]] = OrderedDict()
+
+
+def _with_ratios(row: dict[str, Any]) -> dict[str, Any]:
+    input_tokens = row["input_tokens"] or 0
+    row["cached_ratio"] = (
+        round(row["cached_input_tokens"] / input_tokens, 4) if input_tokens else 0.0
+    )
+    return row
+
+
+def _total(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    keys = (
+        "calls",
+        "error_calls",
+        "input_tokens",
+        "cached_input_tokens",
+        "output_tokens",
+        "reasoning_tokens",
+        "total_tokens",
+        "cost_usd",
+    )
+    totals: dict[str, Any] = {key: sum(row[key] for row in rows) for key in keys}
+    totals["cost_usd"] = round(totals["cost_usd"], 6)
+    return _with_ratios(totals)
+
+
+def validate_report_range(
+    granularity: UsageGranularity, since: dt.datetime, until: dt.datetime
+) -> None:
+    """Raise ValueError for an empty range or one with too many buckets."""
+    if until <= since:
+        raise ValueError("'until' must be after 'since'")
+    buckets = (until - since).total_seconds() / _BUCKET_SECONDS[granularity]
+    if buckets > USAGE_REPORT_MAX_BUCKETS:
+        raise ValueError(
+            f"range spans ~{int(buckets)} {granularity} buckets "
+            f"(max {USAGE_REPORT_MAX_BUCKETS}); use a coarser granularity"
+        )
+
+
+async def get_usage_report(
+    conn: Connection,
+    *,
+    granularity: UsageGranularity,
+    since: dt.datetime,
+    until: dt.datetime,
+    group_by: list[UsageDimension],
+    filters: dict[UsageDimension, str],
+) -> dict[str, Any]:
+    """Bucketed series + totals for the range. Cached for USAGE_REPORT_CACHE_TTL_S."""
+    validate_report_range(granularity, since, until)
+    key = (granularity, since, until, tuple(group_by), tuple(sorted(filters.items())))
+    now = time.monotonic()
+    cached = _report_cache.get(key)
+    if cached is not None and cached[0] > now:
+        _report_cache.move_to_end(key)
+        return cached[1]
+
+    rows = await get_usage_series(
+        conn,
+        granularity=granularity,
+        since=since,
+        until=until,
+        group_by=group_by,
+        filters=filters,
+    )
+    report = {
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "group_by": group_by,
+        "filters": filters,
+        "series": [_with_ratios(row) for row in rows],
+        "totals": _total(rows),
+    }
+    _report_cache[key] = (now + USAGE_REPORT_CACHE_TTL_S, report)
+    _report_cache.move_to_end(key)
+    while len(_report_cache) > USAGE_REPORT_CACHE_MAX_ENTRIES:
+        _report_cache.popitem(last=False)
+    return report
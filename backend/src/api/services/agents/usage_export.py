@@ -0,0 +1,223 @@
+"""Columnar (Parquet / Arrow IPC) export of agent_message_usage.
+
+Rows are streamed from a server-side cursor (iter_usage_chunks) and converted one chunk at
+a time into Arrow record batches, so memory is bounded by USAGE_EXPORT_CHUNK_ROWS whatever
+the size of the export. agent_id, provider and model_id are dictionary-encoded (a few
+distinct values over millions of rows); cost_usd keeps its exact decimal(12, 6) type.
+
+Directory exports (`export_usage_to_directory`, used by scripts/export_usage.py) write
+Hive-style monthly partitions:
+
+    <out>/year=2026/month=10/part-000000001234-000000056789.parquet
+    <out>/_export_state.json      {"last_id": 56789, ...}
+
+and continue from `last_id` on the next run. Only a contiguous prefix of ids whose rows are
+older than USAGE_EXPORT_SAFETY_LAG is exported, so rows still being flushed by a usage
+writer (lower id, later commit) are not skipped forever.
+"""
+
+import datetime as dt
+import io
+import json
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from asyncpg import Record
+from asyncpg.connection import Connection
+
+from api.repositories.agents.usage_export import USAGE_EXPORT_COLUMNS, iter_usage_chunks
+
+USAGE_EXPORT_CHUNK_ROWS: int = 50_000
+USAGE_EXPORT_SAFETY_LAG = dt.timedelta(minutes=10)
+EXPORT_STATE_FILE = "_export_state.json"
+
+_DICTIONARY_COLUMNS = ("agent_id", "provider", "model_id", "response_cache")
+_STRING = pa.string()
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+USAGE_ARROW_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("thread_id", _STRING),
+        ("message_id", _STRING),
+        ("user_id", _STRING),
+        ("client_id", _STRING),
+        ("agent_id", _DICT),
+        ("provider", _DICT),
+        ("model_id", _DICT),
+        ("input_tokens", pa.int32()),
+        ("cached_input_tokens", pa.int32()),
+        ("output_tokens", pa.int32()),
+        ("reasoning_tokens", pa.int32()),
+        ("total_tokens", pa.int32()),
+        ("cost_usd", pa.decimal128(12, 6)),
+        ("error", _STRING),
+        ("response_cache", _DICT),
+    ]
+)
+
+
+def records_to_batch(rows: list[Record]) -> pa.RecordBatch:
+    """Convert asyncpg rows (USAGE_EXPORT_COLUMNS order) into an Arrow record batch."""
+    arrays = []
+    for idx, name in enumerate(USAGE_EXPORT_COLUMNS):
+        values = [row[idx] for row in rows]
+        field = USAGE_ARROW_SCHEMA.field(name)
+        if name in _DICTIONARY_COLUMNS:
+            arrays.append(pa.array(values, type=_STRING).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=USAGE_ARROW_SCHEMA)
+
+
+async def iter_usage_batches(
+    conn: Connection,
+    *,
+    after_id: int = 0,
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+    chunk_rows: int = USAGE_EXPORT_CHUNK_ROWS,
+) -> AsyncIterator[pa.RecordBatch]:
+    async for rows in iter_usage_chunks(
+        conn, after_id=after_id, chunk_size=chunk_rows, since=since, until=until
+    ):
+        yield records_to_batch(rows)
+
+
+def _take(buffer: io.BytesIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+async def stream_usage_arrow(
+    conn: Connection,
+    *,
+    after_id: int = 0,
+    since: dt.datetime | None = None,
+    until: dt.datetime | None = None,
+) -> AsyncIterator[bytes]:
+    """Arrow IPC stream of the rows, yielded message by message (for HTTP responses).
+
+    The stream format (unlike the file format) allows each batch to carry its own
+    dictionaries, so chunks are never buffered beyond the one being sent.
+    """
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(pa.PythonFile(buffer, mode="w"), USAGE_ARROW_SCHEMA) as writer:
+        yield _take(buffer)
+        async for batch in iter_usage_batches(conn, after_id=after_id, since=since, until=until):
+            writer.write_batch(batch)
+            yield _take(buffer)
+    yield _take(buffer)
+
+
+def read_export_state(out_dir: Path) -> dict[str, Any]:
+    path = out_dir / EXPORT_STATE_FILE
+    return json.loads(path.read_text()) if path.exists() else {"last_id": 0}
+
+
+def _month_key(created_at: dt.datetime) -> tuple[int, int]:
+    created_at = created_at.astimezone(dt.UTC)
+    return created_at.year, created_at.month
+
+
+class _MonthlyParquetWriters:
+    """One open ParquetWriter per month touched by the export; closed at the end."""
+
+    def __init__(self, out_dir: Path, first_id: int) -> None:
+        self.out_dir = out_dir
+        self.first_id = first_id
+        self._writers: dict[tuple[int, int], tuple[Path, pq.ParquetWriter]] = {}
+        self.rows_by_month: dict[str, int] = {}
+
+    def write(self, month: tuple[int, int], table: pa.Table) -> None:
+        if month not in self._writers:
+            directory = self.out_dir / f"year={month[0]:04d}" / f"month={month[1]:02d}"
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = directory / f".part-{self.first_id:012d}.parquet.tmp"
+            writer = pq.ParquetWriter(
+                tmp_path,
+                USAGE_ARROW_SCHEMA,
+                compression="zstd",
+                use_dictionary=list(_DICTIONARY_COLUMNS),
+            )
+            self._writers[month] = (tmp_path, writer)
+        self._writers[month][1].write_table(table)
+        label = f"{month[0]:04d}-{month[1]:02d}"
+        self.rows_by_month[label] = self.rows_by_month.get(label, 0) + table.num_rows
+
+    def close(self, last_id: int) -> list[Path]:
+        """Close every writer and move its temp file to its final part name."""
+        paths = []
+        for tmp_path, writer in self._writers.values():
+            writer.close()
+            final = tmp_path.with_name(f"part-{self.first_id:012d}-{last_id:012d}.parquet")
+            tmp_path.rename(final)
+            paths.append(final)
+        return paths
+
+    def abort(self) -> None:
+        for tmp_path, writer in self._writers.values():
+            writer.close()
+            tmp_path.unlink(missing_ok=True)
+
+
+async def export_usage_to_directory(
+    conn: Connection,
+    out_dir: Path,
+    *,
+    full: bool = False,
+    now: dt.datetime | None = None,
+) -> dict[str, Any]:
+    """Append rows newer than the last export to monthly Parquet partitions under `out_dir`.
+
+    Returns a summary (rows per month, files, last_id). With `full`, start again from id 0
+    (existing files are left alone — point `out_dir` somewhere empty).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state = {"last_id": 0} if full else read_export_state(out_dir)
+    after_id = int(state["last_id"])
+    cutoff = (now or dt.datetime.now(dt.UTC)) - USAGE_EXPORT_SAFETY_LAG
+
+    writers = _MonthlyParquetWriters(out_dir, after_id + 1)
+    last_id = after_id
+    try:
+        async for rows in iter_usage_chunks(
+            conn, after_id=after_id, chunk_size=USAGE_EXPORT_CHUNK_ROWS
+        ):
+            # Stop at the first row that may still have lower-id siblings in flight.
+            stop = next((i for i, row in enumerate(rows) if row["created_at"] >= cutoff), None)
+            if stop is not None:
+                rows = rows[:stop]
+            if rows:
+                table = pa.Table.from_batches([records_to_batch(rows)])
+                months = [_month_key(row["created_at"]) for row in rows]
+                for month in dict.fromkeys(months):
+                    mask = pa.array([m == month for m in months])
+                    writers.write(month, table.filter(mask))
+                last_id = rows[-1]["id"]
+            if stop is not None:
+                break
+    except BaseException:
+        writers.abort()
+        raise
+
+    files = writers.close(last_id)
+    if last_id != after_id:
+        (out_dir / EXPORT_STATE_FILE).write_text(
+            json.dumps(
+                {"last_id": last_id, "exported_at": dt.datetime.now(dt.UTC).isoformat()},
+                indent=2,
+            )
+        )
+    return {
+        "after_id": after_id,
+        "last_id": last_id,
+        "rows_by_month": writers.rows_by_month,
+        "files": [str(path) for path in files],
+    }
@@ -0,0 +1,176 @@
+"""Batched, asynchronous writer for agent_message_usage (and agent_turn_latency).
+
+UsageRecorderCallback used to open a pool connection and INSERT one row inside every
+`on_llm_end`, i.e. on the streaming path of each model call. Now it only calls
+`usage_writer.enqueue(row)` (no await, no I/O) and a background task of this worker writes
+the queued rows with a single COPY when either USAGE_WRITER_BATCH_SIZE rows are waiting or
+USAGE_WRITER_FLUSH_INTERVAL_S elapsed since the first row of the batch. stream_agent queues
+the per-turn AgentTurnLatency rows on the same queue; each flush writes both kinds in one
+transaction.
+
+Durability trade-off: rows live in memory for up to one flush interval. Shutdown drains the
+queue (`close()` in the lifespan); a hard crash loses at most one interval of usage. When the
+queue is full (database down for a long time) new rows are dropped and counted instead of
+growing memory without bound.
+
+Metrics (GET /agents/metrics): usage_writer_enqueued, usage_writer_written,
+usage_writer_dropped{reason=...}, usage_writer_flushes, usage_writer_failed_flushes,
+usage_writer_queue_depth, usage_writer_last_flush_ms, usage_writer_last_batch_size.
+
+Env knobs (all optional):
+    USAGE_WRITER_BATCH_SIZE         rows per COPY (default 200)
+    USAGE_WRITER_FLUSH_INTERVAL_S   max seconds a row waits before being written (default 1)
+    USAGE_WRITER_MAX_QUEUE          rows buffered before dropping (default 10000)
+"""
+
+import asyncio
+import datetime as dt
+import os
+import time
+from traceback import format_exc
+
+from api.core.agents import metrics
+from api.models.agents.latency import AgentTurnLatency
+from api.models.agents.usage import AgentMessageUsage
+from api.repositories.agents.latency import insert_agent_turn_latency_batch
+from api.repositories.agents.usage import insert_agent_message_usage_batch
+from config import database as database_module
+
+USAGE_WRITER_BATCH_SIZE: int = int(os.getenv("USAGE_WRITER_BATCH_SIZE", "200"))
+USAGE_WRITER_FLUSH_INTERVAL_S: float = float(os.getenv("USAGE_WRITER_FLUSH_INTERVAL_S", "1"))
+USAGE_WRITER_MAX_QUEUE: int = int(os.getenv("USAGE_WRITER_MAX_QUEUE", "10000"))
+# A failed batch is retried once on the next flush; after that it is dropped.
+USAGE_WRITER_MAX_ATTEMPTS: int = 2
+
+_Row = AgentMessageUsage | AgentTurnLatency
+
+
+class UsageWriter:
+    """Bounded in-memory queue of usage rows + one background task that flushes it."""
+
+    def __init__(
+        self,
+        batch_size: int = USAGE_WRITER_BATCH_SIZE,
+        flush_interval_s: float = USAGE_WRITER_FLUSH_INTERVAL_S,
+        max_queue: int = USAGE_WRITER_MAX_QUEUE,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_queue = max_queue
+        # Unbounded on purpose: the bound is enforced in enqueue() so close() can always
+        # put the stop sentinel (None) behind the rows already waiting.
+        self._queue: asyncio.Queue[_Row | None] | None = None
+        self._task: asyncio.Task | None = None
+        self._retry: list[_Row] = []
+        self._attempts = 0
+        self._closed = False
+
+    def start(self) -> None:
+        """Create the queue and the flush task on the running loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._closed = False
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, usage: _Row) -> bool:
+        """Queue a row for writing. Never blocks; returns False if the row was dropped."""
+        if self._closed:
+            metrics.increment("usage_writer_dropped", reason="closed")
+            return False
+        if self._queue is None:
+            self.start()
+        if self._queue.qsize() >= self.max_queue:
+            metrics.increment("usage_writer_dropped", reason="queue_full")
+            return False
+        if usage.created_at is None:
+            usage.created_at = dt.datetime.now(dt.UTC)
+        self._queue.put_nowait(usage)
+        metrics.increment("usage_writer_enqueued")
+        metrics.set_gauge("usage_writer_queue_depth", self._queue.qsize())
+        return True
+
+    async def _next_batch(self) -> tuple[list[_Row], bool]:
+        """Wait for the first row, then collect more until the batch is full or the interval
+        ends. The flag is True when the stop sentinel was reached."""
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                usage = await asyncio.wait_for(self._queue.get(), remaining)
+            except TimeoutError:
+                break
+            if usage is None:
+                return batch, True
+            batch.append(usage)
+        return batch, False
+
+    async def _flush(self, batch: list[_Row]) -> None:
+        pending = self._retry + batch
+        self._retry = []
+        if not pending:
+            return
+        pool = getattr(database_module, "asyncpg_pool", None)
+        if pool is None:
+            metrics.increment("usage_writer_dropped", len(pending), reason="no_pool")
+            return
+
+        started = time.perf_counter()
+        written = 0
+        try:
+            while written < len(pending):
+                chunk = pending[written : written + self.batch_size]
+                async with pool.acquire() as conn, conn.transaction():
+                    await insert_agent_message_usage_batch(
+                        conn, [row for row in chunk if isinstance(row, AgentMessageUsage)]
+                    )
+                    await insert_agent_turn_latency_batch(
+                        conn, [row for row in chunk if isinstance(row, AgentTurnLatency)]
+                    )
+                written += len(chunk)
+                metrics.increment("usage_writer_written", len(chunk))
+        except Exception:
+            unwritten = pending[written:]
+            self._attempts += 1
+            metrics.increment("usage_writer_failed_flushes")
+            if self._attempts < USAGE_WRITER_MAX_ATTEMPTS:
+                self._retry = unwritten
+            else:
+                metrics.increment("usage_writer_dropped", len(unwritten), reason="write_failed")
+                self._attempts = 0
+            print(f"[UsageWriter] flush of {len(unwritten)} rows failed\n{format_exc()}")
+            return
+
+        self._attempts = 0
+        metrics.increment("usage_writer_flushes")
+        metrics.set_gauge("usage_writer_last_batch_size", written)
+        metrics.set_gauge("usage_writer_last_flush_ms", (time.perf_counter() - started) * 1000)
+        metrics.set_gauge("usage_writer_queue_depth", self._queue.qsize() if self._queue else 0)
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            await self._flush(batch)
+        if self._retry:
+            # Last chance for a batch that failed right before shutdown.
+            await self._flush([])
+
+    async def close(self) -> None:
+        """Stop accepting rows and wait until everything queued is written (called at shutdown)."""
+        self._closed = True
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+
+usage_writer = UsageWriter()
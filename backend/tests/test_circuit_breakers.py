@@ -0,0 +1,119 @@
+import asyncio
+
+from langchain.agents.middleware.types import ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage, HumanMessage
+
+from api.core.agents import failover_middleware
+from api.core.agents.failover_middleware import FailoverMiddleware
+from api.core.agents.models import ModelConfig
+from api.services.agents import circuit_breakers as circuit_breakers_module
+from api.services.agents.circuit_breakers import CircuitBreaker, CircuitBreakers
+from api.services.agents.concurrency import ConcurrencyTimeoutError
+
+PRIMARY = ModelConfig("primary-model", "groq")
+SECONDARY = ModelConfig("secondary-model", "openai")
+
+
+class _OverloadedError(Exception):
+    status_code = 503
+
+
+def _open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(circuit_breakers_module.CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure(overload=True)
+
+
+def test_overload_failures_open_the_circuit():
+    breaker = CircuitBreaker("test")
+    for _ in range(circuit_breakers_module.CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure(overload=True)
+    assert breaker.state == "closed"
+    breaker.record_failure(overload=True)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_other_failures_reset_the_count():
+    breaker = CircuitBreaker("test")
+    for _ in range(circuit_breakers_module.CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure(overload=True)
+    breaker.record_failure(overload=False)
+    breaker.record_failure(overload=True)
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through(monkeypatch):
+    monkeypatch.setattr(circuit_breakers_module, "CIRCUIT_OPEN_S", 0.0)
+    breaker = CircuitBreaker("test")
+    _open_breaker(breaker)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_opens_again_and_release_frees_it(monkeypatch):
+    monkeypatch.setattr(circuit_breakers_module, "CIRCUIT_OPEN_S", 0.0)
+    breaker = CircuitBreaker("test")
+    _open_breaker(breaker)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    breaker.record_failure(overload=True)
+    assert breaker.state == "open"
+
+
+def _failover(monkeypatch) -> tuple[FailoverMiddleware, CircuitBreakers]:
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    breakers = CircuitBreakers()
+    monkeypatch.setattr(failover_middleware, "circuit_breakers", breakers)
+    return FailoverMiddleware(PRIMARY, SECONDARY), breakers
+
+
+def _call(middleware: FailoverMiddleware, errors: dict[str, Exception]) -> tuple[str, list[str]]:
+    """Run one model call; the handler raises errors[model_id] for the models listed."""
+    tried: list[str] = []
+
+    async def handler(request: ModelRequest) -> ModelResponse:
+        model_id = request.model.metadata["model_id"]
+        tried.append(model_id)
+        if model_id in errors:
+            raise errors[model_id]
+        return ModelResponse(result=[AIMessage(model_id)])
+
+    request = ModelRequest(model=middleware.model, messages=[HumanMessage("hi")])
+    response = asyncio.run(middleware.awrap_model_call(request, handler))
+    return response.result[0].content, tried
+
+
+def test_failover_serves_from_next_model(monkeypatch):
+    middleware, breakers = _failover(monkeypatch)
+    served, tried = _call(middleware, {"primary-model": _OverloadedError()})
+    assert served == "secondary-model"
+    assert tried == ["primary-model", "secondary-model"]
+    assert breakers.breaker_for("groq").failures == 1
+
+
+def test_failover_skips_open_circuit(monkeypatch):
+    middleware, breakers = _failover(monkeypatch)
+    _open_breaker(breakers.breaker_for("groq"))
+    served, tried = _call(middleware, {})
+    assert served == "secondary-model"
+    assert tried == ["secondary-model"]
+
+
+def test_local_limit_timeout_does_not_close_half_open_circuit(monkeypatch):
+    monkeypatch.setattr(circuit_breakers_module, "CIRCUIT_OPEN_S", 0.0)
+    middleware, breakers = _failover(monkeypatch)
+    primary = breakers.breaker_for("groq")
+    _open_breaker(primary)
+    served, _ = _call(middleware, {"primary-model": ConcurrencyTimeoutError("queue full")})
+    assert served == "secondary-model"
+    # The probe never reached the provider: still half-open, and the probe slot is free.
+    assert primary.state == "half_open"
+    served, _ = _call(middleware, {})
+    assert served == "primary-model"
+    assert primary.state == "closed"
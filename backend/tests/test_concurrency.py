@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from api.services.agents import concurrency
+from api.services.agents.concurrency import AdaptiveLimit, ConcurrencyTimeoutError
+
+
+def _limit(monkeypatch, initial: int) -> AdaptiveLimit:
+    monkeypatch.setattr(concurrency, "CONCURRENCY_INITIAL_LIMIT", initial)
+    return AdaptiveLimit("test")
+
+
+async def _fill(limit: AdaptiveLimit, slots: int) -> None:
+    for _ in range(slots):
+        await limit.acquire(timeout=1)
+
+
+def test_success_increases_limit_only_when_used(monkeypatch):
+    async def run() -> None:
+        limit = _limit(monkeypatch, 8)
+        await _fill(limit, 2)
+        limit.on_success("model", 1.0)
+        assert limit.limit == pytest.approx(8.0)
+        await _fill(limit, 2)
+        limit.on_success("model", 1.0)
+        assert limit.limit == pytest.approx(8.0 + 1 / 8)
+
+    asyncio.run(run())
+
+
+def test_overload_decreases_once_per_cooldown(monkeypatch):
+    limit = _limit(monkeypatch, 8)
+    limit.on_overload("rate_limited")
+    limit.on_overload("rate_limited")
+    assert limit.limit == pytest.approx(8.0 * concurrency.CONCURRENCY_DECREASE_FACTOR)
+    limit._last_decrease -= concurrency._DECREASE_COOLDOWN_S
+    limit.on_overload("server_error")
+    assert limit.limit == pytest.approx(8.0 * concurrency.CONCURRENCY_DECREASE_FACTOR**2)
+
+
+def test_latency_spike_counts_as_overload(monkeypatch):
+    limit = _limit(monkeypatch, 8)
+    for _ in range(concurrency._BASELINE_MIN_SAMPLES):
+        limit.on_success("model", 1.0)
+    limit.on_success("model", 1.0 + concurrency.CONCURRENCY_LATENCY_SPIKE_RATIO)
+    assert limit.limit == pytest.approx(8.0 * concurrency.CONCURRENCY_DECREASE_FACTOR)
+
+
+def test_waiters_get_released_slots_in_order(monkeypatch):
+    async def run() -> list[str]:
+        limit = _limit(monkeypatch, 1)
+        await _fill(limit, 1)
+        served: list[str] = []
+
+        async def call(name: str) -> None:
+            await limit.acquire(timeout=10)
+            served.append(name)
+            limit.release()
+
+        tasks = [asyncio.create_task(call(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        limit.release()
+        await asyncio.gather(*tasks)
+        assert limit.in_flight == 0
+        return served
+
+    assert asyncio.run(run()) == ["first", "second"]
+
+
+def test_cancelled_waiter_gives_up_its_turn(monkeypatch):
+    async def run() -> None:
+        limit = _limit(monkeypatch, 1)
+        await _fill(limit, 1)
+        cancelled = asyncio.create_task(limit.acquire(timeout=10))
+        waiting = asyncio.create_task(limit.acquire(timeout=10))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limit.release()
+        await waiting
+        assert cancelled.cancelled()
+        assert limit.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_acquire_times_out(monkeypatch):
+    async def run() -> None:
+        limit = _limit(monkeypatch, 1)
+        await _fill(limit, 1)
+        with pytest.raises(ConcurrencyTimeoutError):
+            await limit.acquire(timeout=0.01)
+        limit.release()
+        assert limit.in_flight == 0
+
+    asyncio.run(run())
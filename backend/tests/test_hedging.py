@@ -0,0 +1,37 @@
+from api.core.agents.models import ModelConfig
+from api.services.agents import hedging
+from api.services.agents.hedging import HedgeStats
+
+MODEL = ModelConfig("test-model", "test")
+
+
+def test_default_delay_until_enough_samples():
+    stats = HedgeStats()
+    for _ in range(hedging._TTFT_MIN_SAMPLES - 1):
+        stats.observe_ttft(MODEL, 10.0)
+    assert stats.hedge_after_s(MODEL) == hedging.HEDGE_DEFAULT_AFTER_S
+
+
+def test_delay_is_p95_of_recent_ttfts():
+    stats = HedgeStats()
+    ttfts = [second / 10 for second in range(1, 101)]
+    for ttft in reversed(ttfts):
+        stats.observe_ttft(MODEL, ttft)
+    assert stats.hedge_after_s(MODEL) == ttfts[94]
+
+
+def test_delay_has_a_floor_and_follows_the_window():
+    stats = HedgeStats()
+    for _ in range(hedging._TTFT_WINDOW):
+        stats.observe_ttft(MODEL, 30.0)
+    for _ in range(hedging._TTFT_WINDOW):
+        stats.observe_ttft(MODEL, 0.0)
+    assert stats.hedge_after_s(MODEL) == hedging.HEDGE_MIN_AFTER_S
+
+
+def test_catalog_delay_wins():
+    fixed = ModelConfig("fixed-model", "test", hedge_after_s=hedging.HEDGE_MIN_AFTER_S * 3)
+    stats = HedgeStats()
+    for _ in range(hedging._TTFT_MIN_SAMPLES):
+        stats.observe_ttft(fixed, 30.0)
+    assert stats.hedge_after_s(fixed) == fixed.hedge_after_s
@@ -0,0 +1,35 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from api.core.agents.history_window import trim_messages_for_llm
+
+# ~1000 tokens per answer with the len / 4 heuristic.
+ANSWER = "x" * 4_000
+
+
+def _conversation(previous_turns: int) -> list:
+    messages = []
+    for turn in range(previous_turns):
+        messages += [HumanMessage(f"question {turn}"), AIMessage(ANSWER)]
+    return [*messages, HumanMessage("current question")]
+
+
+def test_budget_under_turn_step_keeps_plain_window():
+    # 3 previous turns fit the budget, fewer than turn_step: no turn-aligned window exists.
+    for previous_turns in (4, 8, 12):
+        trimmed = trim_messages_for_llm(
+            _conversation(previous_turns), max_tokens=3_500, turn_step=4
+        )
+        kept_turns = range(previous_turns - 3, previous_turns)
+        assert [m.content for m in trimmed[:-1:2]] == [f"question {t}" for t in kept_turns]
+
+
+def test_window_starts_on_aligned_turn():
+    # 9 previous turns fit; the window starts on turn 12 and keeps 8 of them.
+    trimmed = trim_messages_for_llm(_conversation(20), max_tokens=9_500, turn_step=4)
+    assert [m.content for m in trimmed[:-1:2]] == [f"question {t}" for t in range(12, 20)]
+
+
+def test_aligned_window_never_shorter_than_turn_step():
+    # 5 previous turns fit but the next aligned turn leaves only 2: plain window.
+    trimmed = trim_messages_for_llm(_conversation(10), max_tokens=5_500, turn_step=4)
+    assert trimmed[0].content == "question 5"
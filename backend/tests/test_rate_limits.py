@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from api.core.agents.models import ModelConfig
+from api.services.agents.rate_limits import ModelRateLimiter, RateLimitTimeoutError, _Bucket
+
+PER_MINUTE = 60.0
+
+
+def test_bucket_refills_continuously_up_to_one_minute():
+    bucket = _Bucket(PER_MINUTE)
+    now = bucket._updated
+    bucket.adjust(-PER_MINUTE)
+    assert bucket.wait_time(PER_MINUTE / 2, now) == pytest.approx(30.0)
+    assert bucket.wait_time(PER_MINUTE / 2, now + 30) == 0.0
+    bucket.wait_time(1, now + 600)
+    assert bucket.level == PER_MINUTE
+
+
+def test_oversized_request_waits_for_full_bucket_and_leaves_debt():
+    bucket = _Bucket(PER_MINUTE)
+    now = bucket._updated
+    assert bucket.wait_time(3 * PER_MINUTE, now) == 0.0
+    bucket.adjust(-3 * PER_MINUTE)
+    assert bucket.level == -2 * PER_MINUTE
+    # Two minutes to pay the debt back, then one more for a full bucket.
+    assert bucket.wait_time(3 * PER_MINUTE, now) == pytest.approx(180.0)
+
+
+def _limiter(**limits: int) -> ModelRateLimiter:
+    return ModelRateLimiter(ModelConfig("test-model", "test", **limits))
+
+
+def test_settle_corrects_the_token_estimate():
+    async def run() -> None:
+        limiter = _limiter(tpm_limit=1_000)
+        await limiter.acquire(100, "user:a", timeout=1)
+        limiter.settle(100, 300)
+        assert limiter._tokens.level == pytest.approx(700, abs=1)
+        limiter.settle(100, 0)  # no usage reported: keep the estimate
+        assert limiter._tokens.level == pytest.approx(700, abs=1)
+
+    asyncio.run(run())
+
+
+def test_waiters_are_served_round_robin_across_tenants():
+    async def run() -> list[str]:
+        limiter = _limiter(rpm_limit=1)
+        await limiter.acquire(0, "user:a", timeout=1)  # empties the bucket
+        served: list[str] = []
+
+        async def call(tenant: str, name: str) -> None:
+            await limiter.acquire(0, tenant, timeout=10)
+            served.append(name)
+
+        tasks = [
+            asyncio.create_task(call("user:a", "a1")),
+            asyncio.create_task(call("user:a", "a2")),
+            asyncio.create_task(call("user:b", "b1")),
+        ]
+        await asyncio.sleep(0)
+        for _ in tasks:
+            limiter.refund(0)
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return served
+
+    assert asyncio.run(run()) == ["a1", "b1", "a2"]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run() -> None:
+        limiter = _limiter(rpm_limit=1)
+        await limiter.acquire(0, "user:a", timeout=1)
+        cancelled = asyncio.create_task(limiter.acquire(0, "user:a", timeout=10))
+        waiting = asyncio.create_task(limiter.acquire(0, "user:b", timeout=10))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.refund(0)
+        await waiting
+        assert cancelled.cancelled()
+        assert limiter.queued() == 0
+
+    asyncio.run(run())
+
+
+def test_acquire_times_out():
+    async def run() -> None:
+        limiter = _limiter(rpm_limit=1)
+        await limiter.acquire(0, "user:a", timeout=1)
+        with pytest.raises(RateLimitTimeoutError):
+            await limiter.acquire(0, "user:a", timeout=0.01)
+        assert limiter.queued() == 0
+
+    asyncio.run(run())